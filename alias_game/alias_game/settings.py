@@ -2,6 +2,7 @@ import os
 import environ
 import dj_database_url
 from pathlib import Path
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -34,6 +35,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы в замер попадала вся цепочка (game/metrics.py)
+    'game.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -73,14 +76,203 @@ DATABASES = {
     )
 }
 
-# Кэш Redis
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# Шардирование комнат по room_id (game/sharding.py). GameRoom и Player живут в
+# базе шарда комнаты, остальное - в default.
+#   SHARD_DATABASES="shard_b=sqlite:///shard_b.sqlite3" - дополнительные базы
+#   ROOM_SHARDS="a=default,b=shard_b@https://b.example.com" - шард=база[@адрес узла]
+#   ROOM_SHARDS_LOCAL="a" - шарды, которые обслуживает этот узел (по умолчанию все);
+#   с комнатами остальных клиента отправляют на адрес их узла.
+# Базы всех шардов настраиваются на каждом узле: комнату создаёт любой узел.
+# Смена ROOM_SHARDS: manage.py migrate --database=<база>, остановить запись в
+# комнаты (дождаться конца игр или закрыть узлы на запись), manage.py rebalance_rooms
+# с новым ROOM_SHARDS и только потом перезапустить воркеры с ним
+for item in filter(None, os.getenv('SHARD_DATABASES', '').split(',')):
+    alias, _, url = item.partition('=')
+    DATABASES[alias.strip()] = dj_database_url.parse(url.strip(), conn_max_age=600, conn_health_checks=True)
+
+ROOM_SHARDS = {
+    'SHARDS': {},
+    'LOCAL': [name for name in os.getenv('ROOM_SHARDS_LOCAL', '').split(',') if name] or None,
+    'VNODES': int(os.getenv('ROOM_SHARDS_VNODES', '64')),
+}
+for item in filter(None, os.getenv('ROOM_SHARDS', '').split(',')):
+    name, _, target = item.partition('=')
+    database, _, url = target.partition('@')
+    ROOM_SHARDS['SHARDS'][name.strip()] = {'DATABASE': database.strip() or 'default', 'URL': url.strip()}
+
+DATABASE_ROUTERS = ['game.sharding.RoomRouter']
+
+# Профиль SQLite: PRAGMA на каждом новом соединении. WAL пускает чтение параллельно
+# с записью, synchronous=NORMAL в WAL не ждёт fsync на каждый коммит (теряется
+# только последний коммит при отключении питания, база не портится), mmap читает
+# файл без копирования. Проверка: manage.py bench_writes
+SQLITE_TUNING = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '20000')),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'temp_store': 'MEMORY',
+}
+
+# Пул соединений (DB_POOL_ENABLED): на время запроса соединение берётся из пула
+# процесса и возвращается туда, а не открывается заново. SIZE - соединений на
+# процесс, TIMEOUT - сколько ждать свободного, RECYCLE - время жизни соединения.
+# PostgreSQL - встроенный пул Django (OPTIONS['pool'], нужен psycopg[pool]).
+# Для MySQL встроенного пула нет, там свой (game/db_backends/pool.py): он ещё
+# проверяет SELECT 1 соединение, простоявшее дольше CHECK_INTERVAL. Все значения в секундах
+DB_POOL = {
+    'ENABLED': os.getenv('DB_POOL_ENABLED', 'False').lower() in ('true', '1', 't', 'yes', 'y'),
+    'SIZE': int(os.getenv('DB_POOL_SIZE', '10')),
+    'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    'RECYCLE': int(os.getenv('DB_POOL_RECYCLE', '3600')),
+    'CHECK_INTERVAL': int(os.getenv('DB_POOL_CHECK_INTERVAL', '30')),
+}
+
+POOLED_ENGINES = {
+    'django.db.backends.mysql': 'game.db_backends.mysql',
+}
+
+for alias, database in DATABASES.items():
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        # select_for_update в SQLite игнорируется: IMMEDIATE сразу берёт блокировку на запись,
+        # и параллельные изменения комнаты выстраиваются в очередь, а не теряются
+        database.setdefault('OPTIONS', {}).update({
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_TUNING['busy_timeout'] / 1000,
+            'init_command': ';'.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_TUNING.items()),
+        })
+        # Тестовая база в файле: в памяти SQLite не ждёт блокировок, а сразу падает,
+        # и параллельные тесты проверяли бы не то
+        test_name = 'test_db.sqlite3' if alias == 'default' else f'test_{alias}.sqlite3'
+        database['TEST'] = {'NAME': BASE_DIR / test_name}
+
+    if DB_POOL['ENABLED'] and database['ENGINE'] == 'django.db.backends.postgresql':
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': 1,
+            'max_size': DB_POOL['SIZE'],
+            'timeout': DB_POOL['TIMEOUT'],
+            'max_lifetime': DB_POOL['RECYCLE'],
+        }
+        # Встроенный пул не работает с постоянными соединениями Django
+        database['CONN_MAX_AGE'] = 0
+        database['CONN_HEALTH_CHECKS'] = False
+    elif DB_POOL['ENABLED'] and database['ENGINE'] in POOLED_ENGINES:
+        database['ENGINE'] = POOLED_ENGINES[database['ENGINE']]
+        # Соединения держит пул: Django отдаёт своё в конце каждого запроса
+        database['CONN_MAX_AGE'] = 0
+        database['CONN_HEALTH_CHECKS'] = False
+
+# Кэш, общий для всех воркеров (game/cache_backends.py):
+#   sqlite:///cache.sqlite3        - файл SQLite, внешние сервисы не нужны (по умолчанию)
+#   redis://[:пароль@]хост:порт/0  - любой сервер с протоколом Redis
+#   locmem://                      - память процесса, только для одного воркера
+CACHE_URL = os.getenv('CACHE_URL', f"sqlite:///{BASE_DIR / 'cache.sqlite3'}")
+cache_url = urlparse(CACHE_URL)
+if cache_url.scheme in ('redis', 'resp'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'game.cache_backends.RespCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif cache_url.scheme == 'sqlite':
+    CACHES = {
+        'default': {
+            'BACKEND': 'game.cache_backends.SQLiteCache',
+            'LOCATION': cache_url.path[1:],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
     }
+
+# События WebSocket (game/realtime.py) идут между воркерами через общий кэш:
+# каждый процесс с открытыми сокетами раз в POLL_INTERVAL секунд забирает
+# события своих комнат, пришедшие от других воркеров; EVENT_TTL - сколько их хранить.
+# С кэшем в памяти процесса (locmem) другим воркерам события не видны, и
+# ретрансляция выключена (RELAY): такой кэш - только для одного воркера
+REALTIME = {
+    'RELAY': os.getenv(
+        'REALTIME_RELAY', str(CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'),
+    ).lower() in ('true', '1', 't', 'yes', 'y'),
+    'POLL_INTERVAL': float(os.getenv('REALTIME_POLL_INTERVAL', '0.2')),
+    'EVENT_TTL': int(os.getenv('REALTIME_EVENT_TTL', '60')),
+}
+
+# Сколько секунд хранить ответы api_get_room_info/api_get_game_state для одной версии комнаты
+ROOM_CACHE_TIMEOUT = int(os.getenv('ROOM_CACHE_TIMEOUT', '300'))
+# Срок счётчика версии комнаты; уборщик удаляет счётчики сразу вместе с комнатами
+ROOM_VERSION_TIMEOUT = int(os.getenv('ROOM_VERSION_TIMEOUT', str(2 * 24 * 3600)))
+
+# Состояние активных комнат в памяти процесса (game/engine.py).
+# Write-behind включать только при одном воркере или привязке комнат к воркеру.
+ROOM_ENGINE = {
+    'WRITE_BEHIND': os.getenv('ROOM_ENGINE_WRITE_BEHIND', 'False').lower() in ('true', '1', 't', 'yes', 'y'),
+    'FLUSH_INTERVAL': float(os.getenv('ROOM_ENGINE_FLUSH_INTERVAL', '2')),
 }
 
+# Очистка брошенных комнат (game/reaper.py, manage.py reap_rooms), все значения в секундах.
+# INTERVAL=0 выключает фоновый поток в воркерах.
+ROOM_REAPER = {
+    'IDLE_TIMEOUT': int(os.getenv('ROOM_IDLE_TIMEOUT', str(2 * 3600))),
+    'MAX_AGE': int(os.getenv('ROOM_MAX_AGE', str(24 * 3600))),
+    'INTERVAL': int(os.getenv('ROOM_REAPER_INTERVAL', '300')),
+    'CHUNK_SIZE': int(os.getenv('ROOM_REAPER_CHUNK_SIZE', '500')),
+}
+
+# Метрики для Prometheus на /metrics/. TOKEN - ожидаемый заголовок
+# "Authorization: Bearer <TOKEN>"; SLOW_REQUEST_MS > 0 включает журнал
+# медленных запросов с их SQL (логгер game.metrics.slow).
+METRICS = {
+    'ENABLED': os.getenv('METRICS_ENABLED', 'True').lower() in ('true', '1', 't', 'yes', 'y'),
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),
+    'SLOW_REQUEST_MS': float(os.getenv('SLOW_REQUEST_MS', '0')),
+}
+
+# Таймер ходов (game/turns.py): раз в INTERVAL секунд один воркер завершает
+# истёкшие ходы пачками до BATCH_SIZE комнат. INTERVAL=0 выключает поток.
+TURN_TIMER = {
+    'INTERVAL': float(os.getenv('TURN_TIMER_INTERVAL', '1')),
+    'BATCH_SIZE': int(os.getenv('TURN_TIMER_BATCH_SIZE', '200')),
+}
+
+# Коды комнат (game/roomids.py): процесс забирает из базы блок номеров
+# по BLOCK_SIZE и выдаёт коды из памяти
+ROOM_IDS = {
+    'BLOCK_SIZE': int(os.getenv('ROOM_IDS_BLOCK_SIZE', '100')),
+}
+
+# Кодирование ответов API (game/encoding.py): формат выбирается по Accept,
+# сжатие (brotli, если установлен, иначе gzip) - только для ответов от COMPRESS_MIN_SIZE байт
+API_ENCODING = {
+    'COMPRESS_MIN_SIZE': int(os.getenv('API_COMPRESS_MIN_SIZE', '1024')),
+}
+
+# Сколько слов вперёд резервируется для объясняющего (api/word-queue/)
+WORD_QUEUE_SIZE = int(os.getenv('WORD_QUEUE_SIZE', '5'))
+
+# Журнал игры и итоги игроков (game/history.py) пишутся так же пачками.
+# В рейтинг по доле угаданных попадают игроки от MIN_WORDS объяснённых слов.
+GAME_HISTORY = {
+    'BATCH_SIZE': int(os.getenv('GAME_HISTORY_BATCH_SIZE', '500')),
+    'FLUSH_INTERVAL': float(os.getenv('GAME_HISTORY_FLUSH_INTERVAL', '1')),
+    'MIN_WORDS': int(os.getenv('GAME_HISTORY_MIN_WORDS', '20')),
+}
+
+# Фоновые потоки (очистка комнат, таймер ходов, запись журнала пачками) запускает
+# GameConfig.ready() - только при BACKGROUND_JOBS. Включать в процессах веб-сервера;
+# manage.py migrate, тесты и остальные команды обходятся без них
+BACKGROUND_JOBS = os.getenv('BACKGROUND_JOBS', 'False').lower() in ('true', '1', 't', 'yes', 'y')
+
+# Наборы слов: имя -> файл .pack (см. manage.py build_wordpack).
+# Встроенный набор 'default' доступен всегда.
+WORD_PACKS_DIR = Path(os.getenv('WORD_PACKS_DIR', BASE_DIR / 'wordpacks'))
+WORD_PACKS = {path.stem: path for path in sorted(WORD_PACKS_DIR.glob('*.pack'))}
+
 # Валидация паролей
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -104,10 +296,19 @@ USE_I18N = True
 USE_TZ = True
 
 # Статические файлы
+# Исходники лежат в staticfiles/, а STATIC_ROOT - результат collectstatic: он не
+# хранится в репозитории и собирается при развёртывании
+# (python manage.py collectstatic --noinput)
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 STATICFILES_DIRS = [BASE_DIR / 'staticfiles']
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Имена файлов с хэшем содержимого: WhiteNoise отдаёт их с вечным кэшем, а
+# шаблоны ссылаются на них через {% static %}. STATICFILES_STORAGE с Django 5.1
+# не читается, поэтому через STORAGES
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
 
 # Медиа файлы
 MEDIA_URL = 'media/'
@@ -125,5 +326,18 @@ if not DEBUG:
 # Telegram Bot
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', default='')
 
+# Среда выполнения бота (game/telegram.py): пул обработчиков, размер очереди
+# каждого из них, длинный опрос и паузы между переподключениями.
+# WEBHOOK_SECRET включает вебхук /telegram/webhook/ (manage.py telegram_webhook)
+TELEGRAM_BOT = {
+    'WORKERS': int(os.getenv('TELEGRAM_BOT_WORKERS', '4')),
+    'QUEUE_SIZE': int(os.getenv('TELEGRAM_BOT_QUEUE_SIZE', '100')),
+    'POLL_TIMEOUT': int(os.getenv('TELEGRAM_POLL_TIMEOUT', '30')),
+    'BACKOFF_MIN': 1.0,
+    'BACKOFF_MAX': 60.0,
+    'HANDLERS_MODULE': 'bot',
+    'WEBHOOK_SECRET': os.getenv('TELEGRAM_WEBHOOK_SECRET', ''),
+}
+
 # WhiteNoise
 WHITENOISE_MAX_AGE = 31536000
\ No newline at end of file
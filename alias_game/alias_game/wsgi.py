@@ -19,4 +19,4 @@ os.environ['DJANGO_SETTINGS_MODULE'] = 'alias_game.settings'
 
 # Загрузите Django приложение
 from django.core.wsgi import get_wsgi_application
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
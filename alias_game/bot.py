@@ -5,29 +5,29 @@ import logging
 # Добавляем путь
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Настройка Django
+# Настройка Django (если бот импортирован из самого Django - уже сделана)
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alias_game.settings')
 import django
-django.setup()
+from django.apps import apps
+if not apps.ready:
+    django.setup()
 
 from django.conf import settings
-import telebot
 from telebot import types
+from game.history import events as game_history
+from game.results import report_result
+from game.telegram import BotRuntime, LimitedTeleBot
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 # Токен бота
 TOKEN = settings.TELEGRAM_BOT_TOKEN
-if not TOKEN:
-    logger.error("TELEGRAM_BOT_TOKEN не установлен")
-    sys.exit(1)
 
-bot = telebot.TeleBot(TOKEN)
+# Импорт модуля ничего не запускает: обновления приходят либо из poll_forever
+# (python bot.py), либо через вебхук в game/views.py. Токен проверяет run_bot:
+# вебхук импортирует модуль и без него
+bot = LimitedTeleBot(TOKEN, validate_token=False)
+runtime = BotRuntime(bot)
 
 @bot.message_handler(commands=['start', 'help'])
 def send_welcome(message):
@@ -63,18 +63,24 @@ def handle_text(message):
 
 @bot.message_handler(content_types=['web_app_data'])
 def handle_web_app_data(message):
-    data = message.web_app_data.data
-    logger.info(f"Данные из Web App: {data}")
+    # Результаты игры пишутся в базу пачками журнала игры (game/results.py)
+    report_result(message.from_user.id, message.web_app_data.data)
 
 def run_bot():
+    # Логирование настраивается только при запуске бота отдельным процессом:
+    # вебхук импортирует этот модуль внутри Django со своим LOGGING
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if not TOKEN:
+        logger.error("TELEGRAM_BOT_TOKEN не установлен")
+        sys.exit(1)
+    
     logger.info("Запуск Telegram бота...")
-    try:
-        bot.infinity_polling()
-    except Exception as e:
-        logger.error(f"Ошибка бота: {e}")
-        import time
-        time.sleep(5)
-        run_bot()
+    game_history.start()
+    # Переподключение с паузой живёт внутри poll_forever
+    runtime.poll_forever()
 
 if __name__ == '__main__':
-    run_bot()
\ No newline at end of file
+    run_bot()
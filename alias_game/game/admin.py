@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import GameRoom, Player
+from .models import GameResult, GameRoom, Player, PlayerStats
 
 @admin.register(GameRoom)
 class GameRoomAdmin(admin.ModelAdmin):
@@ -11,4 +11,15 @@ class GameRoomAdmin(admin.ModelAdmin):
 class PlayerAdmin(admin.ModelAdmin):
     list_display = ('username', 'room', 'team', 'score', 'joined_at')
     list_filter = ('team',)
-    search_fields = ('username', 'room__room_id')
\ No newline at end of file
+    search_fields = ('username', 'room__room_id')
+
+@admin.register(GameResult)
+class GameResultAdmin(admin.ModelAdmin):
+    list_display = ('room_code', 'winner', 'score_a', 'score_b', 'finished_at')
+    list_filter = ('winner',)
+    search_fields = ('room_code',)
+
+@admin.register(PlayerStats)
+class PlayerStatsAdmin(admin.ModelAdmin):
+    list_display = ('username', 'user_id', 'wins', 'games', 'words_explained', 'guess_rate', 'updated_at')
+    search_fields = ('username', 'user_id')
\ No newline at end of file
@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 class GameConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'game'
\ No newline at end of file
+    name = 'game'
+
+    def ready(self):
+        if not settings.BACKGROUND_JOBS:
+            return
+        # Очистка брошенных комнат, таймер ходов и запись журналов пачками
+        from .history import events as game_history
+        from .reaper import scheduler as reaper
+        from .turns import scheduler as turn_timer
+        reaper.start()
+        turn_timer.start()
+        game_history.start()
@@ -0,0 +1,268 @@
+import pickle
+import random
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+CULL_PROBABILITY = 0.01
+
+
+class SQLiteCache(BaseCache):
+    """Общий кэш в файле SQLite для всех воркеров и процессов одной машины.
+
+    Внешние сервисы не нужны: файл открывается в режиме WAL, так что чтения
+    не ждут записей, а incr/add атомарны за счёт транзакций SQLite.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+        self._created = False
+        self._create_lock = threading.Lock()
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.location, timeout=20, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with self._create_lock:
+                if not self._created:
+                    connection.execute(
+                        'CREATE TABLE IF NOT EXISTS cache '
+                        '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+                    )
+                    self._created = True
+            self._local.connection = connection
+        return connection
+
+    def _expiry(self, timeout):
+        # get_backend_timeout уже возвращает абсолютное время истечения
+        return self.get_backend_timeout(timeout)
+
+    def _fetch(self, key):
+        return self.connection.execute(
+            'SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+
+    def get(self, key, default=None, version=None):
+        row = self._fetch(self.make_and_validate_key(key, version=version))
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expiry(timeout)),
+        )
+        self._maybe_cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, time.time()))
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expiry(timeout)),
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self.connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expiry(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.connection.execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount == 1
+
+    def has_key(self, key, version=None):
+        return self._fetch(self.make_and_validate_key(key, version=version)) is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._fetch(key)
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute('UPDATE cache SET value = ? WHERE key = ?',
+                               (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def _maybe_cull(self):
+        # Просроченные записи чистим изредка, а не на каждую запись
+        if random.random() < CULL_PROBABILITY:
+            self.connection.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок потока: открытие файла дороже запроса
+        pass
+
+
+class RespError(Exception):
+    pass
+
+
+class RespConnection:
+    """Минимальный клиент протокола Redis (RESP2): ровно то, что нужно кэшу."""
+
+    def __init__(self, host, port, db=0, password=None, timeout=5):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.execute('AUTH', password)
+        if db:
+            self.execute('SELECT', db)
+
+    def execute(self, *args):
+        parts = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self.sock.sendall(b''.join(parts))
+        return self.read_reply()
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Соединение с сервером кэша закрыто")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RespError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            return None if length == -1 else [self.read_reply() for _ in range(length)]
+        raise RespError(f"Неизвестный ответ сервера: {line!r}")
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class RespCache(BaseCache):
+    """Кэш поверх любого сервера с протоколом Redis (Redis, Valkey, KeyDB).
+
+    LOCATION: redis://[:пароль@]хост:порт/номер_базы. Сторонние библиотеки не нужны.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        url = urlparse(location)
+        self.host = url.hostname or '127.0.0.1'
+        self.port = url.port or 6379
+        self.db = int(url.path.lstrip('/') or 0)
+        self.password = url.password
+        self._local = threading.local()
+
+    def execute(self, *args):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = RespConnection(self.host, self.port, self.db, self.password)
+            self._local.connection = connection
+        try:
+            return connection.execute(*args)
+        except (OSError, ConnectionError):
+            # Разорванное соединение пересоздаём один раз
+            connection.close()
+            self._local.connection = RespConnection(self.host, self.port, self.db, self.password)
+            return self._local.connection.execute(*args)
+
+    def _seconds(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _expiry_args(self, timeout):
+        timeout = self._seconds(timeout)
+        if timeout is None:
+            return ()
+        return ('PX', max(1, int(timeout * 1000)))
+
+    def _encode(self, value):
+        # Целые храним числом, чтобы INCRBY работал на стороне сервера
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _decode(self, data):
+        try:
+            return int(data)
+        except ValueError:
+            return pickle.loads(data)
+
+    def get(self, key, default=None, version=None):
+        data = self.execute('GET', self.make_and_validate_key(key, version=version))
+        return default if data is None else self._decode(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        timeout = self._seconds(timeout)
+        if timeout is not None and timeout <= 0:
+            self.execute('DEL', key)
+            return
+        self.execute('SET', key, self._encode(value), *self._expiry_args(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.execute('SET', key, self._encode(value), 'NX', *self._expiry_args(timeout)) == 'OK'
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expiry = self._expiry_args(timeout)
+        if not expiry:
+            return bool(self.execute('PERSIST', key)) or self.has_key(key, version=version)
+        return bool(self.execute('PEXPIRE', key, expiry[1]))
+
+    def delete(self, key, version=None):
+        return bool(self.execute('DEL', self.make_and_validate_key(key, version=version)))
+
+    def has_key(self, key, version=None):
+        return bool(self.execute('EXISTS', self.make_and_validate_key(key, version=version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if not self.execute('EXISTS', key):
+            raise ValueError(f"Key '{key}' not found")
+        return self.execute('INCRBY', key, delta)
+
+    def clear(self):
+        self.execute('FLUSHDB')
+
+    def close(self, **kwargs):
+        pass
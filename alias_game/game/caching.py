@@ -0,0 +1,230 @@
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.dispatch import Signal
+from django.http import HttpResponse, HttpResponseNotModified
+
+from .encoding import encoded_response, negotiate
+
+from .metrics import record_cache
+
+# Отправляется после смены версии комнаты: сюда подключаются другие кэши
+# (страницы, состояние в памяти), которым нужно сбросить данные этой комнаты
+room_invalidated = Signal()
+
+
+def version_key(room_id):
+    return f'room:{room_id}:version'
+
+
+def response_key(room_id, version, name):
+    return f'room:{room_id}:v{version}:{name}'
+
+
+def version_timeout():
+    # Комната живёт не дольше суток (ROOM_REAPER['MAX_AGE']), так что счётчик
+    # удалённой комнаты не копится в кэше вечно
+    return getattr(settings, 'ROOM_VERSION_TIMEOUT', 2 * 24 * 3600)
+
+
+def room_version(room_id):
+    version = cache.get(version_key(room_id))
+    if version is None:
+        # Счётчик пропал из кэша - начинаем с метки времени, а не с нуля,
+        # чтобы не совпасть с ключами ответов, закэшированных до вытеснения
+        cache.add(version_key(room_id), time.time_ns() // 1000, timeout=version_timeout())
+        version = cache.get(version_key(room_id))
+    return version
+
+
+async def aroom_version(room_id):
+    version = await cache.aget(version_key(room_id))
+    if version is None:
+        await cache.aadd(version_key(room_id), time.time_ns() // 1000, timeout=version_timeout())
+        version = await cache.aget(version_key(room_id))
+    return version
+
+
+def bump_room_version(room_id):
+    try:
+        return cache.incr(version_key(room_id))
+    except ValueError:
+        return room_version(room_id)
+
+
+async def abump_room_version(room_id):
+    try:
+        return await cache.aincr(version_key(room_id))
+    except ValueError:
+        return await aroom_version(room_id)
+
+
+def invalidate_room(room_id):
+    """Сбросить всё закэшированное по комнате - вызывается мутирующими представлениями.
+
+    Ответы лежат под ключами с версией, поэтому достаточно сменить версию:
+    общий кэш делает это сразу для всех воркеров и узлов.
+    """
+    version = bump_room_version(room_id)
+    room_invalidated.send(sender=None, room_id=room_id, version=version)
+    return version
+
+
+async def ainvalidate_room(room_id):
+    version = await abump_room_version(room_id)
+    await room_invalidated.asend(sender=None, room_id=room_id, version=version)
+    return version
+
+
+def forget_rooms(room_ids):
+    """Сбросить кэш удалённых комнат и убрать их счётчики версий."""
+    for room_id in room_ids:
+        invalidate_room(room_id)
+    cache.delete_many([version_key(room_id) for room_id in room_ids])
+
+
+def _not_modified(request, etag, cache_name='room_response'):
+    if etag in request.headers.get('If-None-Match', ''):
+        record_cache(cache_name, True)
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    return None
+
+
+def _cacheable(response):
+    # Ошибки вида {'success': False} не кэшируем
+    return response.status_code == 200 and getattr(response, 'data', {}).get('success') is True
+
+
+def _cached(entry, variant):
+    body, encoding = entry
+    return encoded_response(body, variant, encoding)
+
+
+def _entry(response):
+    return response.content, response.body_encoding
+
+
+def _finish(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cached_room_response(name):
+    """Кэшировать ответ по (room_id, версия комнаты) и отвечать 304 по ETag.
+
+    Неизменившаяся комната обходится одним обращением к кэшу: без запросов
+    к базе и без кодирования. Каждый вариант ответа (формат, компактность,
+    сжатие - см. encoding.negotiate) кэшируется отдельно. В кэш попадают
+    только успешные ответы. Подходит и для обычных, и для асинхронных представлений.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, room_id, *args, **kwargs):
+                version = await aroom_version(room_id)
+                variant = negotiate(request)
+                etag = f'"{room_id}-{version}-{name}-{variant.key}"'
+                response = _not_modified(request, etag)
+                if response is not None:
+                    return response
+
+                key = response_key(room_id, version, f'{name}:{variant.key}')
+                entry = await cache.aget(key)
+                record_cache('room_response', entry is not None)
+                if entry is not None:
+                    response = _cached(entry, variant)
+                else:
+                    response = await view(request, room_id, *args, **kwargs)
+                    if _cacheable(response):
+                        await cache.aset(key, _entry(response), getattr(settings, 'ROOM_CACHE_TIMEOUT', 300))
+                return _finish(response, etag)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, room_id, *args, **kwargs):
+            version = room_version(room_id)
+            variant = negotiate(request)
+            etag = f'"{room_id}-{version}-{name}-{variant.key}"'
+            response = _not_modified(request, etag)
+            if response is not None:
+                return response
+
+            key = response_key(room_id, version, f'{name}:{variant.key}')
+            entry = cache.get(key)
+            record_cache('room_response', entry is not None)
+            if entry is not None:
+                response = _cached(entry, variant)
+            else:
+                response = view(request, room_id, *args, **kwargs)
+                if _cacheable(response):
+                    cache.set(key, _entry(response), getattr(settings, 'ROOM_CACHE_TIMEOUT', 300))
+            return _finish(response, etag)
+        return wrapper
+    return decorator
+
+
+def build_id():
+    # Страницы ссылаются на файлы с хэшем в имени: после деплоя нужны новые страницы
+    return getattr(staticfiles_storage, 'manifest_hash', '') or 'dev'
+
+
+def _page(content, etag):
+    return _finish(HttpResponse(content), etag)
+
+
+def cached_page(name):
+    """Кэшировать страницу без данных комнаты (оболочку WebApp) до следующего деплоя."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            build = build_id()
+            etag = f'"{name}-{build}"'
+            response = _not_modified(request, etag, 'page')
+            if response is not None:
+                return response
+
+            key = f'page:{name}:{build}'
+            content = cache.get(key)
+            record_cache('page', content is not None)
+            if content is not None:
+                return _page(content, etag)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.content, None)
+            return _finish(response, etag)
+        return wrapper
+    return decorator
+
+
+def cached_room_page(name):
+    """Кэшировать страницу комнаты по (room_id, версия комнаты) - как cached_room_response."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, room_id, *args, **kwargs):
+            version = room_version(room_id)
+            build = build_id()
+            etag = f'"{room_id}-{version}-{name}-{build}"'
+            response = _not_modified(request, etag, 'page')
+            if response is not None:
+                return response
+
+            key = response_key(room_id, version, f'page:{name}:{build}')
+            content = cache.get(key)
+            record_cache('page', content is not None)
+            if content is not None:
+                return _page(content, etag)
+
+            response = view(request, room_id, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.content, getattr(settings, 'ROOM_CACHE_TIMEOUT', 300))
+            return _finish(response, etag)
+        return wrapper
+    return decorator
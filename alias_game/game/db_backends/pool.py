@@ -0,0 +1,182 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def pool_config():
+    return {
+        'ENABLED': False,
+        'SIZE': 10,
+        'TIMEOUT': 10.0,
+        'RECYCLE': 3600,
+        'CHECK_INTERVAL': 30,
+        **getattr(settings, 'DB_POOL', {}),
+    }
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def check_connection(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        logger.debug("Ошибка при закрытии соединения из пула", exc_info=True)
+
+
+class ConnectionPool:
+    """Не больше size открытых соединений с базой на процесс.
+
+    Свободные соединения выдаются в обратном порядке (последнее вернувшееся -
+    первым), так что при спаде нагрузки лишние просто простаивают и уходят по
+    RECYCLE. Соединение, пролежавшее без дела дольше check_interval, перед
+    выдачей проверяется запросом SELECT 1; мёртвое закрывается и заменяется.
+    Проверка и подключение идут вне блокировки пула.
+    """
+
+    def __init__(self, size=10, timeout=10.0, recycle=3600, check_interval=30, check=check_connection,
+                 clock=time.monotonic):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.check_interval = check_interval
+        self.check = check
+        self.clock = clock
+        self._idle = []
+        self._created = {}
+        self._opening = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, connect):
+        deadline = self.clock() + self.timeout
+        while True:
+            taken = self._take(deadline)
+            if taken is None:
+                break
+            conn, idle = taken
+            if self._alive(conn, idle):
+                return conn
+            self._discard(conn)
+
+        try:
+            conn = connect()
+        except BaseException:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._created[id(conn)] = self.clock()
+        return conn
+
+    def _take(self, deadline):
+        """Свободное соединение как (conn, секунд простоя) или None - место под новое."""
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, released = self._idle.pop()
+                    return conn, self.clock() - released
+                if len(self._created) + self._opening < self.size:
+                    self._opening += 1
+                    return None
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    raise PoolTimeout(f'Нет свободных соединений с базой за {self.timeout} с')
+                self._cond.wait(remaining)
+
+    def _alive(self, conn, idle):
+        if self.clock() - self._created[id(conn)] >= self.recycle:
+            return False
+        if idle < self.check_interval:
+            return True
+        try:
+            self.check(conn)
+        except Exception:
+            logger.info("Соединение из пула не прошло проверку, открываю новое")
+            return False
+        return True
+
+    def release(self, conn, broken=False):
+        with self._cond:
+            created = self._created.get(id(conn))
+            if created is not None and not broken and self.clock() - created < self.recycle:
+                self._idle.append((conn, self.clock()))
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def _discard(self, conn):
+        close_quietly(conn)
+        with self._cond:
+            self._created.pop(id(conn), None)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return {'size': self.size, 'open': len(self._created) + self._opening, 'idle': len(self._idle)}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def connection_pool(alias):
+    with _pools_lock:
+        if alias not in _pools:
+            config = pool_config()
+            _pools[alias] = ConnectionPool(config['SIZE'], config['TIMEOUT'], config['RECYCLE'],
+                                           config['CHECK_INTERVAL'])
+        return _pools[alias]
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+class PooledDatabaseMixin:
+    """Соединения DatabaseWrapper берутся из общего пула процесса, а не открываются заново.
+
+    Ставится перед DatabaseWrapper бэкенда. close() возвращает соединение в
+    пул, откатив незавершённую транзакцию; после ошибок базы соединение
+    сначала проверяется и выбрасывается, если не отвечает.
+    """
+
+    def get_new_connection(self, conn_params):
+        return connection_pool(self.alias).acquire(
+            lambda: super(PooledDatabaseMixin, self).get_new_connection(conn_params))
+
+    def _close(self):
+        if self.connection is None:
+            return
+        broken = self.errors_occurred and not self.is_usable()
+        if not broken and not self.autocommit:
+            try:
+                self.connection.rollback()
+            except Exception:
+                broken = True
+        connection_pool(self.alias).release(self.connection, broken=broken)
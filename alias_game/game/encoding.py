@@ -0,0 +1,177 @@
+import gzip
+import json
+from collections import namedtuple
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+MSGPACK_TYPES = (MSGPACK, 'application/x-msgpack', 'application/vnd.msgpack')
+
+# В компактном режиме не дублируется то, что клиент соберёт сам из players
+COMPACT_DROP = ('team_a', 'team_b')
+
+
+def encoding_config():
+    return {
+        'COMPRESS_MIN_SIZE': 1024,
+        'GZIP_LEVEL': 6,
+        'BROTLI_QUALITY': 5,
+        # Пределы для MessagePack из тела запроса: длина строки/байтов и число элементов
+        'MSGPACK_MAX_LEN': 64 * 1024,
+        'MSGPACK_MAX_ITEMS': 10000,
+        **getattr(settings, 'API_ENCODING', {}),
+    }
+
+
+def dumps_json(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def loads_json(body):
+    if orjson is not None:
+        return orjson.loads(body)
+    try:
+        return json.loads(body)
+    except RecursionError as error:
+        # orjson сам ограничивает вложенность, json из стандартной библиотеки - нет
+        raise ValueError('Слишком глубокая вложенность JSON') from error
+
+
+def packb(obj):
+    return msgpack.packb(obj)
+
+
+def unpackb(data):
+    """Разобрать MessagePack из тела запроса. Ошибки, в том числе превышение
+    пределов и слишком глубокая вложенность, - ValueError, как у JSON.
+    """
+    if msgpack is None:
+        raise ValueError('MessagePack не поддерживается: не установлен msgpack')
+    config = encoding_config()
+    try:
+        return msgpack.unpackb(data, max_str_len=config['MSGPACK_MAX_LEN'], max_bin_len=config['MSGPACK_MAX_LEN'],
+                               max_array_len=config['MSGPACK_MAX_ITEMS'], max_map_len=config['MSGPACK_MAX_ITEMS'],
+                               max_ext_len=0)
+    except (ValueError, TypeError, RecursionError, msgpack.UnpackException) as error:
+        raise ValueError(f'Некорректный MessagePack: {error}') from error
+
+
+def parse_header(value):
+    """Разобрать Accept / Accept-Encoding в [(значение, параметры)] по убыванию q."""
+    items = []
+    for index, part in enumerate(value.split(',')):
+        token, *params = [piece.strip() for piece in part.split(';')]
+        if not token:
+            continue
+        params = dict(param.partition('=')[::2] for param in params)
+        try:
+            quality = float(params.pop('q', 1))
+        except ValueError:
+            quality = 0
+        if quality > 0:
+            items.append((-quality, index, token.lower(), params))
+    return [(token, params) for _, _, token, params in sorted(items)]
+
+
+class Variant(namedtuple('Variant', 'format compact encoding')):
+    """Как закодировать ответ этому клиенту: формат, компактность, сжатие."""
+
+    @property
+    def key(self):
+        return '.'.join(filter(None, (self.format, 'compact' if self.compact else '', self.encoding)))
+
+    @property
+    def content_type(self):
+        return MSGPACK if self.format == 'msgpack' else JSON
+
+
+def negotiate(request):
+    fmt, compact = 'json', False
+    for media, params in parse_header(request.headers.get('Accept', '')):
+        if media in MSGPACK_TYPES and msgpack is not None:
+            # Двоичный формат всегда компактный: его выбирают ради размера
+            fmt, compact = 'msgpack', True
+            break
+        if media in (JSON, 'application/*', '*/*'):
+            compact = params.get('compact', '').lower() in ('1', 'true')
+            break
+
+    accepted = [token for token, _ in parse_header(request.headers.get('Accept-Encoding', ''))]
+    encoding = None
+    if brotli is not None and 'br' in accepted:
+        encoding = 'br'
+    elif 'gzip' in accepted:
+        encoding = 'gzip'
+    return Variant(fmt, compact, encoding)
+
+
+def compress(body, encoding):
+    config = encoding_config()
+    if encoding == 'br':
+        return brotli.compress(body, quality=config['BROTLI_QUALITY'])
+    return gzip.compress(body, compresslevel=config['GZIP_LEVEL'], mtime=0)
+
+
+def render(data, variant):
+    """Вернуть (тело, Content-Encoding). Сжимаются только крупные ответы - списки игроков."""
+    if variant.compact:
+        data = {key: value for key, value in data.items() if key not in COMPACT_DROP}
+    body = packb(data) if variant.format == 'msgpack' else dumps_json(data)
+    if variant.encoding and len(body) >= encoding_config()['COMPRESS_MIN_SIZE']:
+        return compress(body, variant.encoding), variant.encoding
+    return body, None
+
+
+def encoded_response(body, variant, encoding, status=200):
+    response = HttpResponse(body, content_type=variant.content_type, status=status)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    return response
+
+
+class ApiResponse(HttpResponse):
+    """Ответ API в формате, который клиент попросил в Accept; исходный dict - в data."""
+
+    def __init__(self, request, data, status=200):
+        self.data = data
+        self.variant = negotiate(request)
+        body, self.body_encoding = render(data, self.variant)
+        super().__init__(body, content_type=self.variant.content_type, status=status)
+        if self.body_encoding:
+            self['Content-Encoding'] = self.body_encoding
+        patch_vary_headers(self, ('Accept', 'Accept-Encoding'))
+
+
+def api_response(request, data, status=200):
+    return ApiResponse(request, data, status=status)
+
+
+def read_request(request):
+    """Тело запроса: JSON или MessagePack - по Content-Type. Разбирается один раз на запрос."""
+    if not hasattr(request, '_api_data'):
+        if request.content_type in MSGPACK_TYPES:
+            request._api_data = unpackb(request.body)
+        else:
+            request._api_data = loads_json(request.body)
+    return request._api_data
@@ -0,0 +1,471 @@
+import atexit
+import logging
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import record_cache
+from .models import GameRoom, pick_turn_players
+from .sharding import database_for
+from .words import WordDeck, get_words
+
+logger = logging.getLogger(__name__)
+
+Member = namedtuple('Member', 'pk user_id username team score')
+
+SCORE_FIELDS = {'A': 'score_a', 'B': 'score_b'}
+
+# Сколько раз amutate перечитывает комнату при конфликте версий
+MUTATE_ATTEMPTS = 5
+
+
+class RoomConflict(Exception):
+    """Комнату одновременно изменил другой запрос: изменение не записано, его можно повторить."""
+
+    def __init__(self, room_id):
+        super().__init__('Комната занята, повторите запрос')
+        self.room_id = room_id
+
+
+class RoomState:
+    """Компактное состояние активной комнаты: счёт, ротация, состав и слова."""
+
+    __slots__ = (
+        'pk', 'room_id', 'creator_id', 'creator_name', 'difficulty', 'word_pack', 'target_score', 'time_per_turn',
+        'is_game_started', 'current_team', 'current_explainer_index', 'current_guesser_index',
+        'score_a', 'score_b', 'deck_seed', 'deck_cursor', 'turn_cursor', 'turn_deadline', 'version', 'roster',
+        'dirty', 'deltas', 'lock',
+    )
+
+    def __init__(self, room, players):
+        self.pk = room.pk
+        self.room_id = room.room_id
+        self.creator_id = room.creator_id
+        self.creator_name = room.creator_name
+        self.difficulty = room.difficulty
+        self.word_pack = room.word_pack
+        self.target_score = room.target_score
+        self.time_per_turn = room.time_per_turn
+        self.roster = tuple(Member(p.pk, p.user_id, p.username, p.team, p.score) for p in players)
+        self.lock = threading.RLock()
+        self.reload(room)
+
+    def reload(self, room):
+        self.is_game_started = room.is_game_started
+        self.current_team = room.current_team
+        self.current_explainer_index = room.current_explainer_index
+        self.current_guesser_index = room.current_guesser_index
+        self.score_a = room.score_a
+        self.score_b = room.score_b
+        self.deck_seed = room.deck_seed
+        self.deck_cursor = room.deck_cursor
+        self.turn_cursor = room.turn_cursor
+        self.turn_deadline = room.turn_deadline
+        self.version = room.version
+        # dirty - поля, записываемые целиком; deltas - приращения очков через F()
+        self.dirty = set()
+        self.deltas = {}
+
+    def team(self, team):
+        return [member for member in self.roster if member.team == team]
+
+    def get_current_players(self):
+        return pick_turn_players(self.team(self.current_team),
+                                 self.current_explainer_index, self.current_guesser_index)
+
+    def is_explainer(self, user_id):
+        explainer, _ = self.get_current_players()
+        return explainer is not None and explainer.user_id == user_id
+
+    def turn_expired(self, now=None):
+        return self.turn_deadline is not None and (now or timezone.now()) >= self.turn_deadline
+
+    def turn_error(self, user_id):
+        if not self.is_explainer(user_id):
+            return 'Не ваш ход'
+        if self.turn_expired():
+            return 'Время хода вышло'
+        return None
+
+    def start_turn(self):
+        # Отсчёт идёт с первого слова хода; повторные вызовы срок не продлевают
+        if self.turn_deadline is not None:
+            return False
+        self.turn_deadline = timezone.now() + timedelta(seconds=self.time_per_turn)
+        self.dirty.add('turn_deadline')
+        return True
+
+    def end_turn(self):
+        # Неподтверждённые слова очереди сгорают: следующий объясняющий их не увидит
+        self.turn_deadline = None
+        self.turn_cursor = self.deck_cursor
+        self.dirty.update(('turn_deadline', 'turn_cursor'))
+
+    def winner(self):
+        if self.score_a >= self.target_score:
+            return 'A'
+        if self.score_b >= self.target_score:
+            return 'B'
+        return None
+
+    def reached_target(self, deltas):
+        """Довели ли приращения deltas (уже учтённые в счёте) игру до конца."""
+        before = [getattr(self, field) - deltas.get(field, 0) for field in SCORE_FIELDS.values()]
+        return self.winner() is not None and max(before) < self.target_score
+
+    def start(self):
+        self.is_game_started = True
+        self.dirty.add('is_game_started')
+
+    def add_point(self):
+        field = SCORE_FIELDS[self.current_team]
+        setattr(self, field, getattr(self, field) + 1)
+        self.deltas[field] = self.deltas.get(field, 0) + 1
+
+    def deck(self):
+        return WordDeck(get_words(self.difficulty, self.word_pack), self.deck_seed, self.deck_cursor)
+
+    def draw_word(self):
+        deck = self.deck()
+        word = deck.draw()
+        # Слово выдано сразу: очередь, если была, больше не действует
+        self.deck_cursor = self.turn_cursor = deck.cursor
+        self.dirty.update(('deck_cursor', 'turn_cursor'))
+        return word
+
+    def word_queue(self):
+        deck = self.deck()
+        return [(position, deck.word_at(position)) for position in range(self.turn_cursor, self.deck_cursor)]
+
+    def reserve_words(self, size):
+        missing = size - (self.deck_cursor - self.turn_cursor)
+        if missing > 0:
+            self.deck_cursor += missing
+            self.dirty.add('deck_cursor')
+
+    def can_confirm(self, position, count=1):
+        return position == self.turn_cursor and position + count <= self.deck_cursor
+
+    def confirm_word(self):
+        self.turn_cursor += 1
+        self.dirty.add('turn_cursor')
+
+    def rotate_turn(self):
+        team_size = len(self.team(self.current_team))
+        self.current_explainer_index = self.current_guesser_index
+        self.current_guesser_index = (self.current_guesser_index + 1) % team_size
+
+        if self.current_explainer_index == self.current_guesser_index:
+            self.current_guesser_index = (self.current_guesser_index + 1) % team_size
+
+        self.dirty.update(('current_explainer_index', 'current_guesser_index'))
+        self.end_turn()
+
+    def switch_team(self):
+        self.current_team = 'B' if self.current_team == 'A' else 'A'
+        self.current_explainer_index = 0
+        self.current_guesser_index = 1
+        self.dirty.update(('current_team', 'current_explainer_index', 'current_guesser_index'))
+        self.end_turn()
+
+    def take_changes(self):
+        changes = {field: getattr(self, field) for field in self.dirty}, self.deltas
+        self.dirty, self.deltas = set(), {}
+        return changes
+
+    def restore_changes(self, fields, deltas):
+        self.dirty |= set(fields)
+        for field, delta in deltas.items():
+            self.deltas[field] = self.deltas.get(field, 0) + delta
+
+
+class RoomEngine:
+    """Держит состояние активных комнат в памяти процесса.
+
+    В режиме write-behind горячие действия работают с объектом в памяти,
+    а изменения сбрасываются в GameRoom пачками по таймеру или в конце хода.
+    Без него (по умолчанию) состояние читается из базы на каждый запрос
+    и записывается сразу - так несколько воркеров не расходятся между собой.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    @property
+    def config(self):
+        return getattr(settings, 'ROOM_ENGINE', {})
+
+    @property
+    def write_behind(self):
+        return self.config.get('WRITE_BEHIND', False)
+
+    def get(self, room_id):
+        if self.write_behind:
+            with self._lock:
+                state = self._states.get(room_id)
+            record_cache('room_state', state is not None)
+            if state is not None:
+                return state
+
+        state = self.load(room_id)
+
+        if self.write_behind:
+            with self._lock:
+                state = self._states.setdefault(room_id, state)
+        return state
+
+    async def aget(self, room_id):
+        if self.write_behind:
+            with self._lock:
+                state = self._states.get(room_id)
+            record_cache('room_state', state is not None)
+            if state is not None:
+                return state
+
+        state = await self.aload(room_id)
+
+        if self.write_behind:
+            with self._lock:
+                state = self._states.setdefault(room_id, state)
+        return state
+
+    async def aload(self, room_id):
+        room = await GameRoom.objects.using(database_for(room_id)).with_roster().aget(room_id=room_id)
+        return RoomState(room, room.players.all())
+
+    def adopt(self, room):
+        """Состояние для уже загруженной (with_roster) комнаты - для пакетной обработки."""
+        if self.write_behind:
+            with self._lock:
+                state = self._states.get(room.room_id)
+                if state is None:
+                    state = self._states[room.room_id] = RoomState(room, room.players.all())
+            return state
+        return RoomState(room, room.players.all())
+
+    def load(self, room_id, for_update=False):
+        rooms = GameRoom.objects.using(database_for(room_id)).with_roster()
+        if for_update:
+            rooms = rooms.select_for_update()
+        room = rooms.get(room_id=room_id)
+        return RoomState(room, room.players.all())
+
+    @contextmanager
+    def mutate(self, room_id, flush=False):
+        """Изменить комнату без гонок чтение-изменение-запись.
+
+        В write-behind состояние принадлежит процессу и защищено его блокировкой.
+        Иначе строка комнаты блокируется select_for_update до конца транзакции,
+        а изменения пишутся с проверкой версии.
+        """
+        if self.write_behind:
+            state = self.get(room_id)
+            with state.lock:
+                yield state
+                self.commit(state, flush=flush)
+            return
+
+        with transaction.atomic(using=database_for(room_id)):
+            state = self.load(room_id, for_update=True)
+            yield state
+            self.flush_states([state])
+
+    async def amutate(self, room_id, change, attempts=MUTATE_ATTEMPTS):
+        """Асинхронный аналог mutate: вернуть (state, change(state), finished).
+
+        Асинхронный ORM не умеет транзакций и select_for_update, поэтому без
+        write-behind изменение пишется с проверкой версии, а при конфликте
+        комната перечитывается и change применяется заново. change должен
+        только менять состояние - без обращений к базе. finished - именно эта
+        запись довела счёт до цели: из параллельных запросов так ответит один.
+        """
+        if self.write_behind:
+            state = await self.aget(room_id)
+            with state.lock:
+                playing = state.winner() is None
+                result = change(state)
+                self.commit(state)
+                return state, result, playing and state.winner() is not None
+
+        for _ in range(attempts):
+            state = await self.aload(room_id)
+            result = change(state)
+            fields, deltas = state.take_changes()
+            finished = await self._awrite(state, fields, deltas)
+            if finished is not None:
+                return state, result, finished
+        raise RoomConflict(room_id)
+
+    async def _awrite(self, state, fields, deltas):
+        """Записать изменения; None при конфликте версий, иначе - кончилась ли ими игра."""
+        if not fields and not deltas:
+            return False
+
+        rooms = GameRoom.objects.using(database_for(state.room_id)).filter(pk=state.pk)
+        increments = {field: F(field) + delta for field, delta in deltas.items()}
+        changes = dict(fields, **increments, last_activity=timezone.now(), version=F('version') + 1)
+
+        if fields:
+            if not await rooms.filter(version=state.version).aupdate(**changes):
+                return None
+            # Версия совпала: счёт до записи был ровно тот, что в state
+            finished = state.reached_target(deltas)
+        else:
+            finished = await self._aincrement(rooms, state.target_score, deltas, changes)
+
+        if deltas:
+            state.score_a, state.score_b, state.version = await rooms.values_list(
+                'score_a', 'score_b', 'version').aget()
+        else:
+            state.version += 1
+        return finished
+
+    async def _aincrement(self, rooms, target, deltas, changes):
+        """Приращения очков без проверки версии; True, если именно они довели счёт до цели.
+
+        Счёт не убывает, а каждый UPDATE проверяет условие по строке атомарно,
+        поэтому из параллельных запросов через цель переходит ровно один.
+        """
+        playing = rooms.filter(score_a__lt=target, score_b__lt=target)
+        below = {f'{field}__lt': target - delta for field, delta in deltas.items()}
+        if await playing.filter(**below).aupdate(**changes):
+            return False
+        if await playing.aupdate(**changes):
+            return True
+        await rooms.aupdate(**changes)
+        return False
+
+    def commit(self, state, flush=False):
+        if not state.dirty and not state.deltas:
+            return
+
+        if not self.write_behind or flush:
+            self.flush_states([state])
+            return
+
+        with self._lock:
+            self._dirty.add(state.room_id)
+        self._ensure_flusher()
+
+    def flush(self):
+        with self._lock:
+            states = [self._states[room_id] for room_id in self._dirty if room_id in self._states]
+            self._dirty.clear()
+        self.flush_states(states)
+        return len(states)
+
+    def flush_states(self, states):
+        # Комнаты разных шардов пишутся каждая в свою базу, одной транзакцией на базу
+        groups = {}
+        for state in states:
+            groups.setdefault(database_for(state.room_id), []).append(state)
+        for using, group in groups.items():
+            self._flush_group(using, group)
+
+    def _flush_group(self, using, states):
+        taken = []
+        try:
+            # Без точки сохранения: внутри mutate() это лишний SAVEPOINT на каждый сброс
+            with transaction.atomic(using=using, savepoint=False):
+                for state in states:
+                    with state.lock:
+                        fields, deltas = state.take_changes()
+                        if not fields and not deltas:
+                            continue
+                        taken.append((state, fields, deltas))
+                        self._write(using, state, fields, deltas)
+        except Exception:
+            # Не потерять изменения: попробуем ещё раз при следующем сбросе
+            for state, fields, deltas in taken:
+                with state.lock:
+                    state.restore_changes(fields, deltas)
+            if self.write_behind:
+                with self._lock:
+                    self._dirty.update(state.room_id for state, _, _ in taken)
+            raise
+
+    def _write(self, using, state, fields, deltas):
+        rooms = GameRoom.objects.using(using).filter(pk=state.pk)
+        increments = {field: F(field) + delta for field, delta in deltas.items()}
+        # Отметка активности едет в той же записи - отдельного запроса не нужно
+        activity = {'last_activity': timezone.now()}
+
+        if fields:
+            # Оптимистическая проверка: строку не должен был менять никто другой
+            updated = rooms.filter(version=state.version).update(
+                **fields, **increments, **activity, version=F('version') + 1,
+            )
+            if not updated:
+                if not self.write_behind:
+                    # Транзакция mutate откатится, а запрос получит ошибку, а не ложный успех
+                    raise RoomConflict(state.room_id)
+                # В write-behind комнатой владеет этот процесс, и клиенты уже видят его
+                # состояние: изменённые им поля ложатся поверх чужой записи, а не теряются
+                logger.warning("Комната %s изменена другим процессом, записываю поверх", state.room_id)
+                rooms.update(**fields, **increments, **activity, version=F('version') + 1)
+                state.version = rooms.values_list('version', flat=True).get()
+                return
+        else:
+            # Приращения коммутативны - версию проверять не нужно
+            rooms.update(**increments, **activity, version=F('version') + 1)
+
+        if deltas and not self.write_behind:
+            # Вернуть клиенту итоговый счёт с учётом параллельных запросов
+            state.score_a, state.score_b, state.version = rooms.values_list(
+                'score_a', 'score_b', 'version').get()
+        else:
+            state.version += 1
+
+    def add_member_scores(self, room_id, points):
+        """Прибавить очки игрокам в составе комнаты в памяти: в базу их уже записал журнал."""
+        with self._lock:
+            state = self._states.get(room_id)
+        if state is None:
+            return
+        with state.lock:
+            state.roster = tuple(member._replace(score=member.score + points.get(member.user_id, 0))
+                                 for member in state.roster)
+
+    def forget(self, room_id, flush=True):
+        # Состав комнаты изменился или она удалена: сбросить и перечитать при следующем обращении
+        with self._lock:
+            state = self._states.pop(room_id, None)
+            self._dirty.discard(room_id)
+        if state is not None and flush:
+            self.flush_states([state])
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self._dirty.clear()
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='room-engine-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.config.get('FLUSH_INTERVAL', 2.0))
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Ошибка при сбросе состояния комнат в базу")
+
+
+engine = RoomEngine()
+atexit.register(engine.flush)
@@ -0,0 +1,238 @@
+import logging
+from collections import Counter, defaultdict, namedtuple
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .caching import invalidate_room
+from .engine import RoomState, engine
+from .models import GameEvent, GameResult, GameRoom, Player, PlayerStats
+from .scheduling import BatchWriter
+from .sharding import database_for, group_by_database
+
+logger = logging.getLogger(__name__)
+
+# Что каждое событие добавляет к итогам: (поле объясняющего/игрока, поле угадывающего)
+EVENT_COUNTERS = {
+    'guessed': (('words_explained',), ('words_guessed',)),
+    'skip': (('words_skipped',), ()),
+    'turn': (('turns',), ()),
+    'won': (('games', 'wins'), ()),
+    'lost': (('games',), ()),
+}
+
+LEADERBOARDS = {
+    'wins': ('-wins', 'user_id'),
+    'explained': ('-words_explained', 'user_id'),
+    'guess_rate': ('-guess_rate', 'user_id'),
+}
+
+# Запись журнала и имена её участников - для строки итогов нового игрока
+Record = namedtuple('Record', 'event names')
+
+# Отчёт WebApp о конце игры (game/results.py). Итог по нему сервер собирает
+# сам из комнаты, как game_records: клиенту здесь доверять нельзя.
+Report = namedtuple('Report', 'user_id room_id')
+
+
+def history_config():
+    return {
+        'BATCH_SIZE': 500,
+        'FLUSH_INTERVAL': 1.0,
+        'MIN_WORDS': 20,
+        **getattr(settings, 'GAME_HISTORY', {}),
+    }
+
+
+def make_record(state, kind, member, partner=None):
+    names = {member.user_id: member.username}
+    if partner is not None:
+        names[partner.user_id] = partner.username
+    return Record(GameEvent(
+        room_pk=state.pk, room_code=state.room_id, kind=kind, user_id=member.user_id,
+        partner_id=partner.user_id if partner else None, team=member.team,
+    ), names)
+
+
+def word_records(state, actions):
+    explainer, guesser = state.get_current_players()
+    return [make_record(state, action, explainer, guesser)
+            for action in actions if action in ('guessed', 'skip')]
+
+
+def turn_records(state):
+    """Запись о сыгранном ходе; вызывается до передачи хода, пока объясняющий прежний."""
+    explainer, _ = state.get_current_players()
+    # Ход без единого слова не начинался - и не считается
+    if explainer is None or state.turn_deadline is None:
+        return []
+    return [make_record(state, 'turn', explainer)]
+
+
+def game_records(state):
+    winner = state.winner()
+    return [make_record(state, 'won' if member.team == winner else 'lost', member)
+            for member in state.roster] + [GameResult.from_room(state)]
+
+
+def report_records(reports):
+    """Итоги игр из отчётов: только законченных и только от тех, кто в комнате играл.
+
+    Два запроса на каждую базу шарда с комнатами из отчётов.
+    """
+    reporters = defaultdict(set)
+    for report in reports:
+        reporters[report.room_id].add(report.user_id)
+
+    records = []
+    for using, room_ids in group_by_database(reporters).items():
+        for room in GameRoom.objects.using(using).with_roster().filter(room_id__in=room_ids):
+            state = RoomState(room, room.players.all())
+            if state.winner() and reporters[state.room_id] & {member.user_id for member in state.roster}:
+                records.extend(game_records(state))
+    return records
+
+
+def new_games(results):
+    """Коды комнат, итог которых ещё не записан; сами итоги вставляются в базу.
+
+    Итог комнаты пишется один раз, и только вместе с ним засчитываются победы
+    и поражения - повторный итог той же игры (второй запрос, дошедший до
+    победного очка, или повторный отчёт) итогов игроков не меняет. Если
+    параллельная пачка успела записать ту же комнату, вставка падает на
+    уникальном индексе, и пачка целиком повторяется при следующем сбросе.
+    """
+    games = {}
+    for result in results:
+        games.setdefault(result.room_code, result)
+    if not games:
+        return set()
+    recorded = set(GameResult.objects.filter(room_code__in=games).values_list('room_code', flat=True))
+    GameResult.objects.bulk_create([result for code, result in games.items() if code not in recorded])
+    return set(games) - recorded
+
+
+def write_records(records):
+    """Записать пачку журнала и обновить итоги: не больше семи запросов на пачку любого размера
+    (и ещё по два на базу шарда, если в пачке есть отчёты WebApp).
+
+    Отчёты превращаются в те же записи итога, что и конец игры на сервере,
+    поэтому игра засчитывается один раз, откуда бы ни пришёл её итог.
+    События вставляются одним bulk_create, итоги игроков читаются под блокировкой и пишутся одним
+    bulk_update - параллельные пачки из других процессов не теряют приращений. Player.score растёт
+    одним UPDATE с CASE по игрокам (по одному на базу шарда) после коммита журнала.
+    """
+    reports = [record for record in records if isinstance(record, Report)]
+    if reports:
+        records = [record for record in records if not isinstance(record, Report)] + report_records(reports)
+    results = [record for record in records if isinstance(record, GameResult)]
+
+    with transaction.atomic():
+        games = new_games(results)
+
+        events, names, counters, scores = [], {}, defaultdict(Counter), defaultdict(Counter)
+        outcomes, room_points = set(), defaultdict(Counter)
+        for record in records:
+            if not isinstance(record, Record):
+                continue
+            event = record.event
+            if event.kind in ('won', 'lost'):
+                if event.room_code not in games or (event.room_code, event.user_id) in outcomes:
+                    continue
+                outcomes.add((event.room_code, event.user_id))
+            events.append(event)
+            names.update(record.names)
+            own, partner = EVENT_COUNTERS[event.kind]
+            counters[event.user_id].update(own)
+            if event.partner_id is not None:
+                counters[event.partner_id].update(partner)
+            if event.kind == 'guessed':
+                scores[database_for(event.room_code)][event.room_pk, event.user_id] += 1
+                room_points[event.room_code][event.user_id] += 1
+
+        GameEvent.objects.bulk_create(events, batch_size=500)
+
+        counters = {user_id: counter for user_id, counter in counters.items() if counter}
+        if counters:
+            PlayerStats.objects.bulk_create(
+                [PlayerStats(user_id=user_id, username=names.get(user_id, '')) for user_id in counters],
+                ignore_conflicts=True,
+            )
+            now = timezone.now()
+            stats = list(PlayerStats.objects.select_for_update().filter(user_id__in=counters))
+            for row in stats:
+                row.add(counters[row.user_id])
+                row.username = names.get(row.user_id, row.username)
+                row.updated_at = now
+            PlayerStats.objects.bulk_update(
+                stats, [*PlayerStats.COUNTERS, 'guess_rate', 'username', 'updated_at'], batch_size=500)
+
+    # Очки в комнатах - уже после коммита журнала: базы шардов не входят в его транзакцию,
+    # и сбой здесь не должен вернуть пачку в буфер - повторная запись засчитала бы очки дважды
+    for using, points in scores.items():
+        try:
+            add_player_scores(using, points)
+        except Exception:
+            logger.exception("Не удалось прибавить очки игрокам в базе %s", using)
+
+    # Очки игроков изменились в базе: состав в памяти и кэш ответов комнаты устарели
+    for room_id, points in room_points.items():
+        engine.add_member_scores(room_id, points)
+        invalidate_room(room_id)
+    return len(events)
+
+
+def add_player_scores(using, points):
+    """Прибавить Player.score одним UPDATE с CASE: points - {(room_pk, user_id): очки}."""
+    Player.objects.using(using).filter(reduce(or_, (Q(room_id=room, user_id=user) for room, user in points))).update(
+        score=F('score') + Case(*(When(room_id=room, user_id=user, then=Value(value))
+                                  for (room, user), value in points.items()), default=Value(0)),
+    )
+
+
+events = BatchWriter('game-history', write_records, history_config)
+
+
+def log(records):
+    """Добавить записи в журнал; True, если пачка набрана и её пора сбросить.
+
+    Сама запись в базу здесь не делается, поэтому log можно звать и из
+    асинхронных представлений.
+    """
+    return bool(records) and events.append(*records)
+
+
+def flush():
+    # Ошибка журнала не должна ломать сам ход: записи останутся в буфере
+    try:
+        events.flush()
+    except Exception:
+        logger.exception("Не удалось записать журнал игры")
+
+
+def leaderboard(by='wins', limit=20):
+    """Лучшие игроки по итогам. Читает только PlayerStats, по индексу на поле сортировки."""
+    stats = PlayerStats.objects.order_by(*LEADERBOARDS[by])
+    if by == 'guess_rate':
+        # Два слова из двух - ещё не лучший результат
+        stats = stats.annotate(attempts=F('words_explained') + F('words_skipped')).filter(
+            attempts__gte=history_config()['MIN_WORDS'])
+    return list(stats[:limit])
+
+
+def stats_info(row):
+    return {
+        'user_id': row.user_id,
+        'username': row.username,
+        'words_explained': row.words_explained,
+        'words_skipped': row.words_skipped,
+        'words_guessed': row.words_guessed,
+        'guess_rate': round(row.guess_rate, 4),
+        'turns': row.turns,
+        'games': row.games,
+        'wins': row.wins,
+    }
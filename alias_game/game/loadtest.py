@@ -0,0 +1,242 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from urllib.error import URLError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import Resolver404, resolve
+
+from .models import GameRoom
+from .sharding import group_by_database
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def endpoint_name(path):
+    try:
+        return resolve(urlparse(path).path).url_name
+    except Resolver404:
+        return path
+
+
+class QueryCounter:
+    """Считает SQL-запросы каждого потока сервера через execute_wrapper."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def start(self):
+        connection_created.connect(self.install, weak=False)
+        for connection in connections.all():
+            self.install(connection=connection)
+
+    def stop(self):
+        connection_created.disconnect(self.install)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    def reset(self):
+        self.local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self.local, 'count', 0)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer:
+    """Django в потоке на свободном порту - тот же стек, что у runserver.
+
+    Заодно считает запросы к базе по каждому эндпоинту: снаружи это не видно.
+    """
+
+    def __init__(self):
+        self.queries = defaultdict(list)
+        self.counter = QueryCounter()
+        self.handler = WSGIHandler()
+        self._lock = threading.Lock()
+
+    def app(self, environ, start_response):
+        self.counter.reset()
+        response = self.handler(environ, start_response)
+        with self._lock:
+            self.queries[endpoint_name(environ['PATH_INFO'])].append(self.counter.count)
+        return response
+
+    def __enter__(self):
+        self.counter.start()
+        self.httpd = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        self.httpd.set_app(self.app)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='loadtest-server', daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.counter.stop()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name, latency, ok):
+        with self._lock:
+            self.latencies[name].append(latency)
+            self.errors[name] += not ok
+
+    def report(self, elapsed, queries=None):
+        endpoints = {}
+        for name, latencies in sorted(self.latencies.items()):
+            counts = (queries or {}).get(name)
+            endpoints[name] = {
+                'requests': len(latencies),
+                'errors': self.errors[name],
+                'error_rate': round(self.errors[name] / len(latencies), 4),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+                'queries_avg': round(sum(counts) / len(counts), 2) if counts else None,
+                'queries_max': max(counts) if counts else None,
+            }
+
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        errors = sum(self.errors.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'requests': total,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0,
+            'throughput_rps': round(total / elapsed, 1) if elapsed else 0,
+            'endpoints': endpoints,
+        }
+
+
+class GameFlowLoad:
+    """N комнат по M игроков проходят полный сценарий игры, пока все игроки
+    опрашивают состояние комнаты, как это делает game.html без WebSocket.
+
+    Сценарий комнаты: create-room -> join-team каждым игроком -> start-game ->
+    turns раз (game-state, word-queue, words раз actions [guessed] с позицией слова, next-turn).
+    """
+
+    def __init__(self, url, rooms=10, players=4, turns=5, words=5, poll_interval=3.0, timeout=10):
+        if players < 4:
+            raise ValueError("Для игры нужно минимум по 2 игрока в каждой команде")
+        self.url = url.rstrip('/')
+        self.rooms = rooms
+        self.players = players
+        self.turns = turns
+        self.words = words
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.recorder = Recorder()
+        self.room_ids = []
+        self._stop = threading.Event()
+
+    def call(self, path, data=None):
+        body = None if data is None else json.dumps(data).encode()
+        request = Request(self.url + path, data=body, headers={'Content-Type': 'application/json'})
+        started = time.perf_counter()
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                payload = json.loads(response.read())
+                ok = response.status == 200 and payload.get('success', False)
+        except (URLError, OSError, ValueError):
+            payload, ok = {}, False
+        self.recorder.add(endpoint_name(path), time.perf_counter() - started, ok)
+        return payload
+
+    def play_room(self, number):
+        base = 1_000_000 * (number + 1)
+        creator = base
+        room_id = self.call('/api/create-room/', {'user_id': creator, 'username': f'load{creator}'}).get('room_id')
+        if not room_id:
+            return
+        self.room_ids.append(room_id)
+
+        users = [base + index for index in range(self.players)]
+        for index, user_id in enumerate(users):
+            self.call('/api/join-team/', {
+                'room_id': room_id, 'user_id': user_id, 'username': f'load{user_id}',
+                'team': 'AB'[index % 2],
+            })
+
+        pollers = [threading.Thread(target=self.poll, args=(room_id,), daemon=True) for _ in users]
+        for poller in pollers:
+            poller.start()
+
+        self.call('/api/start-game/', {'room_id': room_id, 'user_id': creator})
+        for _ in range(self.turns):
+            state = self.call(f'/api/game-state/{room_id}/')
+            explainer = (state.get('explainer') or {}).get('id')
+            if explainer is None:
+                break
+            action = {'room_id': room_id, 'user_id': explainer}
+            queue = self.call('/api/word-queue/', action).get('queue') or [{'position': 0}]
+            position = queue[0]['position']
+            for _ in range(self.words):
+                self.call('/api/actions/', dict(action, actions=['guessed'], position=position))
+                position += 1
+            self.call('/api/next-turn/', action)
+
+    def poll(self, room_id):
+        while not self._stop.wait(self.poll_interval):
+            self.call(f'/api/game-state/{room_id}/')
+            self.call(f'/api/room/{room_id}/')
+
+    def run(self):
+        players = [threading.Thread(target=self.play_room, args=(number,)) for number in range(self.rooms)]
+        started = time.perf_counter()
+        for player in players:
+            player.start()
+        for player in players:
+            player.join()
+        self._stop.set()
+        return time.perf_counter() - started
+
+
+def run_load(url=None, **options):
+    """Прогнать нагрузку и вернуть отчёт. Без url поднимается локальный сервер
+    на настроенной базе, и тогда в отчёте есть число SQL-запросов."""
+    if url:
+        load = GameFlowLoad(url, **options)
+        return load.recorder.report(load.run())
+
+    with LocalServer() as server:
+        load = GameFlowLoad(server.url, **options)
+        elapsed = load.run()
+        # Опросчики могут быть посреди запроса - дать им закончить
+        time.sleep(0.1)
+
+    report = load.recorder.report(elapsed, server.queries)
+    # Локальный прогон не оставляет после себя комнат
+    for using, room_ids in group_by_database(load.room_ids).items():
+        GameRoom.objects.using(using).filter(room_id__in=room_ids).delete()
+    return report
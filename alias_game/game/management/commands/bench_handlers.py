@@ -0,0 +1,162 @@
+import asyncio
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from game.loadtest import percentile
+from game.models import GameRoom, Player
+
+
+def summarize(latencies, errors, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = "Сравнить пропускную способность горячих эндпоинтов через ASGI и WSGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Запросов на каждый режим")
+        parser.add_argument('--concurrency', type=int, default=32, help="Одновременных запросов")
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help="Искусственная задержка каждого SQL-запроса, мс (медленная база)")
+        parser.add_argument('--json', help="Сохранить результаты в файл")
+
+    def handle(self, *args, **options):
+        # Первый конкретный хост из ALLOWED_HOSTS, иначе Django ответит 400
+        self.host = next((host for host in settings.ALLOWED_HOSTS
+                          if host != '*' and not host.startswith('.')), 'localhost')
+        if options['db_latency']:
+            self.slow_down_database(options['db_latency'] / 1000)
+
+        room = GameRoom(creator_id=1, creator_name='bench', is_game_started=True)
+        room.save()
+        try:
+            for user_id, team in ((100, 'A'), (101, 'A'), (102, 'B'), (103, 'B')):
+                Player.objects.using(room._state.db).create(
+                    room=room, user_id=user_id, username=f'bench{user_id}', team=team)
+
+            plan = list(islice(cycle(self.request_mix(room.room_id)), options['requests']))
+            results = {
+                'asgi': asyncio.run(self.run_asgi(plan, options['concurrency'])),
+                'wsgi': self.run_wsgi(plan, options['concurrency']),
+            }
+        finally:
+            room.delete()
+
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode}: {result['rps']} rps, p50 {result['p50_ms']} мс, "
+                f"p99 {result['p99_ms']} мс, ошибок {result['errors']}"
+            )
+        if options['json']:
+            with open(options['json'], 'w') as output:
+                json.dump(dict(results, options={
+                    key: options[key] for key in ('requests', 'concurrency', 'db_latency')
+                }), output, indent=2)
+
+    def slow_down_database(self, delay):
+        def slow(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            if slow not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow)
+
+        connection_created.connect(install, weak=False)
+        for connection in connections.all():
+            install(None, connection)
+
+    def request_mix(self, room_id):
+        # Так выглядит ход: опросы состояния, слово, угаданное слово
+        guess = json.dumps({'room_id': room_id, 'user_id': 100}).encode()
+        return [
+            ('GET', f'/api/game-state/{room_id}/', b''),
+            ('GET', f'/api/room/{room_id}/', b''),
+            ('POST', '/api/get-word/', guess),
+            ('GET', f'/api/game-state/{room_id}/', b''),
+            ('POST', '/api/word-guessed/', guess),
+        ]
+
+    async def run_asgi(self, plan, concurrency):
+        handler = ASGIHandler()
+        requests = iter(plan)
+        latencies, errors = [], 0
+
+        async def call(method, path, body):
+            messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            status = None
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # Клиент не отключается: Django сам снимет ожидание по окончании ответа
+                await asyncio.Future()
+
+            async def send(message):
+                nonlocal status
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+
+            await handler({
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': method, 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                'root_path': '', 'scheme': 'http', 'server': (self.host, 80),
+                'client': ('127.0.0.1', 50000),
+                'headers': [(b'host', self.host.encode()), (b'content-type', b'application/json')],
+            }, receive, send)
+            return status
+
+        async def worker():
+            nonlocal errors
+            for method, path, body in requests:
+                started = time.perf_counter()
+                status = await call(method, path, body)
+                latencies.append(time.perf_counter() - started)
+                errors += status != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(latencies, errors, time.perf_counter() - started)
+
+    def run_wsgi(self, plan, concurrency):
+        handler = WSGIHandler()
+
+        def call(request):
+            method, path, body = request
+            statuses = []
+            started = time.perf_counter()
+            response = handler({
+                'REQUEST_METHOD': method, 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+                'SERVER_NAME': self.host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'REMOTE_ADDR': '127.0.0.1', 'HTTP_HOST': self.host,
+                'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+                'wsgi.input': io.BytesIO(body), 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+                'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            }, lambda status, headers: statuses.append(int(status.split()[0])))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return time.perf_counter() - started, statuses[0]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            calls = list(pool.map(call, plan))
+        elapsed = time.perf_counter() - started
+        return summarize([latency for latency, _ in calls], sum(status != 200 for _, status in calls), elapsed)
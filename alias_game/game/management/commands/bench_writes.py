@@ -0,0 +1,155 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from game.db_backends.pool import ConnectionPool
+from game.loadtest import percentile
+
+# Настройки SQLite по умолчанию - то, с чем игра работала до профиля
+DEFAULT_PRAGMAS = ('PRAGMA journal_mode = DELETE', 'PRAGMA synchronous = FULL')
+
+SCHEMA = (
+    'CREATE TABLE room (id INTEGER PRIMARY KEY, score INTEGER NOT NULL, version INTEGER NOT NULL)',
+    'CREATE TABLE event (id INTEGER PRIMARY KEY, room_id INTEGER NOT NULL, kind TEXT NOT NULL, created REAL)',
+)
+
+
+def tuned_pragmas():
+    return tuple(f'PRAGMA {name} = {value}' for name, value in settings.SQLITE_TUNING.items())
+
+
+class Command(BaseCommand):
+    help = "Сравнить пропускную способность записи в SQLite до и после профиля и пула соединений"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writes', type=int, default=500, help="Транзакций на каждый поток записи")
+        parser.add_argument('--writers', type=int, default=8, help="Потоков записи")
+        parser.add_argument('--readers', type=int, default=4, help="Потоков чтения параллельно с записью")
+        parser.add_argument('--rooms', type=int, default=50, help="Комнат, между которыми идут записи")
+        parser.add_argument('--busy-timeout', type=int, default=5000, help="Ожидание блокировки, мс")
+        parser.add_argument('--json', help="Сохранить результаты в файл")
+
+    def handle(self, *args, **options):
+        modes = {
+            # Как было: журнал отката, fsync на каждый коммит, соединение на каждый запрос
+            'default': (DEFAULT_PRAGMAS, False),
+            'tuned': (tuned_pragmas(), False),
+            'tuned+pool': (tuned_pragmas(), True),
+        }
+        results = {}
+        for mode, (pragmas, pooled) in modes.items():
+            with tempfile.TemporaryDirectory() as directory:
+                results[mode] = self.run(os.path.join(directory, 'bench.sqlite3'), pragmas, pooled, options)
+
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode}: {result['writes_per_second']} записей/с, p50 {result['p50_ms']} мс, "
+                f"p99 {result['p99_ms']} мс, {result['reads_per_second']} чтений/с, "
+                f"заблокировано {result['locked']}"
+            )
+        if options['json']:
+            with open(options['json'], 'w') as output:
+                json.dump(dict(results, options={
+                    key: options[key] for key in ('writes', 'writers', 'readers', 'rooms', 'busy_timeout')
+                }), output, indent=2)
+
+    def run(self, path, pragmas, pooled, options):
+        def connect():
+            conn = sqlite3.connect(path, timeout=options['busy_timeout'] / 1000, isolation_level=None,
+                                   check_same_thread=False)
+            for pragma in pragmas:
+                conn.execute(pragma)
+            return conn
+
+        setup = connect()
+        for statement in SCHEMA:
+            setup.execute(statement)
+        setup.executemany('INSERT INTO room (id, score, version) VALUES (?, 0, 0)',
+                          [(room,) for room in range(options['rooms'])])
+        setup.close()
+
+        pool = ConnectionPool(size=options['writers'] + options['readers'], timeout=60) if pooled else None
+
+        def borrow():
+            return pool.acquire(connect) if pooled else connect()
+
+        def give_back(conn):
+            if pooled:
+                pool.release(conn)
+            else:
+                conn.close()
+
+        latencies, locked, reads = [], [0], [0]
+        lock = threading.Lock()
+        writing = threading.Event()
+
+        def write(index):
+            own = []
+            errors = 0
+            for number in range(options['writes']):
+                room = (index * options['writes'] + number) % options['rooms']
+                started = time.perf_counter()
+                conn = borrow()
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.execute('UPDATE room SET score = score + 1, version = version + 1 WHERE id = ?', (room,))
+                    conn.execute('INSERT INTO event (room_id, kind, created) VALUES (?, ?, ?)',
+                                 (room, 'guessed', time.time()))
+                    conn.execute('COMMIT')
+                except sqlite3.OperationalError:
+                    # database is locked: busy_timeout истёк
+                    errors += 1
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                else:
+                    own.append(time.perf_counter() - started)
+                finally:
+                    give_back(conn)
+            with lock:
+                latencies.extend(own)
+                locked[0] += errors
+
+        def read(index):
+            count = 0
+            while writing.is_set():
+                conn = borrow()
+                try:
+                    conn.execute('SELECT score, version FROM room WHERE id = ?',
+                                 (count % options['rooms'],)).fetchall()
+                    count += 1
+                except sqlite3.OperationalError:
+                    pass
+                finally:
+                    give_back(conn)
+            with lock:
+                reads[0] += count
+
+        writers = [threading.Thread(target=write, args=(index,)) for index in range(options['writers'])]
+        readers = [threading.Thread(target=read, args=(index,)) for index in range(options['readers'])]
+        writing.set()
+        started = time.perf_counter()
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        writing.clear()
+        for thread in readers:
+            thread.join()
+        if pooled:
+            pool.close_all()
+
+        return {
+            'writes': len(latencies),
+            'locked': locked[0],
+            'writes_per_second': round(len(latencies) / elapsed, 1),
+            'reads_per_second': round(reads[0] / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        }
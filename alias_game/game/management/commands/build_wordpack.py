@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from game.wordbank import build_pack
+
+
+class Command(BaseCommand):
+    help = (
+        "Собрать набор слов .pack из текстовых файлов. Строка файла: "
+        "'слово' или 'слово<TAB>сложность<TAB>тег1,тег2'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="Имя набора, например ru или en")
+        parser.add_argument('sources', nargs='+', help="Текстовые файлы со словами в UTF-8")
+        parser.add_argument('--difficulty', default='medium',
+                            help="Сложность для строк без второй колонки")
+        parser.add_argument('--output-dir', default=None,
+                            help="Куда положить файл (по умолчанию settings.WORD_PACKS_DIR)")
+
+    def read_entries(self, sources, default_difficulty):
+        for source in sources:
+            with open(source, encoding='utf-8') as lines:
+                for line in lines:
+                    columns = line.rstrip('\n').split('\t')
+                    word = columns[0].strip()
+                    if not word or word.startswith('#'):
+                        continue
+                    difficulty = columns[1].strip() if len(columns) > 1 and columns[1].strip() else default_difficulty
+                    tags = [tag.strip() for tag in columns[2].split(',') if tag.strip()] if len(columns) > 2 else []
+                    yield word, difficulty, tags
+
+    def handle(self, *args, **options):
+        output_dir = Path(options['output_dir'] or settings.WORD_PACKS_DIR)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        path = output_dir / f"{options['name']}.pack"
+
+        try:
+            sections = build_pack(path, self.read_entries(options['sources'], options['difficulty']))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for name, count in sections.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Набор записан в {path}"))
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from game.loadtest import run_load
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный прогон полного сценария игры: N комнат по M игроков и опрос состояния"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Адрес запущенного сервера; без него поднимается локальный")
+        parser.add_argument('--rooms', type=int, default=10, help="Число комнат")
+        parser.add_argument('--players', type=int, default=4, help="Игроков в комнате")
+        parser.add_argument('--turns', type=int, default=5, help="Ходов в каждой комнате")
+        parser.add_argument('--words', type=int, default=5, help="Угаданных слов за ход")
+        parser.add_argument('--poll-interval', type=float, default=3.0, help="Период опроса состояния, с")
+        parser.add_argument('--output', help="Сохранить отчёт в JSON для сравнения между релизами")
+
+    def handle(self, *args, **options):
+        report = run_load(
+            options['url'],
+            rooms=options['rooms'],
+            players=options['players'],
+            turns=options['turns'],
+            words=options['words'],
+            poll_interval=options['poll_interval'],
+        )
+
+        self.stdout.write(
+            f"{report['requests']} запросов за {report['elapsed_s']} с: {report['throughput_rps']} rps, "
+            f"ошибок {report['errors']} ({report['error_rate']:.2%})"
+        )
+        for name, stats in report['endpoints'].items():
+            queries = '' if stats['queries_avg'] is None else f", SQL {stats['queries_avg']}"
+            self.stdout.write(
+                f"  {name:<14} {stats['requests']:>6}  p50 {stats['p50_ms']:>8} мс  "
+                f"p95 {stats['p95_ms']:>8} мс  p99 {stats['p99_ms']:>8} мс  "
+                f"ошибок {stats['errors']}{queries}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(dict(report, options={
+                    key: options[key] for key in ('url', 'rooms', 'players', 'turns', 'words', 'poll_interval')
+                }), output, indent=2, ensure_ascii=False)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from game.reaper import reap_rooms, reaper_config
+
+
+class Command(BaseCommand):
+    help = "Удалить брошенные комнаты и их игроков пачками"
+
+    def add_arguments(self, parser):
+        config = reaper_config()
+        parser.add_argument('--idle', type=int, default=config['IDLE_TIMEOUT'],
+                            help="Секунды без активности, после которых комната считается брошенной")
+        parser.add_argument('--max-age', type=int, default=config['MAX_AGE'],
+                            help="Максимальный возраст комнаты в секундах")
+        parser.add_argument('--chunk-size', type=int, default=config['CHUNK_SIZE'],
+                            help="Сколько комнат удалять в одной транзакции")
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать, ничего не удалять")
+
+    def handle(self, *args, **options):
+        reclaimed = reap_rooms(
+            idle_timeout=options['idle'],
+            max_age=options['max_age'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = "Будет удалено" if options['dry_run'] else "Удалено"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} комнат: {reclaimed['rooms']}, игроков: {reclaimed['players']}"
+        ))
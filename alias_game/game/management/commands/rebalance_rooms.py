@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from game.rebalance import rebalance_rooms
+
+
+class Command(BaseCommand):
+    help = ("Перенести комнаты в базы шардов, которым они принадлежат по ROOM_SHARDS. "
+            "Запускать с новым ROOM_SHARDS, пока запись в комнаты остановлена, и только "
+            "после переноса переключать на него воркеры")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', action='append', default=[],
+                            help="Ещё одна база, из которой забрать комнаты (выведенный шард); можно повторять")
+        parser.add_argument('--limit', type=int, help="Перенести не больше стольких комнат")
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать, ничего не переносить")
+
+    def handle(self, *args, **options):
+        moved = rebalance_rooms(options['source'], dry_run=options['dry_run'], limit=options['limit'])
+        verb = "Будет перенесено" if options['dry_run'] else "Перенесено"
+        for (source, target), count in sorted(moved.items()):
+            self.stdout.write(f"{source} -> {target}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"{verb} комнат: {sum(moved.values())}"))
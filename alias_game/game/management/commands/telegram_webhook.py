@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from telebot import TeleBot
+from telebot.apihelper import ApiException
+
+from game.telegram import bot_config
+
+
+class Command(BaseCommand):
+    help = "Подключить или отключить вебхук Telegram (вместо python bot.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Публичный адрес, например https://example.com/telegram/webhook/")
+        parser.add_argument('--delete', action='store_true', help="Отключить вебхук и вернуться к опросу")
+
+    def handle(self, *args, **options):
+        if not settings.TELEGRAM_BOT_TOKEN:
+            raise CommandError("TELEGRAM_BOT_TOKEN не установлен")
+        bot = TeleBot(settings.TELEGRAM_BOT_TOKEN, threaded=False)
+
+        try:
+            if options['delete']:
+                bot.delete_webhook()
+                self.stdout.write(self.style.SUCCESS("Вебхук отключён"))
+                return
+
+            if not options['url']:
+                raise CommandError("Укажите --url или --delete")
+            secret = bot_config()['WEBHOOK_SECRET']
+            if not secret:
+                raise CommandError("TELEGRAM_WEBHOOK_SECRET не установлен")
+            bot.set_webhook(url=options['url'], secret_token=secret, allowed_updates=['message'])
+        except ApiException as error:
+            raise CommandError(f"Telegram ответил ошибкой: {error}")
+
+        self.stdout.write(self.style.SUCCESS(f"Вебхук подключён: {options['url']}"))
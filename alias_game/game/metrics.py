@@ -0,0 +1,267 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('game.metrics.slow')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+METRICS = {
+    'alias_http_requests_total': ('counter', "Запросы по эндпоинтам и кодам ответа"),
+    'alias_http_request_duration_seconds': ('histogram', "Время обработки запроса"),
+    'alias_http_errors_total': ('counter', "Ошибки: exception, server (5xx), application (success: false)"),
+    'alias_db_queries_per_request': ('histogram', "SQL-запросов на один HTTP-запрос"),
+    'alias_db_query_duration_seconds_total': ('counter', "Суммарное время SQL-запросов"),
+    'alias_cache_requests_total': ('counter', "Обращения к кэшам: hit или miss"),
+    'alias_cache_hit_ratio': ('gauge', "Доля попаданий в кэш с запуска процесса"),
+}
+
+# Статистика текущего запроса; asgiref переносит её и в потоки sync_to_async
+_current = ContextVar('request_metrics', default=None)
+
+
+def metrics_config():
+    return {
+        'ENABLED': True,
+        'SLOW_REQUEST_MS': 0,
+        'TOKEN': '',
+        **getattr(settings, 'METRICS', {}),
+    }
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(key, str(value).replace('\\', r'\\').replace('"', r'\"'))
+                     for key, value in labels)
+    return '{' + pairs + '}'
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Метрики процесса в памяти, отдаются в текстовом формате Prometheus.
+
+    У каждого воркера свой реестр: Prometheus опрашивает их по отдельности
+    и суммирует сам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self.counters[name, tuple(sorted(labels.items()))] += value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def value(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def cache_ratios(self):
+        totals = defaultdict(lambda: [0, 0])
+        for (name, labels), value in self.counters.items():
+            if name == 'alias_cache_requests_total':
+                labels = dict(labels)
+                totals[labels['cache']][labels['result'] == 'hit'] += value
+        return {cache: hits / (hits + misses) for cache, (misses, hits) in totals.items()}
+
+    def render(self):
+        with self._lock:
+            samples = defaultdict(list)
+            for (name, labels), value in sorted(self.counters.items()):
+                samples[name].append(f'{name}{format_labels(labels)} {value:g}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    samples[name].append(f'{name}_bucket{format_labels(labels + (("le", f"{bound:g}"),))} {count}')
+                samples[name].append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                samples[name].append(f'{name}_sum{format_labels(labels)} {histogram.sum:g}')
+                samples[name].append(f'{name}_count{format_labels(labels)} {histogram.count}')
+            for cache, ratio in sorted(self.cache_ratios().items()):
+                samples['alias_cache_hit_ratio'].append(f'alias_cache_hit_ratio{{cache="{cache}"}} {ratio:.4f}')
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            if samples[name]:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', *samples[name]]
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+registry = Registry()
+
+
+def record_cache(cache, hit):
+    registry.inc('alias_cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'query_time', 'sql', 'failed')
+
+    def __init__(self, keep_sql):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.sql = [] if keep_sql else None
+        self.failed = False
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        stats.query_time += elapsed
+        if stats.sql is not None:
+            stats.sql.append((elapsed, sql))
+
+
+@contextmanager
+def recording_queries():
+    """Считать SQL во всех базах (default и шардах) на время запроса.
+
+    Соединения Django живут в контексте, а не в потоке, так что обёртка видна
+    и из sync_to_async асинхронных представлений.
+    """
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record_query))
+        yield
+
+
+class MetricsMiddleware:
+    """Время, SQL и ошибки каждого запроса с разбивкой по имени маршрута.
+
+    Ставится первым в MIDDLEWARE. Работает и под WSGI, и под ASGI без
+    переключения между потоками и циклом событий.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = metrics_config()
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.config['ENABLED']:
+            return self.get_response(request)
+
+        stats = RequestStats(keep_sql=bool(self.config['SLOW_REQUEST_MS']))
+        token = _current.set(stats)
+        try:
+            with recording_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats)
+        return response
+
+    async def __acall__(self, request):
+        if not self.config['ENABLED']:
+            return await self.get_response(request)
+
+        stats = RequestStats(keep_sql=bool(self.config['SLOW_REQUEST_MS']))
+        token = _current.set(stats)
+        try:
+            with recording_queries():
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats)
+        return response
+
+    def process_exception(self, request, exception):
+        stats = _current.get()
+        if stats is not None:
+            stats.failed = True
+        registry.inc('alias_http_errors_total', endpoint=endpoint_label(request), kind='exception')
+        logger.exception("Необработанная ошибка в %s", request.path)
+
+    def finish(self, request, response, stats):
+        duration = time.perf_counter() - stats.started
+        endpoint = endpoint_label(request)
+
+        registry.inc('alias_http_requests_total', endpoint=endpoint, method=request.method,
+                     status=response.status_code)
+        registry.observe('alias_http_request_duration_seconds', duration, endpoint=endpoint)
+        registry.observe('alias_db_queries_per_request', stats.queries, buckets=QUERY_COUNT_BUCKETS,
+                         endpoint=endpoint)
+        if stats.queries:
+            registry.inc('alias_db_query_duration_seconds_total', stats.query_time, endpoint=endpoint)
+
+        if response.status_code >= 500 and not stats.failed:
+            registry.inc('alias_http_errors_total', endpoint=endpoint, kind='server')
+        elif is_application_error(response):
+            # Представления отвечают 200 с {'success': False} - иначе такие ошибки не видны
+            registry.inc('alias_http_errors_total', endpoint=endpoint, kind='application')
+
+        slow_ms = self.config['SLOW_REQUEST_MS']
+        if slow_ms and duration * 1000 >= slow_ms:
+            slow_logger.warning(
+                "Медленный запрос %s %s (%s): %.1f мс, SQL: %d за %.1f мс%s",
+                request.method, request.path, endpoint, duration * 1000, stats.queries,
+                stats.query_time * 1000,
+                ''.join(f'\n  {elapsed * 1000:7.1f} мс  {sql}' for elapsed, sql in stats.sql),
+            )
+
+
+def endpoint_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.url_name or match.view_name if match else 'unmatched'
+
+
+def is_application_error(response):
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict):
+        return data.get('success') is False
+    if response.streaming or not response.get('Content-Type', '').startswith('application/json'):
+        return False
+    return b'"success": false' in response.content or b'"success":false' in response.content
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gameroom",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:41
+
+import game.models
+from django.db import migrations, models
+
+
+def seed_existing_rooms(apps, schema_editor):
+    # Значение по умолчанию вычисляется один раз на всю таблицу - раздадим свои
+    GameRoom = apps.get_model("game", "GameRoom")
+    rooms = list(GameRoom.objects.only("id"))
+    for room in rooms:
+        room.deck_seed = game.models.generate_deck_seed()
+    GameRoom.objects.bulk_update(rooms, ["deck_seed"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0002_gameroom_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gameroom",
+            name="deck_cursor",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="gameroom",
+            name="deck_seed",
+            field=models.BigIntegerField(default=game.models.generate_deck_seed),
+        ),
+        migrations.RunPython(seed_existing_rooms, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="gameroom",
+            name="words_used",
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0003_word_deck"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gameroom",
+            name="word_pack",
+            field=models.CharField(default="default", max_length=64),
+        ),
+    ]
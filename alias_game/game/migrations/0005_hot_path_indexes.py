@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0004_gameroom_word_pack"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="gameroom",
+            index=models.Index(condition=models.Q(("is_active", True)), fields=["created_at"], name="gameroom_active_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="gameroom",
+            index=models.Index(fields=["is_active", "created_at"], name="gameroom_is_active_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="player",
+            index=models.Index(fields=["room", "team", "id"], name="player_room_team_idx"),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0005_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gameroom",
+            name="last_activity",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="gameroom",
+            index=models.Index(condition=models.Q(("is_active", True)), fields=["last_activity"], name="gameroom_active_activity_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="gameroom",
+            index=models.Index(fields=["is_active", "last_activity"], name="gameroom_active_last_idx"),
+        ),
+    ]
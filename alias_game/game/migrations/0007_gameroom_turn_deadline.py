@@ -0,0 +1,22 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_gameroom_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameroom',
+            name='turn_deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='gameroom',
+            index=models.Index(fields=['turn_deadline'], name='gameroom_turn_deadline_idx'),
+        ),
+    ]
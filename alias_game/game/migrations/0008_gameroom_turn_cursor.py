@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+def close_existing_queues(apps, schema_editor):
+    # У существующих комнат очереди нет: иначе в неё попали бы уже выданные слова
+    GameRoom = apps.get_model('game', 'GameRoom')
+    GameRoom.objects.update(turn_cursor=models.F('deck_cursor'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_gameroom_turn_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameroom',
+            name='turn_cursor',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(close_existing_queues, migrations.RunPython.noop),
+    ]
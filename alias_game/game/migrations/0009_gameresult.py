@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_gameroom_turn_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_pk', models.BigIntegerField(unique=True)),
+                ('room_code', models.CharField(max_length=6)),
+                ('winner', models.CharField(choices=[('A', 'Команда A'), ('B', 'Команда B')], max_length=1)),
+                ('score_a', models.IntegerField()),
+                ('score_b', models.IntegerField()),
+                ('target_score', models.IntegerField()),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['finished_at'], name='gameresult_finished_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_gameresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_pk', models.BigIntegerField()),
+                ('room_code', models.CharField(max_length=6)),
+                ('kind', models.CharField(choices=[('guessed', 'Слово угадано'), ('skip', 'Слово пропущено'), ('turn', 'Ход сыгран'), ('won', 'Победа'), ('lost', 'Поражение')], max_length=8)),
+                ('user_id', models.BigIntegerField()),
+                ('partner_id', models.BigIntegerField(blank=True, null=True)),
+                ('team', models.CharField(choices=[('A', 'Команда A'), ('B', 'Команда B')], max_length=1)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room_pk'], name='gameevent_room_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(unique=True)),
+                ('username', models.CharField(max_length=100)),
+                ('words_explained', models.PositiveIntegerField(default=0)),
+                ('words_skipped', models.PositiveIntegerField(default=0)),
+                ('words_guessed', models.PositiveIntegerField(default=0)),
+                ('turns', models.PositiveIntegerField(default=0)),
+                ('games', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('guess_rate', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-wins', 'user_id'], name='playerstats_wins_idx'), models.Index(fields=['-words_explained', 'user_id'], name='playerstats_explained_idx'), models.Index(fields=['-guess_rate', 'user_id'], name='playerstats_guess_rate_idx')],
+            },
+        ),
+    ]
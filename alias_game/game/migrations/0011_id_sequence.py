@@ -0,0 +1,22 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_game_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True)),
+                ('next_value', models.BigIntegerField(default=0)),
+                ('key', models.BigIntegerField()),
+            ],
+        ),
+    ]
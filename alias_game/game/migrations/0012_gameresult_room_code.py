@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0011_id_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gameresult',
+            name='room_code',
+            field=models.CharField(max_length=6, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='gameresult',
+            name='room_pk',
+            field=models.BigIntegerField(),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0012_gameresult_room_code'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='gameroom',
+            name='gameroom_is_active_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='gameroom',
+            name='gameroom_active_last_idx',
+        ),
+    ]
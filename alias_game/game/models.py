@@ -1,10 +1,29 @@
 from django.db import models
-import string
+from django.utils import timezone
 import random
-import json
 
 def generate_room_id():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+    # Без коллизий и повторов: номер из последовательности через ключевую перестановку
+    from .roomids import allocator
+    return allocator.allocate()
+
+def generate_deck_seed():
+    return random.getrandbits(31)
+
+class GameRoomQuerySet(models.QuerySet):
+    def with_roster(self):
+        # Игроки комнаты одним дополнительным запросом, в порядке ротации
+        return self.prefetch_related(models.Prefetch('players', queryset=Player.objects.order_by('id')))
+    
+    def touch(self):
+        return self.update(last_activity=timezone.now())
+    
+    def with_player_counts(self):
+        return self.annotate(
+            player_count=models.Count('players'),
+            team_a_count=models.Count('players', filter=models.Q(players__team='A')),
+            team_b_count=models.Count('players', filter=models.Q(players__team='B')),
+        )
 
 class GameRoom(models.Model):
     DIFFICULTY_CHOICES = [
@@ -17,38 +36,62 @@ class GameRoom(models.Model):
     creator_id = models.BigIntegerField()
     creator_name = models.CharField(max_length=100)
     difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES, default='medium')
+    word_pack = models.CharField(max_length=64, default='default')
     is_active = models.BooleanField(default=True)
     is_game_started = models.BooleanField(default=False)
     current_round = models.IntegerField(default=1)
     current_team = models.CharField(max_length=1, choices=[('A', 'Команда A'), ('B', 'Команда B')], default='A')
     current_explainer_index = models.IntegerField(default=0)
     current_guesser_index = models.IntegerField(default=1)
-    words_used = models.TextField(default='[]')
+    deck_seed = models.BigIntegerField(default=generate_deck_seed)
+    deck_cursor = models.PositiveIntegerField(default=0)
+    # Слова колоды с turn_cursor по deck_cursor - 1 зарезервированы за текущим ходом
+    # и ещё не подтверждены объясняющим (очередь слов, см. RoomState.word_queue)
+    turn_cursor = models.PositiveIntegerField(default=0)
     score_a = models.IntegerField(default=0)
     score_b = models.IntegerField(default=0)
     target_score = models.IntegerField(default=25)
     time_per_turn = models.IntegerField(default=60)
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Обновляется той же записью, что и сами изменения комнаты; по нему чистятся брошенные комнаты
+    last_activity = models.DateTimeField(default=timezone.now)
+    # Конец текущего хода; ставится первым словом хода, ход по нему завершает сервер (game/turns.py)
+    turn_deadline = models.DateTimeField(null=True, blank=True)
+    
+    objects = GameRoomQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Частичные индексы: живые комнаты ищутся по возрасту и простою, удалённые не мешают.
+            # Составные (is_active, ...) здесь не помогают: is_active=True Django пишет
+            # как голое "is_active", и SQLite не берёт по нему префикс индекса. last_activity
+            # переписывается каждым изменением комнаты, так что лишний индекс - лишняя запись
+            models.Index(fields=['created_at'], condition=models.Q(is_active=True), name='gameroom_active_created_idx'),
+            models.Index(fields=['last_activity'], condition=models.Q(is_active=True), name='gameroom_active_activity_idx'),
+            # Истёкшие ходы выбираются диапазоном по сроку
+            models.Index(fields=['turn_deadline'], name='gameroom_turn_deadline_idx'),
+        ]
     
     def __str__(self):
         return f"Комната {self.room_id}"
     
     def get_current_players(self):
-        team_players = list(self.players.filter(team=self.current_team).order_by('id'))
-        
-        if not team_players:
-            return None, None
-        
-        explainer_index = self.current_explainer_index % len(team_players)
-        guesser_index = self.current_guesser_index % len(team_players)
-        
-        if explainer_index == guesser_index:
-            guesser_index = (guesser_index + 1) % len(team_players)
-        
-        explainer = team_players[explainer_index] if team_players else None
-        guesser = team_players[guesser_index] if team_players else None
-        
-        return explainer, guesser
+        # players.all() берёт данные из with_roster(), если они уже загружены
+        team_players = sorted((p for p in self.players.all() if p.team == self.current_team), key=lambda p: p.id)
+        return pick_turn_players(team_players, self.current_explainer_index, self.current_guesser_index)
+
+def pick_turn_players(team_players, explainer_index, guesser_index):
+    if not team_players:
+        return None, None
+    
+    explainer_index = explainer_index % len(team_players)
+    guesser_index = guesser_index % len(team_players)
+    
+    if explainer_index == guesser_index:
+        guesser_index = (guesser_index + 1) % len(team_players)
+    
+    return team_players[explainer_index], team_players[guesser_index]
 
 class Player(models.Model):
     room = models.ForeignKey(GameRoom, on_delete=models.CASCADE, related_name='players')
@@ -60,6 +103,113 @@ class Player(models.Model):
     
     class Meta:
         unique_together = ['room', 'user_id']
+        indexes = [
+            # Состав команды в порядке ротации читается без сортировки
+            models.Index(fields=['room', 'team', 'id'], name='player_room_team_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.username} в комнате {self.room.room_id}"
+
+class GameResult(models.Model):
+    # История переживает комнату, поэтому без внешнего ключа: удаление комнаты
+    # ничего здесь не трогает. id комнаты свой в каждой базе шарда, а код
+    # уникален везде и не переиспользуется - по нему повторные отчёты об одной
+    # игре схлопываются в одну запись
+    room_pk = models.BigIntegerField()
+    room_code = models.CharField(max_length=6, unique=True)
+    winner = models.CharField(max_length=1, choices=[('A', 'Команда A'), ('B', 'Команда B')])
+    score_a = models.IntegerField()
+    score_b = models.IntegerField()
+    target_score = models.IntegerField()
+    finished_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['finished_at'], name='gameresult_finished_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Игра {self.room_code}: {self.score_a} : {self.score_b}"
+    
+    @classmethod
+    def from_room(cls, room):
+        return cls(room_pk=room.pk, room_code=room.room_id, winner=room_winner(room), score_a=room.score_a,
+                   score_b=room.score_b, target_score=room.target_score)
+
+def room_winner(room):
+    if room.score_a >= room.target_score:
+        return 'A'
+    if room.score_b >= room.target_score:
+        return 'B'
+    return None
+
+class GameEvent(models.Model):
+    """Журнал игры: только добавление, пишется пачками (game/history.py)."""
+    KIND_CHOICES = [
+        ('guessed', 'Слово угадано'),
+        ('skip', 'Слово пропущено'),
+        ('turn', 'Ход сыгран'),
+        ('won', 'Победа'),
+        ('lost', 'Поражение'),
+    ]
+    
+    room_pk = models.BigIntegerField()
+    room_code = models.CharField(max_length=6)
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    # Объясняющий для слов и ходов, сам игрок для итогов игры
+    user_id = models.BigIntegerField()
+    # Угадывающий для слов
+    partner_id = models.BigIntegerField(null=True, blank=True)
+    team = models.CharField(max_length=1, choices=[('A', 'Команда A'), ('B', 'Команда B')])
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['room_pk'], name='gameevent_room_idx'),
+        ]
+
+class PlayerStats(models.Model):
+    """Итоги игрока за всё время, обновляются приращениями из журнала.
+
+    Таблицы рейтинга строятся отсюда - одна строка на игрока, журнал не читается.
+    """
+    user_id = models.BigIntegerField(unique=True)
+    username = models.CharField(max_length=100)
+    words_explained = models.PositiveIntegerField(default=0)
+    words_skipped = models.PositiveIntegerField(default=0)
+    words_guessed = models.PositiveIntegerField(default=0)
+    turns = models.PositiveIntegerField(default=0)
+    games = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    # Доля угаданных из объяснённых; хранится, чтобы рейтинг по ней шёл по индексу
+    guess_rate = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    COUNTERS = ('words_explained', 'words_skipped', 'words_guessed', 'turns', 'games', 'wins')
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-wins', 'user_id'], name='playerstats_wins_idx'),
+            models.Index(fields=['-words_explained', 'user_id'], name='playerstats_explained_idx'),
+            models.Index(fields=['-guess_rate', 'user_id'], name='playerstats_guess_rate_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Статистика {self.username}"
+    
+    def add(self, counters):
+        for field, value in counters.items():
+            setattr(self, field, getattr(self, field) + value)
+        attempts = self.words_explained + self.words_skipped
+        self.guess_rate = self.words_explained / attempts if attempts else 0.0
+
+class IdSequence(models.Model):
+    """Последовательность номеров, которую процессы разбирают блоками (game/roomids.py)."""
+    name = models.CharField(max_length=32, unique=True)
+    next_value = models.BigIntegerField(default=0)
+    # Ключ перестановки номеров в коды; смена ключа сделала бы коды повторяющимися
+    key = models.BigIntegerField()
     
     def __str__(self):
-        return f"{self.username} в комнате {self.room.room_id}"
\ No newline at end of file
+        return f"{self.name}: {self.next_value}"
@@ -0,0 +1,43 @@
+import random
+
+MIX_MULTIPLIER = 0x9E3779B1
+
+
+class KeyedPermutation:
+    """Перестановка чисел 0..size-1, заданная ключом.
+
+    Сеть Фейстеля на ближайшей степени двойки с "cycle walking": значения
+    за пределами size прогоняются повторно, пока не попадут в диапазон.
+    Память O(1), одно значение - в среднем не больше четырёх проходов.
+    """
+
+    def __init__(self, size, key, rounds=4):
+        if size < 1:
+            raise ValueError("Размер перестановки должен быть положительным")
+
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+        generator = random.Random(key)
+        self.keys = [generator.getrandbits(32) for _ in range(rounds)]
+
+    def _mix(self, value, key):
+        value = ((value ^ key) * MIX_MULTIPLIER) & 0xFFFFFFFF
+        value ^= value >> 15
+        return value & self.mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half_bits, value & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._mix(right, key)
+        return (left << self.half_bits) | right
+
+    def __call__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
@@ -0,0 +1,303 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import invalidate_room
+
+logger = logging.getLogger(__name__)
+
+ROOM_SOCKET_PATH = re.compile(r'^/ws/room/(?P<room_id>[A-Za-z0-9]+)/?$')
+
+# Сколько неотправленных событий держим на одно соединение.
+# Если клиент не успевает читать, лишнее отбрасываем: он догонит через опрос.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Метка процесса: свои события ретранслятор не доставляет второй раз
+ORIGIN = uuid.uuid4().hex
+
+
+def realtime_config():
+    return {
+        'RELAY': True,
+        'POLL_INTERVAL': 0.2,
+        'EVENT_TTL': 60,
+        'COUNTER_TTL': 24 * 3600,
+        'BACKLOG': 100,
+        'GAP_TIMEOUT': 2.0,
+        'LISTEN_TTL': 60,
+        **getattr(settings, 'REALTIME', {}),
+    }
+
+
+def counter_key(room_id):
+    return f'room:{room_id}:events'
+
+
+def event_key(room_id, number):
+    return f'room:{room_id}:event:{number}'
+
+
+def listeners_key(room_id):
+    return f'room:{room_id}:listeners'
+
+
+def _deliver(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        logger.warning("Очередь WebSocket переполнена, событие отброшено")
+
+
+class RoomGroups:
+    """Группы рассылки: каждая комната - отдельная группа подписчиков."""
+
+    def __init__(self):
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def add(self, room_id, loop, queue):
+        with self._lock:
+            self._groups.setdefault(room_id, set()).add((loop, queue))
+
+    def discard(self, room_id, loop, queue):
+        with self._lock:
+            subscribers = self._groups.get(room_id)
+            if subscribers is None:
+                return
+            subscribers.discard((loop, queue))
+            if not subscribers:
+                del self._groups[room_id]
+
+    def count(self, room_id):
+        with self._lock:
+            return len(self._groups.get(room_id, ()))
+
+    def rooms(self):
+        with self._lock:
+            return list(self._groups)
+
+    def publish(self, room_id, event):
+        return self.deliver(room_id, json.dumps(event, ensure_ascii=False))
+
+    def deliver(self, room_id, message):
+        """Отдать уже сериализованное событие подписчикам этого процесса."""
+        with self._lock:
+            subscribers = list(self._groups.get(room_id, ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_deliver, queue, message)
+            except RuntimeError:
+                # Цикл событий уже закрыт - соединение умерло вместе с ним
+                self.discard(room_id, loop, queue)
+        return len(subscribers)
+
+
+class EventRelay:
+    """Доставка событий комнат между воркерами и узлами через общий кэш.
+
+    Сокеты комнаты могут висеть на любом воркере, а событие рождается в том,
+    где обработан запрос или сработал таймер хода. Поэтому publish кладёт
+    событие в кэш под очередным номером комнаты, а поток ретранслятора в
+    каждом процессе с открытыми сокетами раз в POLL_INTERVAL читает номера
+    своих комнат и доставляет чужие события локальным подписчикам.
+
+    Процессы с сокетами комнаты отмечают это в кэше (listeners_key), и
+    события комнат, которые никто не слушает, в кэш не пишутся.
+    """
+
+    def __init__(self, groups, clock=time.monotonic):
+        self.groups = groups
+        self.clock = clock
+        self._seen = {}
+        self._gaps = {}
+        self._announced = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def listen(self, room_id):
+        """Отметить, что у комнаты есть сокеты в этом процессе."""
+        cache.set(listeners_key(room_id), 1, realtime_config()['LISTEN_TTL'])
+
+    def announce(self):
+        """Продлить отметки для всех комнат с сокетами в этом процессе."""
+        rooms = self.groups.rooms()
+        if rooms:
+            cache.set_many({listeners_key(room_id): 1 for room_id in rooms}, realtime_config()['LISTEN_TTL'])
+        self._announced = self.clock()
+
+    def send(self, room_id, message):
+        """Положить событие в кэш, если его есть кому читать; номер события или None."""
+        if not realtime_config()['RELAY'] or not cache.get(listeners_key(room_id)):
+            return None
+        return self.store(room_id, message)
+
+    def store(self, room_id, message, origin=ORIGIN):
+        config = realtime_config()
+        key = counter_key(room_id)
+        cache.add(key, 0, timeout=config['COUNTER_TTL'])
+        try:
+            number = cache.incr(key)
+        except ValueError:
+            # Счётчик истёк между add и incr
+            cache.add(key, 1, timeout=config['COUNTER_TTL'])
+            number = 1
+        cache.set(event_key(room_id, number), (origin, message), config['EVENT_TTL'])
+        return number
+
+    def poll(self):
+        """Доставить события других процессов; возвращает их число.
+
+        store сначала берёт номер, а потом пишет событие, поэтому номер без
+        события может быть ещё в пути: курсор на нём останавливается и ждёт
+        до GAP_TIMEOUT, а не перескакивает - иначе событие пропало бы.
+        """
+        config = realtime_config()
+        rooms = self.groups.rooms()
+        self._seen = {room_id: number for room_id, number in self._seen.items() if room_id in rooms}
+        self._gaps = {room_id: gap for room_id, gap in self._gaps.items() if room_id in rooms}
+        delivered = 0
+        for room_id in rooms:
+            current = cache.get(counter_key(room_id)) or 0
+            seen = self._seen.get(room_id)
+            if seen is None:
+                # Новая подписка начинает с текущего номера: состояние клиент берёт запросом
+                self._seen[room_id] = current
+                continue
+            if current < seen:
+                # Счётчик истёк и начался заново
+                seen = 0
+            numbers = range(max(seen, current - config['BACKLOG']) + 1, current + 1)
+            entries = cache.get_many([event_key(room_id, number) for number in numbers])
+            for number in numbers:
+                entry = entries.get(event_key(room_id, number))
+                if entry is None and self._waiting(room_id, number, config['GAP_TIMEOUT']):
+                    break
+                seen = number
+                if entry is not None and entry[0] != ORIGIN:
+                    self.groups.deliver(room_id, entry[1])
+                    delivered += 1
+            self._seen[room_id] = seen
+        return delivered
+
+    def _waiting(self, room_id, number, timeout):
+        """Ждать ли ещё события с этим номером; False - оно истекло или его автор упал."""
+        gap = self._gaps.get(room_id)
+        if gap is None or gap[0] != number:
+            self._gaps[room_id] = (number, self.clock())
+            return True
+        if self.clock() - gap[1] < timeout:
+            return True
+        del self._gaps[room_id]
+        return False
+
+    def start(self):
+        if not realtime_config()['RELAY']:
+            return False
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self._run, name='realtime-relay', daemon=True)
+            self._thread.start()
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(realtime_config()['POLL_INTERVAL'])
+            if not self._seen and not self.groups.rooms():
+                continue
+            try:
+                if self.clock() - self._announced >= realtime_config()['LISTEN_TTL'] / 3:
+                    self.announce()
+                self.poll()
+            except Exception:
+                logger.exception("Ошибка ретранслятора событий комнат")
+
+
+groups = RoomGroups()
+relay = EventRelay(groups)
+
+
+def publish(room_id, event_type, **payload):
+    """Отправить изменение состояния всем открытым вкладкам комнаты.
+
+    Вкладки этого процесса получают событие сразу, остальных воркеров - через
+    ретранслятор (EventRelay) не позже чем через POLL_INTERVAL.
+    """
+    message = json.dumps({'type': event_type, 'room_id': room_id, **payload}, ensure_ascii=False)
+    relay.send(room_id, message)
+    return groups.deliver(room_id, message)
+
+
+def player_info(player):
+    return {
+        'id': player.user_id if player else None,
+        'username': player.username if player else None
+    }
+
+
+def deadline_ms(state):
+    # Клиенты получают только срок хода и сами отсчитывают оставшееся время
+    return int(state.turn_deadline.timestamp() * 1000) if state.turn_deadline else None
+
+
+def publish_turn(state):
+    """Сообщить комнате о новом ходе - из запроса или из таймера ходов."""
+    invalidate_room(state.room_id)
+    explainer, guesser = state.get_current_players()
+    publish(
+        state.room_id, 'turn',
+        current_team=state.current_team,
+        explainer=player_info(explainer),
+        guesser=player_info(guesser),
+        turn_deadline=deadline_ms(state),
+    )
+
+
+async def room_socket(scope, receive, send):
+    match = ROOM_SOCKET_PATH.match(scope['path'])
+
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if not match:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    room_id = match.group('room_id')
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    await send({'type': 'websocket.accept'})
+    if realtime_config()['RELAY']:
+        await sync_to_async(relay.listen)(room_id)
+    groups.add(room_id, loop, queue)
+    relay.start()
+
+    receiver = asyncio.ensure_future(receive())
+    getter = asyncio.ensure_future(queue.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({receiver, getter}, return_when=asyncio.FIRST_COMPLETED)
+
+            if getter in done:
+                await send({'type': 'websocket.send', 'text': getter.result()})
+                getter = asyncio.ensure_future(queue.get())
+
+            if receiver in done:
+                # Сообщения от клиента (пинги) не нужны, ждём только отключения
+                if receiver.result()['type'] == 'websocket.disconnect':
+                    break
+                receiver = asyncio.ensure_future(receive())
+    finally:
+        groups.discard(room_id, loop, queue)
+        receiver.cancel()
+        getter.cancel()
@@ -0,0 +1,100 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .caching import forget_rooms
+from .engine import engine
+from .models import GameRoom, Player
+from .scheduling import PeriodicJob
+from .sharding import databases
+
+logger = logging.getLogger(__name__)
+
+
+def reaper_config():
+    return {
+        'IDLE_TIMEOUT': 2 * 3600,
+        'MAX_AGE': 24 * 3600,
+        'INTERVAL': 300,
+        'CHUNK_SIZE': 500,
+        **getattr(settings, 'ROOM_REAPER', {}),
+    }
+
+
+def stale_rooms(now=None, idle_timeout=None, max_age=None, using=DEFAULT_DB_ALIAS):
+    config = reaper_config()
+    now = now or timezone.now()
+    idle_timeout = config['IDLE_TIMEOUT'] if idle_timeout is None else idle_timeout
+    max_age = config['MAX_AGE'] if max_age is None else max_age
+
+    # Отдельные выборки вместо OR: каждая идёт по своему индексу
+    rooms = GameRoom.objects.using(using)
+    return [
+        rooms.filter(is_active=True, last_activity__lt=now - timedelta(seconds=idle_timeout)),
+        rooms.filter(is_active=True, created_at__lt=now - timedelta(seconds=max_age)),
+        rooms.filter(is_active=False),
+    ]
+
+
+def reap_rooms(now=None, idle_timeout=None, max_age=None, chunk_size=None, dry_run=False):
+    """Удалить брошенные комнаты вместе с игроками. Возвращает число удалённых строк.
+
+    Базы шардов обходятся по очереди. Удаление идёт пачками, каждая в своей
+    короткой транзакции, чтобы не держать блокировку таблиц, пока живые
+    комнаты продолжают играть.
+    """
+    chunk_size = chunk_size or reaper_config()['CHUNK_SIZE']
+    reclaimed = {'rooms': 0, 'players': 0}
+    for using in databases():
+        counts = reap_database(using, now, idle_timeout, max_age, chunk_size, dry_run)
+        reclaimed['rooms'] += counts['rooms']
+        reclaimed['players'] += counts['players']
+    return reclaimed
+
+
+def reap_database(using, now, idle_timeout, max_age, chunk_size, dry_run):
+    querysets = stale_rooms(now, idle_timeout, max_age, using)
+    players = Player.objects.using(using)
+
+    if dry_run:
+        pks = set()
+        for queryset in querysets:
+            pks.update(queryset.values_list('pk', flat=True))
+        return {'rooms': len(pks), 'players': players.filter(room_id__in=pks).count()}
+
+    reclaimed = {'rooms': 0, 'players': 0}
+    for queryset in querysets:
+        while True:
+            chunk = list(queryset.order_by('pk').values_list('pk', 'room_id')[:chunk_size])
+            if not chunk:
+                break
+
+            pks = [pk for pk, _ in chunk]
+            with transaction.atomic(using=using):
+                deleted_players, _ = players.filter(room_id__in=pks).delete()
+                _, deleted = GameRoom.objects.using(using).filter(pk__in=pks).delete()
+                rooms = deleted.get(GameRoom._meta.label, 0)
+
+            reclaimed['players'] += deleted_players
+            reclaimed['rooms'] += rooms
+            room_ids = [room_id for _, room_id in chunk]
+            for room_id in room_ids:
+                engine.forget(room_id, flush=False)
+            forget_rooms(room_ids)
+
+            if len(chunk) < chunk_size:
+                break
+
+    return reclaimed
+
+
+def reap_and_log():
+    reclaimed = reap_rooms()
+    if reclaimed['rooms']:
+        logger.info("Удалено брошенных комнат: %(rooms)s, игроков: %(players)s", reclaimed)
+
+
+scheduler = PeriodicJob('room-reaper', reap_and_log, lambda: reaper_config()['INTERVAL'])
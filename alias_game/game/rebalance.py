@@ -0,0 +1,77 @@
+import logging
+
+from django.db import transaction
+
+from .caching import invalidate_room
+from .engine import engine
+from .models import GameRoom, Player
+from .sharding import database_for, databases
+
+logger = logging.getLogger(__name__)
+
+
+def misplaced_rooms(using):
+    """[(код, база по кольцу)] для комнат из базы using, которые принадлежат другой базе."""
+    rooms = GameRoom.objects.using(using).order_by('pk').values_list('room_id', flat=True)
+    return [(room_id, target) for room_id in rooms.iterator(chunk_size=2000)
+            if (target := database_for(room_id)) != using]
+
+
+def move_room(room_id, source, target):
+    """Перенести комнату с игроками из базы source в target. False, если её там уже нет.
+
+    Идущую игру перенос не защищает. Воркер со старым ROOM_SHARDS дождётся
+    блокировки строки в source и обновит уже удалённую комнату - изменение
+    молча пропадёт; воркер с новым до конца переноса не найдёт комнату в
+    target. engine.forget чистит состояние только этого процесса. Поэтому
+    порядок такой: остановить запись в комнаты (дождаться конца игр или
+    закрыть узлы на запись), перенести их с новым ROOM_SHARDS и только потом
+    переключить на него воркеры.
+
+    Если процесс упал после записи в target, повторный запуск только удалит
+    остаток в source. id комнаты и игроков в target новые: в журнале комната
+    узнаётся по коду.
+    """
+    with transaction.atomic(using=source):
+        room = GameRoom.objects.using(source).select_for_update().with_roster().filter(room_id=room_id).first()
+        if room is None:
+            return False
+        players = list(room.players.all())
+
+        with transaction.atomic(using=target):
+            if not GameRoom.objects.using(target).filter(room_id=room_id).exists():
+                created_at = room.created_at
+                room.pk = None
+                room._state.adding = True
+                room.save(using=target, force_insert=True)
+                # auto_now_add при вставке ставит текущее время, а возраст комнаты нужен уборщику
+                GameRoom.objects.using(target).filter(pk=room.pk).update(created_at=created_at)
+                for player in players:
+                    player.pk = None
+                    player._state.db = None
+                    player._state.adding = True
+                    player.room = room
+                Player.objects.using(target).bulk_create(players)
+
+        Player.objects.using(source).filter(room__room_id=room_id).delete()
+        GameRoom.objects.using(source).filter(room_id=room_id).delete()
+
+    engine.forget(room_id, flush=False)
+    invalidate_room(room_id)
+    return True
+
+
+def rebalance_rooms(sources=(), dry_run=False, limit=None):
+    """Разложить комнаты по базам согласно текущему ROOM_SHARDS.
+
+    sources - базы вне ROOM_SHARDS, из которых тоже надо забрать комнаты
+    (например, у выведенного шарда). Возвращает {(откуда, куда): комнат}.
+    """
+    moved = {}
+    for source in dict.fromkeys([*databases(), *sources]):
+        for room_id, target in misplaced_rooms(source):
+            if limit is not None and sum(moved.values()) >= limit:
+                return moved
+            if dry_run or move_room(room_id, source, target):
+                moved[source, target] = moved.get((source, target), 0) + 1
+    return moved
@@ -0,0 +1,40 @@
+import json
+import logging
+
+from . import history
+
+logger = logging.getLogger(__name__)
+
+# Сообщения web_app_data от WebApp (JSON):
+#   {"type": "result", "room_id": "ABC123"}
+# Счёт, победителя и очки игроков сервер ведёт сам (game/history.py), из
+# сообщения берётся только комната: клиенту здесь доверять нельзя.
+MESSAGE_TYPES = ('result',)
+
+
+def parse_report(user_id, data):
+    """Разобрать данные WebApp в отчёт history.Report или вернуть None."""
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict) or payload.get('type') not in MESSAGE_TYPES:
+        return None
+
+    room_id = payload.get('room_id')
+    if not isinstance(room_id, str):
+        return None
+    return history.Report(user_id, room_id)
+
+
+def report_result(user_id, data):
+    """Отдать отчёт WebApp в журнал игры; он пишется той же пачкой, что и сама игра.
+
+    False, если данные непонятны.
+    """
+    report = parse_report(user_id, data)
+    if report is None:
+        logger.warning("Непонятные данные WebApp от %s: %r", user_id, data)
+        return False
+    history.events.add(report)
+    return True
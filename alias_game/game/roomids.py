@@ -0,0 +1,91 @@
+import random
+import string
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from .permutation import KeyedPermutation
+from .sharding import group_by_database
+
+ALPHABET = string.ascii_uppercase + string.digits
+LENGTH = 6
+SPACE = len(ALPHABET) ** LENGTH
+
+SEQUENCE_NAME = 'room_id'
+
+
+def room_ids_config():
+    return {
+        'BLOCK_SIZE': 100,
+        **getattr(settings, 'ROOM_IDS', {}),
+    }
+
+
+def to_code(number):
+    chars = []
+    for _ in range(LENGTH):
+        number, digit = divmod(number, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class RoomIdAllocator:
+    """Коды комнат без коллизий: номер из последовательности -> перестановка -> base36.
+
+    Процесс забирает из базы блок номеров (BLOCK_SIZE) одной короткой
+    транзакцией и дальше выдаёт коды из памяти за O(1). Коды блока, уже занятые
+    комнатами со старыми случайными кодами, выбрасываются при выдаче блока.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._codes = []
+        self._key = None
+        self._permutation = None
+
+    def allocate(self):
+        with self._lock:
+            if not self._codes:
+                self._codes = self._next_block()
+            return self._codes.pop()
+
+    def permutation(self, key):
+        if key != self._key:
+            self._permutation = KeyedPermutation(SPACE, key)
+            self._key = key
+        return self._permutation
+
+    def _next_block(self):
+        from .models import GameRoom, IdSequence
+
+        size = room_ids_config()['BLOCK_SIZE']
+        # Ключ выбирается один раз, при первом блоке, и дальше не меняется
+        IdSequence.objects.get_or_create(name=SEQUENCE_NAME, defaults={'key': random.getrandbits(62)})
+        # Повтор - только если весь блок занят старыми кодами
+        while True:
+            with transaction.atomic():
+                sequence = IdSequence.objects.select_for_update().get(name=SEQUENCE_NAME)
+                start = sequence.next_value
+                if start >= SPACE:
+                    raise RuntimeError('Коды комнат закончились')
+                sequence.next_value = min(start + size, SPACE)
+                sequence.save(update_fields=['next_value'])
+
+            permutation = self.permutation(sequence.key)
+            codes = [to_code(permutation(number)) for number in range(start, sequence.next_value)]
+            taken = set()
+            for using, group in group_by_database(codes).items():
+                taken.update(GameRoom.objects.using(using).filter(room_id__in=group).values_list('room_id', flat=True))
+            codes = [code for code in codes if code not in taken]
+            if codes:
+                # pop() берёт с конца - выдаём в порядке номеров
+                codes.reverse()
+                return codes
+
+    def reset(self):
+        with self._lock:
+            self._codes = []
+
+
+allocator = RoomIdAllocator()
@@ -0,0 +1,139 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Фоновый поток, который раз в interval() секунд вызывает job().
+
+    Если воркеров несколько, за один интервал работает только один:
+    его выбирает блокировка в общем кэше. interval() == 0 выключает поток.
+    Пока проход идёт, блокировка держится до max_runtime секунд сверх интервала,
+    так что медленный проход не пересекается со следующим в другом воркере.
+    """
+
+    def __init__(self, name, job, interval, max_runtime=600):
+        self.name = name
+        self.job = job
+        self.interval = interval
+        self.max_runtime = max_runtime
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def lock_key(self):
+        return f'{self.name}:lock'
+
+    def start(self):
+        interval = self.interval()
+        if not interval:
+            return False
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self._run, args=(interval,), name=self.name, daemon=True)
+            self._thread.start()
+        return True
+
+    def run_once(self, interval):
+        if not cache.add(self.lock_key, 1, timeout=interval + self.max_runtime):
+            return False
+        started = time.monotonic()
+        try:
+            self.job()
+        except Exception:
+            logger.exception("Ошибка в фоновой задаче %s", self.name)
+        finally:
+            self._release(interval - (time.monotonic() - started))
+            close_old_connections()
+        return True
+
+    def _release(self, remaining):
+        # Остаток интервала блокировка ещё живёт: за интервал - один проход на все воркеры
+        try:
+            if remaining > 0:
+                cache.touch(self.lock_key, remaining)
+            else:
+                cache.delete(self.lock_key)
+        except Exception:
+            logger.exception("Не удалось снять блокировку %s", self.name)
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            self.run_once(interval)
+
+
+class BatchWriter:
+    """Копит записи в памяти процесса и отдаёт их write() пачками.
+
+    Пачка уходит при BATCH_SIZE записях или раз в FLUSH_INTERVAL секунд
+    (из config()), так что всплеск не превращается в поток мелких записей.
+    Поток сброса запускает start() - как и PeriodicJob, из GameConfig.ready().
+    """
+
+    def __init__(self, name, write, config):
+        self.name = name
+        self.write = write
+        self.config = config
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def start(self):
+        interval = self.config()['FLUSH_INTERVAL']
+        if not interval:
+            return False
+
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return False
+            self._flusher = threading.Thread(target=self._flush_loop, args=(interval,), name=self.name, daemon=True)
+            self._flusher.start()
+        # Не терять накопленное при остановке процесса
+        atexit.register(self.flush)
+        return True
+
+    def append(self, *items):
+        """Только положить в буфер, без записи; True, если пачка набрана."""
+        with self._lock:
+            self._pending.extend(items)
+            return len(self._pending) >= self.config()['BATCH_SIZE']
+
+    def add(self, *items):
+        if self.append(*items):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            items, self._pending = self._pending, []
+        if not items:
+            return 0
+        try:
+            return self.write(items)
+        except Exception:
+            # Вернуть в буфер и попробовать при следующем сбросе
+            with self._lock:
+                self._pending[:0] = items
+            raise
+
+    def clear(self):
+        with self._lock:
+            self._pending = []
+
+    def _flush_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Ошибка при записи пачки %s", self.name)
+            finally:
+                close_old_connections()
@@ -0,0 +1,207 @@
+import hashlib
+from bisect import bisect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponseRedirect
+
+from .encoding import api_response, read_request
+
+# Модели, строки которых живут в базе шарда комнаты. Остальное (журнал,
+# итоги игроков, последовательность кодов) - в общей базе default
+ROOM_MODELS = {'game.GameRoom': 'gameroom', 'game.Player': 'player'}
+
+# База комнаты, с которой работает текущий запрос или фоновая задача
+_current = ContextVar('room_database', default=None)
+
+
+def sharding_config():
+    return {
+        'SHARDS': {},
+        'LOCAL': None,
+        'VNODES': 64,
+        **getattr(settings, 'ROOM_SHARDS', {}),
+    }
+
+
+def point(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Согласованное хеширование: у каждого шарда vnodes точек на кольце.
+
+    Код комнаты принадлежит шарду первой точки по часовой стрелке. При
+    добавлении шарда к нему переезжает примерно 1/N комнат, остальные
+    остаются на месте.
+    """
+
+    def __init__(self, names, vnodes=64):
+        if not names:
+            raise ValueError('Нужен хотя бы один шард')
+        ring = sorted((point(f'{name}#{index}'), name) for name in names for index in range(vnodes))
+        self.points = [position for position, _ in ring]
+        self.names = [name for _, name in ring]
+
+    def shard(self, key):
+        return self.names[bisect(self.points, point(key)) % len(self.points)]
+
+
+@lru_cache(maxsize=8)
+def ring(names, vnodes):
+    return HashRing(names, vnodes)
+
+
+def shard_for(room_id):
+    """Имя шарда комнаты или None, если шардирование выключено."""
+    config = sharding_config()
+    if not config['SHARDS']:
+        return None
+    return ring(tuple(sorted(config['SHARDS'])), config['VNODES']).shard(room_id)
+
+
+def database_for(room_id):
+    shard = shard_for(room_id)
+    if shard is None:
+        return DEFAULT_DB_ALIAS
+    return sharding_config()['SHARDS'][shard].get('DATABASE', DEFAULT_DB_ALIAS)
+
+
+def databases():
+    """Все базы с комнатами, default - первой, если она среди них."""
+    shards = sharding_config()['SHARDS']
+    if not shards:
+        return [DEFAULT_DB_ALIAS]
+    aliases = {shard.get('DATABASE', DEFAULT_DB_ALIAS) for shard in shards.values()}
+    return sorted(aliases, key=lambda alias: (alias != DEFAULT_DB_ALIAS, alias))
+
+
+def group_by_database(room_ids):
+    groups = {}
+    for room_id in room_ids:
+        groups.setdefault(database_for(room_id), []).append(room_id)
+    return groups
+
+
+def node_url(room_id):
+    """Адрес узла, который обслуживает комнату; пустая строка - этот узел."""
+    shard = shard_for(room_id)
+    if shard is None:
+        return ''
+    config = sharding_config()
+    if config['LOCAL'] is None or shard in config['LOCAL']:
+        return ''
+    return config['SHARDS'][shard].get('URL', '').rstrip('/')
+
+
+def room_db():
+    return _current.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_database(alias):
+    token = _current.set(alias)
+    try:
+        yield alias
+    finally:
+        _current.reset(token)
+
+
+def use_room(room_id):
+    return use_database(database_for(room_id))
+
+
+class RoomRouter:
+    """Направляет запросы к GameRoom и Player в базу шарда комнаты.
+
+    По объекту база известна сразу: из _state.db или, для новой комнаты, из
+    её кода. Для запросов через менеджер (filter по room_id) код комнаты
+    роутеру не виден, поэтому база берётся из use_room() вокруг запроса -
+    его ставят room_shard у представлений и фоновые задачи.
+    """
+
+    def route(self, model, **hints):
+        if model._meta.label not in ROOM_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._state.db:
+                return instance._state.db
+            if model._meta.label == 'game.GameRoom' and instance.room_id:
+                return database_for(instance.room_id)
+            room = instance._state.fields_cache.get('room')
+            if room is not None and room._state.db:
+                return room._state.db
+        return _current.get()
+
+    db_for_read = route
+    db_for_write = route
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._meta.label in ROOM_MODELS and obj2._meta.label in ROOM_MODELS:
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label != 'game' or db == DEFAULT_DB_ALIAS or db not in databases():
+            return None
+        # В базах шардов только таблицы комнат
+        return model_name in ROOM_MODELS.values()
+
+
+def request_room_id(request, kwargs):
+    if not sharding_config()['SHARDS']:
+        return None
+    if 'room_id' in kwargs:
+        return kwargs['room_id']
+    if request.method != 'POST':
+        return request.GET.get('room_id')
+    try:
+        data = read_request(request)
+    except ValueError:
+        return None
+    room_id = data.get('room_id') if isinstance(data, dict) else None
+    return room_id if isinstance(room_id, str) else None
+
+
+def misdirected(request, url):
+    if request.method == 'GET':
+        return HttpResponseRedirect(url + request.get_full_path())
+    return api_response(request, {'success': False, 'error': 'Комната на другом сервере', 'node': url},
+                        status=421)
+
+
+def room_shard(view):
+    """Выполнить представление в базе шарда комнаты из URL или тела запроса.
+
+    Комнату чужого узла не обслуживаем: страницы перенаправляются туда, а API
+    отвечает 421 с адресом узла.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            room_id = request_room_id(request, kwargs)
+            if room_id is None:
+                return await view(request, *args, **kwargs)
+            url = node_url(room_id)
+            if url:
+                return misdirected(request, url)
+            with use_room(room_id):
+                return await view(request, *args, **kwargs)
+        return wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        room_id = request_room_id(request, kwargs)
+        if room_id is None:
+            return view(request, *args, **kwargs)
+        url = node_url(room_id)
+        if url:
+            return misdirected(request, url)
+        with use_room(room_id):
+            return view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,203 @@
+import logging
+import queue
+import threading
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.db import close_old_connections
+from requests import RequestException
+from telebot import TeleBot, types
+from telebot.apihelper import ApiException, ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+
+def bot_config():
+    return {
+        'WORKERS': 4,
+        'QUEUE_SIZE': 100,
+        'POLL_TIMEOUT': 30,
+        'BACKOFF_MIN': 1.0,
+        'BACKOFF_MAX': 60.0,
+        'HANDLERS_MODULE': 'bot',
+        'WEBHOOK_SECRET': '',
+        **getattr(settings, 'TELEGRAM_BOT', {}),
+    }
+
+
+class RateLimiter:
+    """Ограничения Telegram на отправку: около 30 сообщений в секунду на бота,
+    не чаще раза в секунду в один чат и 20 сообщений в минуту в группу.
+
+    Каждому отправителю выдаётся ближайшее свободное окно, ждать он его будет
+    сам, вне блокировки.
+    """
+
+    def __init__(self, per_second=30, chat_interval=1.0, group_interval=3.0, clock=time.monotonic):
+        self.global_interval = 1 / per_second
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self.clock = clock
+        self._next_global = 0.0
+        self._next_chat = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, chat_id):
+        """Вернуть, сколько секунд подождать перед отправкой в chat_id."""
+        with self._lock:
+            now = self.clock()
+            slot = max(now, self._next_global, self._next_chat.get(chat_id, 0.0))
+            self._next_global = slot + self.global_interval
+            # У групп и каналов отрицательные chat_id
+            interval = self.group_interval if int(chat_id) < 0 else self.chat_interval
+            self._next_chat[chat_id] = slot + interval
+            if len(self._next_chat) > 10000:
+                self._next_chat = {chat: moment for chat, moment in self._next_chat.items() if moment > now}
+            return slot - now
+
+    def acquire(self, chat_id):
+        delay = self.reserve(chat_id)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class LimitedTeleBot(TeleBot):
+    """TeleBot, который сам соблюдает ограничения Telegram на отправку.
+
+    Обработчики зовут send_message как обычно: перед отправкой он ждёт окна
+    у RateLimiter, а на 429 выжидает retry_after и повторяет. Обновления
+    разбирает BotRuntime, поэтому своих потоков у бота нет (threaded=False).
+    """
+
+    def __init__(self, token, limiter=None, attempts=3, **kwargs):
+        kwargs.setdefault('threaded', False)
+        super().__init__(token, **kwargs)
+        self.limiter = limiter or RateLimiter()
+        self.attempts = attempts
+
+    def send_message(self, chat_id, text, *args, **kwargs):
+        for attempt in range(self.attempts):
+            self.limiter.acquire(chat_id)
+            try:
+                return super().send_message(chat_id, text, *args, **kwargs)
+            except ApiTelegramException as error:
+                if error.error_code != 429 or attempt == self.attempts - 1:
+                    raise
+                time.sleep(error.result_json.get('parameters', {}).get('retry_after', 1))
+
+
+def parse_update(data):
+    """Обновление Telegram из разобранного JSON или None, если это не обновление."""
+    try:
+        return types.Update.de_json(data)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class BotRuntime:
+    """Обработка обновлений бота пулом потоков.
+
+    Обновления раскладываются по ограниченным очередям по chat_id: сообщения
+    одного чата обрабатываются по порядку, разные чаты - параллельно, а при
+    переполнении очереди опрос Telegram притормаживает. Сами обработчики
+    регистрирует и вызывает TeleBot (process_new_updates). Опрос
+    перезапускается в цикле с растущей паузой, а не рекурсией.
+    """
+
+    def __init__(self, bot, workers=None, queue_size=None):
+        config = bot_config()
+        self.bot = bot
+        self.queues = [queue.Queue(queue_size or config['QUEUE_SIZE']) for _ in range(workers or config['WORKERS'])]
+        self.stopped = threading.Event()
+        self._workers = []
+
+    def dispatch(self, update):
+        try:
+            self.bot.process_new_updates([update])
+        except Exception:
+            logger.exception("Ошибка при обработке обновления %s", update.update_id)
+
+    def queue_for(self, update):
+        chat_id = update.message.chat.id if update.message else update.update_id
+        return self.queues[hash(chat_id) % len(self.queues)]
+
+    def submit(self, update):
+        # Блокируется при полной очереди - это и есть ограничение сверху
+        self.queue_for(update).put(update)
+
+    def offer(self, update):
+        """Поставить обновление в очередь без ожидания; False, если очередь полна."""
+        try:
+            self.queue_for(update).put_nowait(update)
+        except queue.Full:
+            return False
+        return True
+
+    def start_workers(self):
+        if self._workers:
+            return
+        for index, updates in enumerate(self.queues):
+            worker = threading.Thread(target=self._work, args=(updates,), name=f'bot-worker-{index}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self, updates):
+        while True:
+            update = updates.get()
+            if update is None:
+                updates.task_done()
+                return
+            # Поток живёт долго, как воркер между запросами: соединения с базой,
+            # истёкшие или сломанные прошлым обработчиком, закрываются
+            close_old_connections()
+            try:
+                self.dispatch(update)
+            finally:
+                close_old_connections()
+                updates.task_done()
+
+    def join(self):
+        for updates in self.queues:
+            updates.join()
+
+    def stop(self):
+        self.stopped.set()
+        for updates in self.queues:
+            updates.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def poll_forever(self, poll_timeout=None):
+        config = bot_config()
+        poll_timeout = config['POLL_TIMEOUT'] if poll_timeout is None else poll_timeout
+        delay = config['BACKOFF_MIN']
+        offset = None
+
+        self.start_workers()
+        while not self.stopped.is_set():
+            try:
+                updates = self.bot.get_updates(offset, timeout=poll_timeout + 10, long_polling_timeout=poll_timeout,
+                                               allowed_updates=['message'])
+            except (ApiException, RequestException) as error:
+                logger.warning("Ошибка опроса Telegram: %s, повтор через %.0f с", error, delay)
+                self.stopped.wait(delay)
+                delay = min(delay * 2, config['BACKOFF_MAX'])
+                continue
+
+            delay = config['BACKOFF_MIN']
+            for update in updates:
+                offset = update.update_id + 1
+                self.submit(update)
+
+
+_webhook_lock = threading.Lock()
+
+
+def webhook_runtime():
+    """Среда бота из модуля обработчиков (bot.py) с запущенным пулом - для вебхука."""
+    with _webhook_lock:
+        runtime = import_module(bot_config()['HANDLERS_MODULE']).runtime
+        runtime.start_workers()
+    return runtime
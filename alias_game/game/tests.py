@@ -1,3 +1,1766 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import re
+import socketserver
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qsl, urlsplit
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.db.backends.sqlite3 import base as sqlite_base
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from telebot import apihelper
+
+from .cache_backends import RespCache, SQLiteCache
+from .caching import room_invalidated, version_key
+from .db_backends.pool import ConnectionPool, PooledDatabaseMixin, PoolTimeout, close_pools
+from .encoding import packb, unpackb
+from .engine import RoomConflict, engine
+from . import history
+from .loadtest import run_load
+from .metrics import registry
+from .models import GameEvent, GameResult, GameRoom, IdSequence, Player, PlayerStats
+from .permutation import KeyedPermutation
+from . import realtime
+from .realtime import counter_key, event_key, groups, listeners_key, relay, room_socket
+from .reaper import reap_rooms, scheduler as reaper
+from .rebalance import rebalance_rooms
+from .results import report_result
+from .roomids import ALPHABET, SPACE, RoomIdAllocator, allocator, to_code
+from .scheduling import PeriodicJob
+from .sharding import HashRing, database_for, shard_for
+from .telegram import BotRuntime, LimitedTeleBot, RateLimiter, parse_update
+from .turns import expire_turns, scheduler as turn_timer
+from .views import add_point_for
+from .wordbank import MappedPack, build_pack
+from .words import EASY_WORDS, WordDeck, bank
+
+
+def post_json(client, url, data):
+    return client.post(url, json.dumps(data), content_type='application/json').json()
+
+
+module_context = ExitStack()
+
+
+def setUpModule():
+    # Тесты чистят кэш (cache.clear()): им свой файл, иначе пропали бы ответы,
+    # блокировки и версии комнат работающего приложения
+    cache_dir = module_context.enter_context(tempfile.TemporaryDirectory(prefix='alias-test-cache-'))
+    module_context.enter_context(override_settings(
+        CACHES={'default': {
+            'BACKEND': 'game.cache_backends.SQLiteCache',
+            'LOCATION': str(Path(cache_dir) / 'cache.sqlite3'),
+        }},
+        REALTIME={**settings.REALTIME, 'RELAY': True},
+    ))
+    # Собранной статики в репозитории нет: шаблонам нужен манифест с хэшами.
+    # Тесты собирают её в свой каталог, не трогая собранную для сервера
+    static_root = module_context.enter_context(tempfile.TemporaryDirectory(prefix='alias-test-static-'))
+    module_context.enter_context(override_settings(STATIC_ROOT=static_root))
+    call_command('collectstatic', interactive=False, verbosity=0)
+
+
+def tearDownModule():
+    module_context.close()
+
+
+def make_room(creator_id=1, team_size=2):
+    room = GameRoom.objects.create(creator_id=creator_id, creator_name='creator')
+    user_id = 100
+    for team in ('A', 'B'):
+        for _ in range(team_size):
+            Player.objects.create(room=room, user_id=user_id, username=f'user{user_id}', team=team)
+            user_id += 1
+    return room
+
+
+class RealtimeTests(TestCase):
+    def setUp(self):
+        # Ретранслятор опрашиваем вручную, без фонового потока
+        patcher = mock.patch.object(relay, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def connect(self, room_id):
+        communicator = ApplicationCommunicator(room_socket, {
+            'type': 'websocket',
+            'path': f'/ws/room/{room_id}/',
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.accept')
+        return communicator
+
+    async def test_word_guessed_is_pushed_to_room_group(self):
+        room = await sync_to_async(make_room)()
+        communicator = await self.connect(room.room_id)
+
+        await sync_to_async(post_json)(self.client, '/api/start-game/', {
+            'room_id': room.room_id, 'user_id': 1,
+        })
+        started = json.loads((await communicator.receive_output())['text'])
+        self.assertEqual(started['type'], 'started')
+
+        await sync_to_async(post_json)(self.client, '/api/word-guessed/', {
+            'room_id': room.room_id, 'user_id': 100,
+        })
+        event = json.loads((await communicator.receive_output())['text'])
+        self.assertEqual(event, {'type': 'score', 'room_id': room.room_id, 'score_a': 1, 'score_b': 0})
+
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+        self.assertEqual(groups.count(room.room_id), 0)
+
+    async def test_unknown_path_is_rejected(self):
+        communicator = ApplicationCommunicator(room_socket, {'type': 'websocket', 'path': '/ws/other/'})
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual(await communicator.receive_output(), {'type': 'websocket.close', 'code': 4404})
+
+    def test_publish_without_subscribers_is_noop(self):
+        self.assertEqual(groups.publish('NOROOM', {'type': 'score'}), 0)
+
+    async def test_events_of_other_workers_are_relayed(self):
+        room = await sync_to_async(make_room)()
+        communicator = await self.connect(room.room_id)
+        await sync_to_async(relay.poll)()
+
+        # Смена хода по таймеру в другом воркере и очко в этом
+        await sync_to_async(relay.store)(
+            room.room_id, json.dumps({'type': 'turn', 'room_id': room.room_id}), origin='other-worker')
+        await sync_to_async(realtime.publish)(room.room_id, 'score', score_a=1, score_b=0)
+        self.assertEqual(json.loads((await communicator.receive_output())['text'])['type'], 'score')
+
+        # Своё событие второй раз не приходит
+        self.assertEqual(await sync_to_async(relay.poll)(), 1)
+        self.assertEqual(json.loads((await communicator.receive_output())['text'])['type'], 'turn')
+        self.assertEqual(await sync_to_async(relay.poll)(), 0)
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    async def test_relay_waits_for_event_still_being_written(self):
+        room = await sync_to_async(make_room)()
+        communicator = await self.connect(room.room_id)
+        await sync_to_async(cache.add)(counter_key(room.room_id), 0)
+        await sync_to_async(relay.poll)()
+
+        # Другой воркер взял номер, но ещё не записал событие, а следующее уже записано
+        number = await sync_to_async(cache.incr)(counter_key(room.room_id))
+        await sync_to_async(relay.store)(room.room_id, '"second"', origin='other-worker')
+        self.assertEqual(await sync_to_async(relay.poll)(), 0)
+
+        await sync_to_async(cache.set)(event_key(room.room_id, number), ('other-worker', '"first"'))
+        self.assertEqual(await sync_to_async(relay.poll)(), 2)
+        self.assertEqual((await communicator.receive_output())['text'], '"first"')
+        self.assertEqual((await communicator.receive_output())['text'], '"second"')
+
+        # Номер, событие которого так и не появилось, пропускается после GAP_TIMEOUT
+        await sync_to_async(cache.incr)(counter_key(room.room_id))
+        await sync_to_async(relay.store)(room.room_id, '"third"', origin='other-worker')
+        with override_settings(REALTIME={'GAP_TIMEOUT': 0}):
+            self.assertEqual(await sync_to_async(relay.poll)(), 0)
+            self.assertEqual(await sync_to_async(relay.poll)(), 1)
+        self.assertEqual((await communicator.receive_output())['text'], '"third"')
+
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    def test_events_nobody_listens_to_are_not_stored(self):
+        cache.delete(listeners_key('QUIET1'))
+        realtime.publish('QUIET1', 'score', score_a=1, score_b=0)
+        self.assertIsNone(cache.get(counter_key('QUIET1')))
+
+        relay.listen('QUIET1')
+        with override_settings(REALTIME={'RELAY': False}):
+            realtime.publish('QUIET1', 'score', score_a=1, score_b=0)
+        self.assertIsNone(cache.get(counter_key('QUIET1')))
+
+        realtime.publish('QUIET1', 'score', score_a=1, score_b=0)
+        self.assertEqual(cache.get(counter_key('QUIET1')), 1)
+
+
+@override_settings(ROOM_ENGINE={'WRITE_BEHIND': True, 'FLUSH_INTERVAL': 3600})
+class RoomEngineTests(TestCase):
+    def setUp(self):
+        engine.clear()
+        self.room = make_room()
+        self.room.is_game_started = True
+        self.room.save()
+
+    def tearDown(self):
+        engine.clear()
+
+    def test_hot_actions_are_served_from_memory(self):
+        engine.get(self.room.room_id)
+
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                post_json(self.client, '/api/word-guessed/', {'room_id': self.room.room_id, 'user_id': 100})
+            state = self.client.get(f'/api/game-state/{self.room.room_id}/').json()
+
+        self.assertEqual(state['score_a'], 3)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.score_a, 0)
+
+        self.assertEqual(engine.flush(), 1)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.score_a, 3)
+
+    def test_turn_end_flushes_and_state_is_rebuilt_after_restart(self):
+        post_json(self.client, '/api/word-guessed/', {'room_id': self.room.room_id, 'user_id': 100})
+        post_json(self.client, '/api/next-turn/', {'room_id': self.room.room_id, 'user_id': 100})
+
+        engine.clear()
+        state = engine.get(self.room.room_id)
+        self.assertEqual(state.score_a, 1)
+        self.assertTrue(state.is_explainer(101))
+
+    def test_roster_change_reloads_state(self):
+        engine.get(self.room.room_id)
+        post_json(self.client, '/api/join-team/', {
+            'room_id': self.room.room_id, 'user_id': 200, 'username': 'late', 'team': 'B',
+        })
+        info = self.client.get(f'/api/room/{self.room.room_id}/').json()
+        self.assertEqual(info['team_b_count'], 3)
+
+    def test_conflicting_write_keeps_flushed_fields(self):
+        with engine.mutate(self.room.room_id) as state:
+            state.add_point()
+            state.switch_team()
+        GameRoom.objects.filter(pk=self.room.pk).update(version=F('version') + 1)
+
+        self.assertEqual(engine.flush(), 1)
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.current_team, self.room.score_a), ('B', 1))
+        self.assertEqual(state.version, self.room.version)
+
+    @override_settings(ROOM_ENGINE={'WRITE_BEHIND': False})
+    def test_conflicting_write_is_reported_and_changes_restored(self):
+        state = engine.load(self.room.room_id)
+        state.switch_team()
+        GameRoom.objects.filter(pk=self.room.pk).update(version=F('version') + 1)
+
+        # Как в mutate(): конфликт откатывает внешнюю транзакцию
+        with self.assertRaises(RoomConflict), transaction.atomic():
+            engine.flush_states([state])
+        self.assertIn('current_team', state.dirty)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.current_team, 'A')
+
+
+class CachedReadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.room = make_room()
+        self.room.is_game_started = True
+        self.room.save()
+        self.url = f'/api/game-state/{self.room.room_id}/'
+
+    def test_unchanged_room_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        etag = first['ETag']
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_mutation_bumps_version(self):
+        etag = self.client.get(self.url)['ETag']
+        post_json(self.client, '/api/word-guessed/', {'room_id': self.room.room_id, 'user_id': 100})
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['score_a'], 1)
+
+    def test_errors_are_not_cached(self):
+        url = '/api/room/NOROOM/'
+        self.assertFalse(self.client.get(url).json()['success'])
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+
+class FakeRespHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        store = self.server.store
+        while (args := self.read_command()) is not None:
+            command, args = args[0].decode().upper(), args[1:]
+            now = time.monotonic()
+            for key, (_, expires) in list(store.items()):
+                if expires is not None and expires <= now:
+                    del store[key]
+
+            if command == 'GET':
+                reply = store.get(args[0], (None,))[0]
+            elif command == 'SET':
+                options = [arg.decode().upper() for arg in args[2:]]
+                expires = now + int(options[options.index('PX') + 1]) / 1000 if 'PX' in options else None
+                if 'NX' in options and args[0] in store:
+                    reply = None
+                else:
+                    store[args[0]] = (args[1], expires)
+                    reply = 'OK'
+            elif command == 'INCRBY':
+                value = int(store.get(args[0], (b'0',))[0]) + int(args[1])
+                store[args[0]] = (str(value).encode(), store.get(args[0], (None, None))[1])
+                reply = value
+            elif command == 'DEL':
+                reply = int(store.pop(args[0], None) is not None)
+            elif command == 'EXISTS':
+                reply = int(args[0] in store)
+            elif command == 'FLUSHDB':
+                store.clear()
+                reply = 'OK'
+            else:
+                reply = 'OK'
+
+            if reply is None:
+                self.wfile.write(b'$-1\r\n')
+            elif isinstance(reply, int):
+                self.wfile.write(b':%d\r\n' % reply)
+            elif isinstance(reply, str):
+                self.wfile.write(b'+%s\r\n' % reply.encode())
+            else:
+                self.wfile.write(b'$%d\r\n%s\r\n' % (len(reply), reply))
+
+
+class FakeRespServer(socketserver.ThreadingTCPServer):
+    """Локальная замена сервера Redis: только команды, которые использует RespCache."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRespHandler)
+        self.store = {}
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class SharedCacheTests(TestCase):
+    def check_backend(self, first, second):
+        first.clear()
+        first.set('key', {'value': 1}, timeout=60)
+        self.assertEqual(second.get('key'), {'value': 1})
+        self.assertTrue(first.add('counter', 5, timeout=None))
+        self.assertFalse(second.add('counter', 7))
+        self.assertEqual(second.incr('counter'), 6)
+        self.assertEqual(first.get('counter'), 6)
+        with self.assertRaises(ValueError):
+            first.incr('missing')
+        self.assertTrue(second.delete('key'))
+        self.assertIsNone(first.get('key'))
+        first.set('short', 1, timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(second.get('short'))
+
+    def test_tests_do_not_share_the_app_cache(self):
+        location = Path(settings.CACHES['default']['LOCATION'])
+        self.assertNotEqual(location, settings.BASE_DIR / 'cache.sqlite3')
+        self.assertTrue(location.is_relative_to(tempfile.gettempdir()))
+
+    def test_sqlite_backend_is_shared_between_instances(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        location = str(Path(directory.name) / 'cache.sqlite3')
+        self.check_backend(SQLiteCache(location, {}), SQLiteCache(location, {}))
+
+    def test_resp_backend_against_local_stand_in(self):
+        server = FakeRespServer()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        location = 'redis://127.0.0.1:%d/0' % server.server_address[1]
+        self.check_backend(RespCache(location, {}), RespCache(location, {}))
+
+        caches = {'default': {'BACKEND': 'game.cache_backends.RespCache', 'LOCATION': location}}
+        with self.settings(CACHES=caches):
+            room = make_room()
+            url = f'/api/room/{room.room_id}/'
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+            events = []
+            handler = lambda sender, room_id, **kwargs: events.append(room_id)
+            room_invalidated.connect(handler)
+            self.addCleanup(room_invalidated.disconnect, handler)
+            post_json(self.client, '/api/join-team/', {
+                'room_id': room.room_id, 'user_id': 300, 'username': 'new', 'team': 'A',
+            })
+            self.assertEqual(events, [room.room_id])
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).json()['team_a_count'], 3)
+
+
+class QueryBudgetTests(TestCase):
+    """Сколько запросов к базе делает каждый эндпоинт (без write-behind и кэша ответов)."""
+
+    def setUp(self):
+        cache.clear()
+        self.room = make_room()
+        self.room_id = self.room.room_id
+
+    def assertBudget(self, queries, method, url, data=None):
+        cache.clear()
+        with self.assertNumQueries(queries):
+            if method == 'get':
+                response = self.client.get(url)
+            else:
+                response = self.client.post(url, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def start(self):
+        GameRoom.objects.filter(pk=self.room.pk).update(is_game_started=True)
+
+    def test_pages(self):
+        self.assertBudget(0, 'get', '/')
+        self.assertBudget(2, 'get', f'/room/{self.room_id}/')
+        self.assertBudget(1, 'get', f'/game/{self.room_id}/')
+
+    def test_lobby_endpoints(self):
+        self.assertBudget(1, 'post', '/api/create-room/', {'user_id': 5, 'username': 'other'})
+        self.assertBudget(1, 'post', '/api/join-room/', {'room_id': self.room_id})
+        self.assertBudget(4, 'post', '/api/join-team/', {
+            'room_id': self.room_id, 'user_id': 300, 'username': 'new', 'team': 'A',
+        })
+        self.assertBudget(2, 'get', f'/api/room/{self.room_id}/')
+        self.assertBudget(2, 'post', '/api/leave-room/', {'room_id': self.room_id, 'user_id': 300})
+        self.assertBudget(5, 'post', '/api/start-game/', {'room_id': self.room_id, 'user_id': 1})
+
+    def test_game_endpoints(self):
+        self.start()
+        self.assertBudget(2, 'get', f'/api/game-state/{self.room_id}/')
+        self.assertBudget(3, 'post', '/api/get-word/', {'room_id': self.room_id, 'user_id': 100})
+        self.assertBudget(4, 'post', '/api/word-guessed/', {'room_id': self.room_id, 'user_id': 100})
+        self.assertBudget(5, 'post', '/api/next-turn/', {'room_id': self.room_id, 'user_id': 100})
+        self.assertBudget(5, 'post', '/api/switch-team/', {'room_id': self.room_id, 'user_id': 1})
+
+    def test_last_player_leaving_deletes_room(self):
+        Player.objects.filter(room=self.room).exclude(user_id=100).delete()
+        response = self.assertBudget(4, 'post', '/api/leave-room/', {'room_id': self.room_id, 'user_id': 100})
+        self.assertTrue(response.json()['room_deleted'])
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.room = make_room()
+        GameRoom.objects.filter(pk=self.room.pk).update(is_game_started=True)
+
+    async def post(self, client, url, data):
+        response = await client.post(url, json.dumps(data), content_type='application/json')
+        return response.json()
+
+    async def test_hot_endpoints_run_on_the_event_loop(self):
+        client = AsyncClient()
+        room_id = self.room.room_id
+
+        state = (await client.get(f'/api/game-state/{room_id}/')).json()
+        self.assertEqual(state['explainer']['id'], 100)
+        info = (await client.get(f'/api/room/{room_id}/')).json()
+        self.assertEqual(info['team_a_count'], 2)
+
+        word = await self.post(client, '/api/get-word/', {'room_id': room_id, 'user_id': 100})
+        self.assertTrue(word['word'])
+        denied = await self.post(client, '/api/get-word/', {'room_id': room_id, 'user_id': 101})
+        self.assertEqual(denied['error'], 'Не ваш ход')
+
+        scored = await self.post(client, '/api/word-guessed/', {'room_id': room_id, 'user_id': 100})
+        self.assertEqual((scored['score_a'], scored['score_b']), (1, 0))
+        state = (await client.get(f'/api/game-state/{room_id}/')).json()
+        self.assertEqual(state['score_a'], 1)
+
+        missing = (await client.get('/api/game-state/NOROOM/')).json()
+        self.assertFalse(missing['success'])
+
+    async def test_concurrent_draws_retry_on_version_conflict(self):
+        client = AsyncClient()
+        data = {'room_id': self.room.room_id, 'user_id': 100}
+        results = await asyncio.gather(*(self.post(client, '/api/get-word/', data) for _ in range(4)))
+
+        words = [result['word'] for result in results]
+        self.assertEqual(len(set(words)), 4)
+        room = await GameRoom.objects.aget(pk=self.room.pk)
+        self.assertEqual(room.deck_cursor, 4)
+
+    async def test_exhausted_retries_answer_conflict(self):
+        client = AsyncClient()
+        with mock.patch.object(engine, '_awrite', mock.AsyncMock(return_value=None)):
+            response = await client.post('/api/get-word/', json.dumps({'room_id': self.room.room_id, 'user_id': 100}),
+                                         content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'Комната занята, повторите запрос')
+
+
+class BatchActionsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.room = make_room()
+        GameRoom.objects.filter(pk=self.room.pk).update(is_game_started=True)
+
+    def act(self, actions, user_id=100):
+        return post_json(self.client, '/api/actions/', {
+            'room_id': self.room.room_id, 'user_id': user_id, 'actions': actions,
+        })
+
+    def test_guess_and_next_word_in_one_write(self):
+        first = self.act(['next_word'])
+        with self.assertNumQueries(4):
+            response = self.act(['guessed', 'next_word'])
+
+        self.assertEqual((response['score_a'], response['score_b']), (1, 0))
+        self.assertNotEqual(response['word'], first['word'])
+        self.assertEqual(response['turn_deadline'], first['turn_deadline'])
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.score_a, self.room.deck_cursor), (1, 2))
+
+    def test_skip_only_draws(self):
+        response = self.act(['skip', 'next_word'])
+        self.assertEqual(response['score_a'], 0)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.deck_cursor, 1)
+
+    def test_batch_is_all_or_nothing(self):
+        self.assertEqual(self.act(['guessed', 'next_word'], user_id=101)['error'], 'Не ваш ход')
+        self.assertIn('Неизвестное действие', self.act(['guessed', 'teleport'])['error'])
+        self.assertFalse(self.act([])['success'])
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.score_a, self.room.deck_cursor), (0, 0))
+
+
+@override_settings(WORD_QUEUE_SIZE=3)
+class WordQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.room = make_room()
+        GameRoom.objects.filter(pk=self.room.pk).update(is_game_started=True)
+
+    def post(self, url, user_id=100, **data):
+        return post_json(self.client, url, {'room_id': self.room.room_id, 'user_id': user_id, **data})
+
+    def positions(self, response):
+        return [item['position'] for item in response['queue']]
+
+    def test_queue_is_reserved_and_refilled_on_confirmation(self):
+        queue = self.post('/api/word-queue/')
+        self.assertEqual(self.positions(queue), [0, 1, 2])
+        self.assertEqual(self.post('/api/word-queue/')['queue'], queue['queue'])
+
+        response = self.post('/api/actions/', actions=['guessed', 'skip'], position=0)
+        self.assertEqual(response['score_a'], 1)
+        self.assertEqual(self.positions(response), [2, 3, 4])
+        self.assertEqual(response['queue'][0], queue['queue'][2])
+
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.turn_cursor, self.room.deck_cursor), (2, 5))
+
+    def test_stale_confirmation_is_rejected(self):
+        self.post('/api/word-queue/')
+        self.post('/api/actions/', actions=['guessed'], position=0)
+        response = self.post('/api/actions/', actions=['guessed'], position=0)
+
+        self.assertFalse(response['success'])
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.score_a, 1)
+
+    def test_unconfirmed_words_are_never_shown_again(self):
+        first = self.post('/api/word-queue/')
+        self.post('/api/actions/', actions=['skip'], position=0)
+        self.post('/api/next-turn/')
+
+        second = self.post('/api/word-queue/', user_id=101)
+        self.assertEqual(self.positions(second), [4, 5, 6])
+        seen = {item['word'] for item in first['queue']}
+        self.assertFalse(seen & {item['word'] for item in second['queue']})
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.room = make_room()
+
+    def histogram_sum(self, name, endpoint):
+        return next(h.sum for (metric, labels), h in registry.histograms.items()
+                    if metric == name and dict(labels)['endpoint'] == endpoint)
+
+    def test_requests_queries_errors_and_cache_are_recorded(self):
+        for _ in range(3):
+            self.client.get(f'/api/room/{self.room.room_id}/')
+        post_json(self.client, '/api/word-guessed/', {'room_id': self.room.room_id, 'user_id': 101})
+
+        self.assertEqual(registry.value('alias_http_requests_total', endpoint='get_room_info',
+                                        method='GET', status=200), 3)
+        self.assertEqual(self.histogram_sum('alias_db_queries_per_request', 'get_room_info'), 2)
+        self.assertEqual(registry.value('alias_http_errors_total', endpoint='word_guessed', kind='application'), 1)
+        self.assertAlmostEqual(registry.cache_ratios()['room_response'], 2 / 3)
+
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('# TYPE alias_http_request_duration_seconds histogram', body)
+        self.assertIn('alias_http_request_duration_seconds_bucket{endpoint="get_room_info",le="+Inf"} 3', body)
+        self.assertIn('alias_cache_hit_ratio{cache="room_response"} 0.6667', body)
+
+    async def test_async_views_report_their_queries(self):
+        await AsyncClient().get(f'/api/game-state/{self.room.room_id}/')
+        self.assertEqual(self.histogram_sum('alias_db_queries_per_request', 'game_state'), 2)
+
+    def test_recorder_is_removed_after_request(self):
+        self.client.get(f'/api/room/{self.room.room_id}/')
+        self.assertEqual(connection.execute_wrappers, [])
+
+    @override_settings(METRICS={'TOKEN': 'secret'})
+    def test_endpoint_requires_token_when_configured(self):
+        self.assertEqual(Client().get('/metrics/').status_code, 403)
+        response = Client().get('/metrics/', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS={'SLOW_REQUEST_MS': 0.001})
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.assertLogs('game.metrics.slow', 'WARNING') as logs:
+            Client().get(f'/api/room/{self.room.room_id}/')
+        self.assertIn('SELECT', logs.output[0])
+        self.assertIn('get_room_info', logs.output[0])
+
+
+class IndexUsageTests(TestCase):
+    """Горячие запросы должны идти по индексам, а не полным просмотром таблиц."""
+
+    def setUp(self):
+        self.room = make_room(team_size=3)
+
+    def plan(self, queryset):
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, *names):
+        plan = self.plan(queryset)
+        self.assertTrue(any(name in plan for name in names), plan)
+        if connection.vendor == 'sqlite':
+            self.assertNotRegex(plan, r'SCAN game_(gameroom|player)\b')
+
+    def test_room_lookup_uses_unique_index(self):
+        # Имя индекса уникальности генерируется базой
+        self.assertUsesIndex(GameRoom.objects.filter(room_id=self.room.room_id),
+                             'sqlite_autoindex_game_gameroom', 'room_id')
+
+    def test_team_roster_uses_composite_index(self):
+        queryset = Player.objects.filter(room=self.room, team='A').order_by('id')
+        self.assertUsesIndex(queryset, 'player_room_team_idx')
+        if connection.vendor == 'sqlite':
+            self.assertNotIn('TEMP B-TREE', self.plan(queryset))
+
+    def test_leave_room_lookup_uses_indexes(self):
+        self.assertUsesIndex(
+            Player.objects.filter(room__room_id=self.room.room_id, user_id=100),
+            'sqlite_autoindex_game_player', 'game_player_room_id_user_id', 'player_room_team_idx',
+        )
+
+    def test_active_rooms_use_partial_indexes(self):
+        now = timezone.now()
+        self.assertUsesIndex(GameRoom.objects.filter(is_active=True, created_at__lt=now),
+                             'gameroom_active_created_idx')
+        self.assertUsesIndex(GameRoom.objects.filter(is_active=True, last_activity__lt=now),
+                             'gameroom_active_activity_idx')
+
+
+class ReaperTests(TestCase):
+    def test_stale_rooms_are_deleted_in_chunks(self):
+        now = timezone.now()
+        idle = [make_room() for _ in range(3)]
+        GameRoom.objects.filter(pk__in=[room.pk for room in idle]).update(last_activity=now - timedelta(hours=3))
+        old = make_room()
+        GameRoom.objects.filter(pk=old.pk).update(created_at=now - timedelta(days=2))
+        alive = make_room()
+
+        output = StringIO()
+        call_command('reap_rooms', '--dry-run', stdout=output)
+        self.assertIn('комнат: 4, игроков: 16', output.getvalue())
+        self.assertEqual(GameRoom.objects.count(), 5)
+
+        self.assertEqual(reap_rooms(chunk_size=2), {'rooms': 4, 'players': 16})
+        self.assertEqual(list(GameRoom.objects.all()), [alive])
+        # Счётчики версий удалённых комнат не остаются в кэше
+        self.assertFalse(any(cache.has_key(version_key(room.room_id)) for room in [*idle, old]))
+        self.assertEqual(Player.objects.count(), 4)
+
+    def test_mutations_mark_activity(self):
+        room = make_room()
+        GameRoom.objects.filter(pk=room.pk).update(is_game_started=True, last_activity=timezone.now() - timedelta(hours=3))
+        post_json(self.client, '/api/word-guessed/', {'room_id': room.room_id, 'user_id': 100})
+
+        self.assertEqual(reap_rooms(), {'rooms': 0, 'players': 0})
+
+
+class TurnTimerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def started_room(self, **fields):
+        room = make_room()
+        GameRoom.objects.filter(pk=room.pk).update(is_game_started=True, **fields)
+        return room
+
+    def test_first_word_starts_the_countdown(self):
+        room = self.started_room()
+        data = {'room_id': room.room_id, 'user_id': 100}
+
+        first = post_json(self.client, '/api/get-word/', data)
+        second = post_json(self.client, '/api/get-word/', data)
+        self.assertIsNotNone(first['turn_deadline'])
+        self.assertEqual(first['turn_deadline'], second['turn_deadline'])
+
+        room.refresh_from_db()
+        remaining = (room.turn_deadline - timezone.now()).total_seconds()
+        self.assertTrue(58 < remaining <= 60)
+        state = self.client.get(f'/api/game-state/{room.room_id}/').json()
+        self.assertEqual(state['turn_deadline'], first['turn_deadline'])
+
+    def test_expired_turns_are_advanced_in_batches(self):
+        past = timezone.now() - timedelta(seconds=1)
+        expired = [self.started_room(turn_deadline=past) for _ in range(3)]
+        running = self.started_room(turn_deadline=timezone.now() + timedelta(seconds=30))
+
+        self.assertEqual(len(expire_turns(batch_size=2)), 2)
+        self.assertEqual(len(expire_turns(batch_size=2)), 1)
+        self.assertEqual(expire_turns(), [])
+
+        for room in expired:
+            room.refresh_from_db()
+            self.assertIsNone(room.turn_deadline)
+            self.assertEqual((room.current_explainer_index, room.current_guesser_index), (1, 0))
+        running.refresh_from_db()
+        self.assertEqual(running.current_explainer_index, 0)
+
+    def test_expired_turn_rejects_points(self):
+        room = self.started_room(turn_deadline=timezone.now() - timedelta(seconds=1))
+        response = post_json(self.client, '/api/word-guessed/', {'room_id': room.room_id, 'user_id': 100})
+
+        self.assertEqual(response['error'], 'Время хода вышло')
+        room.refresh_from_db()
+        self.assertEqual(room.score_a, 0)
+
+    def test_manual_turn_change_cancels_the_deadline(self):
+        room = self.started_room(turn_deadline=timezone.now() - timedelta(seconds=1))
+        post_json(self.client, '/api/next-turn/', {'room_id': room.room_id, 'user_id': 100})
+
+        self.assertEqual(expire_turns(), [])
+        room.refresh_from_db()
+        self.assertEqual(room.current_explainer_index, 1)
+
+    def test_only_one_worker_runs_each_tick(self):
+        calls = []
+        job = PeriodicJob('test-job', lambda: calls.append(1), lambda: 5)
+
+        self.assertTrue(job.run_once(5))
+        self.assertFalse(PeriodicJob('test-job', lambda: calls.append(2), lambda: 5).run_once(5))
+        self.assertEqual(calls, [1])
+
+
+class PeriodicJobTests(SimpleTestCase):
+    def test_lock_outlives_a_slow_pass_and_is_released_after_it(self):
+        other, overlapped = PeriodicJob('slow-job', lambda: None, lambda: 0.1), []
+        self.addCleanup(cache.delete, other.lock_key)
+
+        def slow_pass():
+            time.sleep(0.2)
+            # Интервал прошёл, а проход ещё идёт: второй воркер не должен его запустить
+            overlapped.append(other.run_once(0.1))
+
+        self.assertTrue(PeriodicJob('slow-job', slow_pass, lambda: 0.1).run_once(0.1))
+        self.assertEqual(overlapped, [False])
+        self.assertTrue(other.run_once(0.1))
+
+
+class BackgroundJobsTests(SimpleTestCase):
+    def start_calls(self):
+        with mock.patch.object(reaper, 'start') as reaper_start, \
+                mock.patch.object(turn_timer, 'start') as timer_start, \
+                mock.patch.object(history.events, 'start') as history_start:
+            apps.get_app_config('game').ready()
+        return reaper_start.call_count, timer_start.call_count, history_start.call_count
+
+    def test_threads_start_only_when_enabled(self):
+        with override_settings(BACKGROUND_JOBS=False):
+            self.assertEqual(self.start_calls(), (0, 0, 0))
+        with override_settings(BACKGROUND_JOBS=True):
+            self.assertEqual(self.start_calls(), (1, 1, 1))
+
+
+class WordDeckTests(TestCase):
+    def test_each_round_is_a_full_permutation(self):
+        deck = WordDeck(EASY_WORDS, seed=42)
+        first = [deck.draw() for _ in EASY_WORDS]
+        second = [deck.draw() for _ in EASY_WORDS]
+
+        self.assertEqual(sorted(first), sorted(EASY_WORDS))
+        self.assertEqual(sorted(second), sorted(EASY_WORDS))
+        self.assertNotEqual(first, second)
+        self.assertEqual(deck.cursor, 2 * len(EASY_WORDS))
+
+    def test_get_word_persists_only_the_cursor(self):
+        room = make_room()
+        room.is_game_started = True
+        room.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            words = [
+                post_json(self.client, '/api/get-word/', {'room_id': room.room_id, 'user_id': 100})['word']
+                for _ in range(3)
+            ]
+
+        self.assertEqual(len(set(words)), 3)
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertTrue(all('"deck_cursor"' in sql and '"score_a"' not in sql for sql in updates))
+        room.refresh_from_db()
+        self.assertEqual(room.deck_cursor, 3)
+
+
+class WordBankTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name) / 'test.pack'
+
+    def test_pack_round_trip_with_tags(self):
+        words = [(f'слово{i}', 'easy' if i % 2 else 'hard', ['animals'] if i % 3 == 0 else []) for i in range(1000)]
+        build_pack(self.path, words)
+
+        pack = MappedPack(self.path)
+        easy = pack.section('easy')
+        self.assertEqual(len(easy), 500)
+        self.assertEqual(easy[0], 'слово1')
+        self.assertEqual(easy[-1], 'слово999')
+        self.assertEqual(list(pack.section('hard', 'animals'))[:2], ['слово0', 'слово6'])
+        self.assertIsNone(pack.section('medium'))
+
+    def test_room_draws_from_file_pack(self):
+        sources = Path(self.directory.name) / 'words.txt'
+        sources.write_text('кит\teasy\tanimals\nслон\teasy\tanimals\nстол\teasy\n', encoding='utf-8')
+        call_command('build_wordpack', 'zoo', str(sources), output_dir=self.directory.name, stdout=StringIO())
+
+        with self.settings(WORD_PACKS={'zoo': Path(self.directory.name) / 'zoo.pack'}):
+            bank.reset()
+            self.addCleanup(bank.reset)
+            self.assertFalse(post_json(self.client, '/api/create-room/', {
+                'user_id': 1, 'username': 'creator', 'difficulty': 'easy', 'word_pack': 'zoo/plants',
+            })['success'])
+            # В наборе только лёгкие слова: комната на другой сложности не соберёт колоду
+            self.assertFalse(post_json(self.client, '/api/create-room/', {
+                'user_id': 1, 'username': 'creator', 'difficulty': 'hard', 'word_pack': 'zoo/animals',
+            })['success'])
+            room_id = post_json(self.client, '/api/create-room/', {
+                'user_id': 1, 'username': 'creator', 'difficulty': 'easy', 'word_pack': 'zoo/animals',
+            })['room_id']
+
+            room = GameRoom.objects.get(room_id=room_id)
+            for user_id, team in ((100, 'A'), (101, 'A'), (102, 'B'), (103, 'B')):
+                Player.objects.create(room=room, user_id=user_id, username=f'user{user_id}', team=team)
+            GameRoom.objects.filter(pk=room.pk).update(is_game_started=True)
+
+            words = {
+                post_json(self.client, '/api/get-word/', {'room_id': room_id, 'user_id': 100})['word']
+                for _ in range(2)
+            }
+            self.assertEqual(words, {'кит', 'слон'})
+
+
+class ConcurrentMutationTests(TransactionTestCase):
+    GUESSES = 300
+
+    def guess(self, room_id):
+        try:
+            return post_json(Client(), '/api/word-guessed/', {'room_id': room_id, 'user_id': 100})
+        finally:
+            connection.close()
+
+    def test_parallel_guesses_are_not_lost(self):
+        room = make_room()
+        room.is_game_started = True
+        room.save()
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(self.guess, [room.room_id] * self.GUESSES))
+
+        self.assertTrue(all(result['success'] for result in results), [r for r in results if not r['success']][:3])
+        room.refresh_from_db()
+        self.assertEqual(room.score_a, self.GUESSES)
+        self.assertEqual(room.version, self.GUESSES)
+        # Последний ответ видит итоговый счёт, а не устаревшую копию
+        self.assertEqual(max(result['score_a'] for result in results), self.GUESSES)
+
+    def test_parallel_turn_changes_are_serialized(self):
+        room = make_room(team_size=3)
+        room.is_game_started = True
+        room.save()
+
+        def next_turn(_):
+            try:
+                return post_json(Client(), '/api/next-turn/', {'room_id': room.room_id, 'user_id': 1})
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(next_turn, range(30)))
+
+        self.assertTrue(all(result['success'] for result in results), [r for r in results if not r['success']][:3])
+        room.refresh_from_db()
+        self.assertEqual(room.version, 30)
+
+
+class LoadTestHarnessTests(TransactionTestCase):
+    def test_full_flow_against_local_server(self):
+        cache.clear()
+        report = run_load(rooms=2, players=4, turns=2, words=2, poll_interval=0.05)
+
+        self.assertEqual(report['errors'], 0)
+        endpoints = report['endpoints']
+        for name in ('create_room', 'join_team', 'start_game', 'word_queue', 'actions', 'next_turn',
+                     'game_state', 'get_room_info'):
+            self.assertIn(name, endpoints)
+        self.assertEqual(endpoints['create_room']['requests'], 2)
+        self.assertEqual(endpoints['actions']['requests'], 2 * 2 * 2)
+        self.assertEqual(endpoints['create_room']['queries_avg'], 1)
+        self.assertGreater(report['throughput_rps'], 0)
+        self.assertFalse(GameRoom.objects.exists())
+
+
+class FakeBotApiHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, payload):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        method = url.path.rsplit('/', 1)[-1]
+        # telebot передаёт параметры в строке запроса; вложенные - строкой JSON
+        params = {}
+        for key, value in parse_qsl(url.query):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+
+        with server.lock:
+            server.calls.append(method)
+            if method == 'getUpdates':
+                if server.poll_failures:
+                    server.poll_failures -= 1
+                    return self.reply(502, b'Bad Gateway')
+                offset = params.get('offset') or 0
+                updates = [update for update in server.updates if update['update_id'] >= offset]
+            elif method == 'sendMessage':
+                if server.rate_limited:
+                    server.rate_limited -= 1
+                    return self.reply(429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                                            'parameters': {'retry_after': 0}})
+                server.sent.append(params)
+                return self.reply(200, {'ok': True, 'result': {
+                    'message_id': len(server.sent), 'date': 0, 'chat': {'id': params['chat_id'], 'type': 'private'},
+                }})
+            else:
+                return self.reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+        if not updates:
+            time.sleep(0.01)
+        self.reply(200, {'ok': True, 'result': updates})
+
+    do_POST = do_GET
+
+
+class FakeBotApiServer(ThreadingHTTPServer):
+    """Локальная замена Bot API: getUpdates и sendMessage, сбои по заказу."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeBotApiHandler)
+        self.lock = threading.Lock()
+        self.updates, self.sent, self.calls = [], [], []
+        self.poll_failures = 0
+        self.rate_limited = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def serve_bots(self):
+        """Направить запросы telebot на этот сервер до конца теста."""
+        return mock.patch.object(apihelper, 'API_URL', self.url + '/bot{0}/{1}')
+
+    def add_message(self, chat_id, text):
+        self.updates.append(make_update(len(self.updates) + 1, chat_id, text))
+
+
+def make_update(update_id, chat_id, text, first_name='Ann'):
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': first_name}, 'text': text,
+    }}
+
+
+@override_settings(TELEGRAM_BOT={'BACKOFF_MIN': 0.01, 'BACKOFF_MAX': 0.02})
+class BotRuntimeTests(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeBotApiServer()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        patcher = self.server.serve_bots()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bot = LimitedTeleBot('1:TOKEN', limiter=RateLimiter(per_second=1000, chat_interval=0, group_interval=0))
+
+    def runtime(self, **kwargs):
+        runtime = BotRuntime(self.bot, **kwargs)
+        self.addCleanup(runtime.stop)
+        return runtime
+
+    def poll_until(self, runtime, condition, timeout=5):
+        poller = threading.Thread(target=runtime.poll_forever, kwargs={'poll_timeout': 0}, daemon=True)
+        poller.start()
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        runtime.stopped.set()
+        poller.join()
+
+    def test_chats_are_handled_concurrently_and_in_order(self):
+        runtime = self.runtime(workers=4)
+        handled = defaultdict(list)
+
+        @self.bot.message_handler(content_types=['text'])
+        def slow_echo(message):
+            time.sleep(0.2)
+            handled[message.chat.id].append(message.text)
+
+        for chat_id in (1, 2, 3, 4):
+            self.server.add_message(chat_id, 'first')
+            self.server.add_message(chat_id, 'second')
+
+        started = time.monotonic()
+        self.poll_until(runtime, lambda: sum(map(len, handled.values())) == 8)
+        self.assertLess(time.monotonic() - started, 1.2)
+        self.assertEqual(dict(handled), {chat_id: ['first', 'second'] for chat_id in (1, 2, 3, 4)})
+
+    def test_workers_release_stale_connections_around_updates(self):
+        runtime = self.runtime(workers=1)
+        self.bot.message_handler(content_types=['text'])(lambda message: None)
+        with mock.patch('game.telegram.close_old_connections') as close:
+            runtime.start_workers()
+            runtime.submit(parse_update(make_update(1, 1, 'hi')))
+            runtime.join()
+        self.assertEqual(close.call_count, 2)
+
+    def test_handler_errors_are_logged(self):
+        runtime = self.runtime(workers=1)
+
+        @self.bot.message_handler(content_types=['text'])
+        def broken(message):
+            raise RuntimeError('boom')
+
+        runtime.start_workers()
+        with self.assertLogs('game.telegram', 'ERROR'):
+            runtime.submit(parse_update(make_update(1, 1, 'hi')))
+            runtime.join()
+
+    def test_polling_recovers_after_failures(self):
+        runtime = self.runtime(workers=1)
+        self.bot.message_handler(commands=['start'])(lambda message: self.bot.send_message(message.chat.id, 'hi'))
+        self.server.poll_failures = 3
+        self.server.rate_limited = 1
+        self.server.add_message(7, '/start@alias_bot')
+
+        with self.assertLogs('game.telegram', 'WARNING') as logs:
+            self.poll_until(runtime, lambda: self.server.sent)
+        self.assertEqual(len(logs.output), 3)
+        self.assertEqual(self.server.sent, [{'chat_id': 7, 'text': 'hi'}])
+        self.assertEqual(self.server.calls[:3], ['getUpdates'] * 3)
+
+    def test_rate_limiter_spaces_messages(self):
+        clock = [100.0]
+        limiter = RateLimiter(per_second=10, chat_interval=1, group_interval=3, clock=lambda: clock[0])
+
+        self.assertEqual([limiter.reserve(5) for _ in range(3)], [0, 1, 2])
+        self.assertAlmostEqual(limiter.reserve(6), 2.1, places=6)
+        self.assertAlmostEqual(limiter.reserve(-100), 2.2, places=6)
+        self.assertAlmostEqual(limiter.reserve(-100), 5.2, places=6)
+
+
+@override_settings(TELEGRAM_BOT={'WEBHOOK_SECRET': 'hook-secret', 'HANDLERS_MODULE': 'bot'})
+class TelegramWebhookTests(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeBotApiServer()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def deliver(self, update, secret='hook-secret'):
+        return self.client.post('/telegram/webhook/', json.dumps(update), content_type='application/json',
+                                headers={'X-Telegram-Bot-Api-Secret-Token': secret})
+
+    def test_secret_token_is_required(self):
+        self.assertEqual(self.deliver({'update_id': 1}, secret='wrong').status_code, 403)
+        with override_settings(TELEGRAM_BOT={'WEBHOOK_SECRET': ''}):
+            self.assertEqual(self.deliver({'update_id': 1}, secret='').status_code, 403)
+
+    def test_update_is_queued_and_handled_by_bot_module(self):
+        bot_module = import_module('bot')
+        with self.server.serve_bots(), mock.patch.object(bot_module.bot, 'token', '1:TOKEN'):
+            response = self.deliver(make_update(1, 42, '/start'))
+            self.assertEqual(response.json(), {'success': True})
+            bot_module.runtime.join()
+
+        [sent] = self.server.sent
+        self.assertEqual(sent['chat_id'], 42)
+        self.assertIn('Ann', sent['text'])
+        self.assertIn('web_app', sent['reply_markup']['inline_keyboard'][0][0])
+
+    def test_malformed_update_is_rejected(self):
+        self.assertEqual(self.deliver({'message': {'text': 'hi'}}).status_code, 400)
+
+    def test_full_queue_asks_telegram_to_retry(self):
+        runtime = BotRuntime(LimitedTeleBot('1:TOKEN'), workers=1, queue_size=1)
+        with mock.patch('game.telegram.webhook_runtime', return_value=runtime):
+            self.assertEqual(self.deliver({'update_id': 1}).status_code, 200)
+            self.assertEqual(self.deliver({'update_id': 2}).status_code, 503)
+
+
+class ResultReportTests(TestCase):
+    def setUp(self):
+        history.events.clear()
+        self.room = make_room()
+        GameRoom.objects.filter(pk=self.room.pk).update(score_a=25, score_b=12)
+
+    def report(self, user_id, room_id=None):
+        return report_result(user_id, json.dumps({'type': 'result', 'room_id': room_id or self.room.room_id}))
+
+    def games(self):
+        return dict(PlayerStats.objects.values_list('user_id', 'games'))
+
+    @override_settings(GAME_HISTORY={'BATCH_SIZE': 1000, 'FLUSH_INTERVAL': 60})
+    def test_burst_is_written_in_one_batch(self):
+        for user_id in (100, 101, 102, 103, 100, 999):
+            self.report(user_id)
+        self.assertFalse(GameResult.objects.exists())
+
+        # Комната с игроками, затем обычная пачка журнала с итогом игры
+        with self.assertNumQueries(10):
+            self.assertEqual(history.events.flush(), 4)
+        # Счёт и победитель берутся из комнаты
+        result = GameResult.objects.get()
+        self.assertEqual((result.room_code, result.winner, result.score_a, result.score_b),
+                         (self.room.room_id, 'A', 25, 12))
+        self.assertEqual(dict(PlayerStats.objects.values_list('user_id', 'wins')), {100: 1, 101: 1, 102: 0, 103: 0})
+
+        # Повторные отчёты не создают второй записи в истории и не засчитывают игру ещё раз
+        self.report(103)
+        history.events.flush()
+        self.assertEqual(GameResult.objects.count(), 1)
+        self.assertEqual(self.games(), {100: 1, 101: 1, 102: 1, 103: 1})
+
+    @override_settings(GAME_HISTORY={'BATCH_SIZE': 1000, 'FLUSH_INTERVAL': 60})
+    def test_report_and_server_finish_count_once(self):
+        self.report(100)
+        history.log(history.game_records(engine.load(self.room.room_id)))
+        history.events.flush()
+        self.report(101)
+        history.events.flush()
+
+        self.assertEqual(GameResult.objects.count(), 1)
+        self.assertEqual(self.games(), {100: 1, 101: 1, 102: 1, 103: 1})
+
+    @override_settings(GAME_HISTORY={'BATCH_SIZE': 2, 'FLUSH_INTERVAL': 60})
+    def test_full_batch_is_flushed_immediately(self):
+        self.report(100)
+        self.assertFalse(GameResult.objects.exists())
+        self.report(101)
+        self.assertTrue(GameResult.objects.exists())
+
+    def test_unfinished_games_strangers_and_garbage_are_ignored(self):
+        unfinished = make_room(creator_id=2)
+        with self.assertLogs('game.results', 'WARNING'):
+            self.assertFalse(report_result(100, 'not json'))
+            self.assertFalse(report_result(100, json.dumps({'type': 'score', 'room_id': 'X'})))
+        self.report(100, room_id=unfinished.room_id)
+        self.report(999)
+        history.events.flush()
+
+        self.assertFalse(GameResult.objects.exists())
+        self.assertFalse(PlayerStats.objects.exists())
+
+    def test_history_outlives_room(self):
+        self.report(100)
+        history.events.flush()
+        room_id = self.room.room_id
+        self.room.delete()
+        self.assertEqual(GameResult.objects.get().room_code, room_id)
+
+
+class GameHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        history.events.clear()
+        self.room = make_room()
+        GameRoom.objects.filter(pk=self.room.pk).update(is_game_started=True, target_score=2)
+
+    def act(self, actions, user_id=100):
+        return post_json(self.client, '/api/actions/', {
+            'room_id': self.room.room_id, 'user_id': user_id, 'actions': actions,
+        })
+
+    def play_game(self):
+        self.act(['next_word'])
+        self.act(['guessed', 'next_word'])
+        self.act(['skip', 'next_word'])
+        self.assertEqual(self.act(['guessed'])['winner'], 'A')
+        post_json(self.client, '/api/next-turn/', {'room_id': self.room.room_id, 'user_id': 100})
+
+    def stats(self):
+        return {row.user_id: row for row in PlayerStats.objects.all()}
+
+    def test_game_is_logged_and_aggregated_in_one_batch(self):
+        self.play_game()
+        # До сброса пачки в базу ничего не пишется
+        self.assertFalse(GameEvent.objects.exists())
+
+        # Семь запросов и точка сохранения вокруг них
+        with self.assertNumQueries(9):
+            self.assertEqual(history.events.flush(), 8)
+
+        self.assertEqual(sorted(GameEvent.objects.values_list('kind', flat=True)),
+                         ['guessed', 'guessed', 'lost', 'lost', 'skip', 'turn', 'won', 'won'])
+        stats = self.stats()
+        explainer = stats[100]
+        self.assertEqual((explainer.words_explained, explainer.words_skipped, explainer.turns,
+                          explainer.games, explainer.wins), (2, 1, 1, 1, 1))
+        self.assertAlmostEqual(explainer.guess_rate, 2 / 3)
+        self.assertEqual((stats[101].words_guessed, stats[101].wins), (2, 1))
+        self.assertEqual((stats[102].games, stats[102].wins), (1, 0))
+
+        self.assertEqual(Player.objects.get(room=self.room, user_id=100).score, 2)
+        result = GameResult.objects.get()
+        self.assertEqual((result.winner, result.score_a, result.score_b), ('A', 2, 0))
+
+    def test_failed_score_update_does_not_replay_the_batch(self):
+        self.play_game()
+        with mock.patch.object(history, 'add_player_scores', side_effect=RuntimeError('shard down')), \
+                self.assertLogs('game.history', 'ERROR'):
+            self.assertEqual(history.events.flush(), 8)
+        # Журнал уже закоммичен: пачка не вернулась в буфер и не запишется второй раз
+        self.assertEqual(history.events.flush(), 0)
+        self.assertEqual(GameEvent.objects.count(), 8)
+        self.assertEqual(self.stats()[100].words_explained, 2)
+
+    def test_repeated_finish_is_counted_once(self):
+        self.play_game()
+        history.events.flush()
+        # Тот же итог ещё раз - отдельной пачкой и дважды в одной
+        records = history.game_records(engine.get(self.room.room_id))
+        history.log(records)
+        history.events.flush()
+        history.log(records + records)
+        history.events.flush()
+
+        stats = self.stats()
+        self.assertEqual((stats[100].games, stats[100].wins, stats[100].words_explained), (1, 1, 2))
+        self.assertEqual(GameEvent.objects.filter(kind__in=('won', 'lost')).count(), 4)
+        self.assertEqual(GameResult.objects.count(), 1)
+
+    def player_scores(self):
+        players = self.client.get(f'/api/room/{self.room.room_id}/').json()['players']
+        return {player['user_id']: player['score'] for player in players}
+
+    def test_flushed_scores_reach_room_info(self):
+        self.addCleanup(engine.clear)
+        for write_behind in (False, True):
+            with self.subTest(write_behind=write_behind), \
+                    override_settings(ROOM_ENGINE={'WRITE_BEHIND': write_behind, 'FLUSH_INTERVAL': 3600}):
+                engine.clear()
+                before = self.player_scores()[100]
+                self.act(['next_word'])
+                self.act(['guessed'])
+                # Ответ закэширован до записи журнала
+                self.assertEqual(self.player_scores()[100], before)
+                history.events.flush()
+                self.assertEqual(self.player_scores()[100], before + 1)
+
+    async def test_concurrent_winning_guesses_finish_once(self):
+        await GameRoom.objects.filter(pk=self.room.pk).aupdate(score_a=1)
+        first = await engine.aload(self.room.room_id)
+        second = await engine.aload(self.room.room_id)
+        for state in (first, second):
+            state.add_point()
+
+        # Обе копии видят победу, но через цель счёт переводит только одна запись
+        self.assertEqual(await engine._awrite(first, *first.take_changes()), True)
+        self.assertEqual(await engine._awrite(second, *second.take_changes()), False)
+        self.assertEqual(second.score_a, 3)
+        _, _, finished = await engine.amutate(self.room.room_id, add_point_for(100))
+        self.assertFalse(finished)
+
+    @override_settings(GAME_HISTORY={'MIN_WORDS': 3})
+    def test_leaderboards_read_only_aggregates(self):
+        self.play_game()
+        history.events.flush()
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/leaderboard/').json()
+        self.assertEqual([row['user_id'] for row in response['players']], [100, 101, 102, 103])
+
+        response = self.client.get('/api/leaderboard/?by=guess_rate').json()
+        self.assertEqual([(row['user_id'], row['guess_rate']) for row in response['players']], [(100, 0.6667)])
+        self.assertFalse(self.client.get('/api/leaderboard/?by=luck').json()['success'])
+
+        stats = self.client.get('/api/player-stats/101/').json()['stats']
+        self.assertEqual((stats['words_guessed'], stats['wins']), (2, 1))
+        self.assertFalse(self.client.get('/api/player-stats/999/').json()['success'])
+
+
+class RoomIdTests(SimpleTestCase):
+    def test_permutation_is_a_bijection(self):
+        permutation = KeyedPermutation(36 * 36, 7)
+        encoded = [permutation(number) for number in range(36 * 36)]
+        self.assertEqual(sorted(encoded), list(range(36 * 36)))
+
+    def test_millions_of_ids_never_collide(self):
+        permutation = KeyedPermutation(SPACE, 42)
+        count = 2_000_000
+        codes = {to_code(permutation(number)) for number in range(count)}
+        self.assertEqual(len(codes), count)
+        self.assertTrue(all(len(code) == 6 and set(code) <= set(ALPHABET) for code in codes))
+        self.assertLess(permutation(SPACE - 1), SPACE)
+
+
+@override_settings(ROOM_IDS={'BLOCK_SIZE': 10})
+class RoomIdAllocatorTests(TestCase):
+    def setUp(self):
+        # Коды, оставшиеся от других тестов, выданы из уже откаченной последовательности
+        allocator.reset()
+
+    def test_blocks_skip_codes_already_taken(self):
+        IdSequence.objects.create(name='room_id', key=5)
+        permutation = KeyedPermutation(SPACE, 5)
+        # Комната со старым случайным кодом, который выпал бы четвёртым
+        legacy = to_code(permutation(3))
+        GameRoom.objects.create(room_id=legacy, creator_id=1, creator_name='old')
+
+        allocator = RoomIdAllocator()
+        codes = [allocator.allocate() for _ in range(25)]
+
+        self.assertEqual(len(set(codes)), 25)
+        self.assertNotIn(legacy, codes)
+        self.assertEqual(codes[:4], [to_code(permutation(number)) for number in (0, 1, 2, 4)])
+        self.assertEqual(IdSequence.objects.get().next_value, 30)
+
+    def test_creating_rooms_needs_no_retries(self):
+        rooms = [GameRoom.objects.create(creator_id=1, creator_name='creator') for _ in range(50)]
+        self.assertEqual(len({room.room_id for room in rooms}), 50)
+        # Пять блоков по десять кодов - пять обращений к последовательности
+        self.assertEqual(IdSequence.objects.get().next_value, 50)
+
+
+class EncodingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.room = make_room(team_size=15)
+
+    def test_messagepack_round_trip(self):
+        self.assertEqual(packb({'a': 1}), b'\x81\xa1a\x01')
+        self.assertEqual(packb([-1, -33, 255, 70000, None, True]), b'\x96\xff\xd0\xdf\xcc\xff\xce\x00\x01\x11\x70\xc0\xc3')
+        value = {
+            'ints': [0, 127, 128, -32, -129, 2 ** 40, -2 ** 40],
+            'float': 0.25,
+            'text': ['', 'слово', 'x' * 300, 'y' * 60000],
+            'bytes': b'\x00\x01',
+            'nested': {str(key): list(range(key)) for key in range(20)},
+        }
+        self.assertEqual(unpackb(packb(value)), value)
+        with self.assertRaises(ValueError):
+            unpackb(packb(value)[:-1])
+
+    def test_hostile_messagepack_is_rejected(self):
+        for body in (b'\x91' * 100000 + b'\xc0', b'\xdd\xff\xff\xff\xff', packb('y' * 70000), b'\xc1'):
+            with self.subTest(body=body[:8]), self.assertRaises(ValueError):
+                unpackb(body)
+
+        # Глубокая вложенность в теле запроса - ошибка в ответе, а не 500
+        response = self.client.post('/api/actions/', b'\x91' * 100000 + b'\xc0',
+                                    content_type='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['success'])
+
+    def test_roster_is_negotiated_by_accept(self):
+        url = f'/api/room/{self.room.room_id}/'
+        plain = self.client.get(url)
+        self.assertIn('team_a', plain.json())
+        self.assertIn('Accept', plain['Vary'])
+
+        binary = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(binary['Content-Type'], 'application/msgpack')
+        data = unpackb(binary.content)
+        self.assertEqual(len(data['players']), 30)
+        self.assertNotIn('team_a', data)
+        self.assertEqual(data['team_a_count'], 15)
+        self.assertLess(len(binary.content), len(plain.content) / 2)
+
+        # Каждый вариант кэшируется и сверяется по ETag отдельно
+        self.assertNotEqual(binary['ETag'], plain['ETag'])
+        with self.assertNumQueries(0):
+            again = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(again.content, binary.content)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=binary['ETag'],
+                                         HTTP_ACCEPT='application/msgpack').status_code, 304)
+
+        compact = self.client.get(url, HTTP_ACCEPT='application/json; compact=1').json()
+        self.assertNotIn('team_b', compact)
+        self.assertEqual(compact['players'], plain.json()['players'])
+
+    def test_large_payloads_are_compressed(self):
+        url = f'/api/room/{self.room.room_id}/'
+        for _ in range(2):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(json.loads(gzip.decompress(response.content))['team_b_count'], 15)
+
+        # Короткие ответы сжимать незачем
+        state = self.client.get(f'/api/game-state/{self.room.room_id}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(state.has_header('Content-Encoding'))
+
+    def test_messagepack_request_body(self):
+        GameRoom.objects.filter(pk=self.room.pk).update(is_game_started=True)
+        response = self.client.post('/api/actions/', packb({
+            'room_id': self.room.room_id, 'user_id': 100, 'actions': ['next_word'],
+        }), content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        data = unpackb(response.content)
+        self.assertTrue(data['success'])
+        self.assertTrue(data['word'])
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.room = make_room()
+
+    def test_room_page_is_cached_by_room_version(self):
+        url = f'/room/{self.room.room_id}/'
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        post_json(self.client, '/api/join-team/', {
+            'room_id': self.room.room_id, 'user_id': 555, 'username': 'newcomer', 'team': 'B',
+        })
+        # Новая версия комнаты - страница собирается заново
+        with self.assertNumQueries(2):
+            third = self.client.get(url)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+
+    def test_shells_load_hashed_bundles(self):
+        index = self.client.get('/')
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=index['ETag']).status_code, 304)
+
+        page = self.client.get(f'/game/{self.room.room_id}/')
+        with self.assertNumQueries(0):
+            self.client.get(f'/game/{self.room.room_id}/')
+        self.assertContains(page, f'data-room="{self.room.room_id}"')
+        self.assertNotContains(page, 'const roomId')
+
+        [bundle] = [url for url in re.findall(r'src="([^"]+)"', page.content.decode()) if url.startswith('/static/')]
+        self.assertRegex(bundle, r'^/static/js/game\.[0-9a-f]{12}\.js$')
+        response = self.client.get(bundle)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name) / 'pool.sqlite3'
+        self.clock = FakeClock()
+        self.opened = []
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.opened.append(conn)
+        return conn
+
+    def make_pool(self, **kwargs):
+        pool = ConnectionPool(**{'size': 2, 'timeout': 0.05, 'recycle': 100, 'check_interval': 10,
+                                 'clock': self.clock, **kwargs})
+        self.addCleanup(pool.close_all)
+        return pool
+
+    def test_released_connection_is_reused(self):
+        pool = self.make_pool()
+        first = pool.acquire(self.connect)
+        pool.release(first)
+        self.assertIs(pool.acquire(self.connect), first)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_waits_for_free_connection_then_times_out(self):
+        # Ожидание идёт по настоящим часам
+        pool = self.make_pool(size=1, timeout=5, clock=time.monotonic)
+        conn = pool.acquire(self.connect)
+        threading.Timer(0.05, pool.release, args=(conn,)).start()
+        self.assertIs(pool.acquire(self.connect), conn)
+
+        pool.timeout = 0.05
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect)
+        self.assertEqual(pool.stats(), {'size': 1, 'open': 1, 'idle': 0})
+
+    def test_dead_connection_replaced_after_health_check(self):
+        pool = self.make_pool()
+        first = pool.acquire(self.connect)
+        pool.release(first)
+        first.close()
+
+        # Недавно вернувшееся соединение не проверяется
+        self.clock.now = 5
+        self.assertIs(pool.acquire(self.connect), first)
+        pool.release(first)
+
+        self.clock.now = 20
+        second = pool.acquire(self.connect)
+        self.assertIsNot(second, first)
+        second.execute('SELECT 1')
+        self.assertEqual(pool.stats()['open'], 1)
+
+    def test_expired_and_broken_connections_are_closed(self):
+        pool = self.make_pool()
+        first = pool.acquire(self.connect)
+        self.clock.now = 150
+        pool.release(first)
+        self.assertEqual(pool.stats(), {'size': 2, 'open': 0, 'idle': 0})
+
+        second = pool.acquire(self.connect)
+        pool.release(second, broken=True)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            second.execute('SELECT 1')
+        self.assertIsNot(pool.acquire(self.connect), second)
+
+    def test_failed_connect_frees_slot(self):
+        pool = self.make_pool(size=1)
+
+        def fail():
+            raise sqlite3.OperationalError('нет базы')
+
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.acquire(fail)
+        self.assertIsNotNone(pool.acquire(self.connect))
+
+
+class PooledSQLiteWrapper(PooledDatabaseMixin, sqlite_base.DatabaseWrapper):
+    pass
+
+
+class DatabaseTuningTests(TestCase):
+    def test_sqlite_profile_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            # 1 - NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_pooled_wrapper_reuses_connection(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = {**connection.settings_dict, 'NAME': str(Path(directory.name) / 'pooled.sqlite3')}
+        wrapper = PooledSQLiteWrapper(settings_dict, alias='pool-test')
+        self.addCleanup(close_pools)
+
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (value INTEGER)')
+        raw = wrapper.connection
+        wrapper.close()
+
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO counter VALUES (1)')
+        self.assertIs(wrapper.connection, raw)
+        # Незавершённая транзакция откатывается при возврате в пул
+        wrapper.close()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM counter')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertIs(wrapper.connection, raw)
+        wrapper.close()
+
+    def test_bench_writes_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            report = Path(directory) / 'writes.json'
+            call_command('bench_writes', writes=20, writers=2, readers=1, rooms=5, json=str(report),
+                         stdout=StringIO())
+            results = json.loads(report.read_text())
+        for mode in ('default', 'tuned', 'tuned+pool'):
+            self.assertEqual(results[mode]['writes'] + results[mode]['locked'], 40)
+
+
+ROOM_SHARDS = {
+    'SHARDS': {
+        'a': {'DATABASE': 'default', 'URL': ''},
+        'b': {'DATABASE': 'shard_b', 'URL': 'https://b.example.com'},
+    },
+    'LOCAL': None,
+    'VNODES': 64,
+}
+
+
+class HashRingTests(SimpleTestCase):
+    def test_adding_shard_moves_only_its_share(self):
+        codes = [to_code(number * 7919) for number in range(3000)]
+        two = HashRing(['a', 'b'])
+        three = HashRing(['a', 'b', 'c'])
+
+        share = sum(two.shard(code) == 'a' for code in codes) / len(codes)
+        self.assertTrue(0.35 < share < 0.65, share)
+        moved = [code for code in codes if two.shard(code) != three.shard(code)]
+        # Переезжают только комнаты нового шарда, около трети
+        self.assertTrue(all(three.shard(code) == 'c' for code in moved))
+        self.assertTrue(0.2 < len(moved) / len(codes) < 0.45)
+
+
+@override_settings(ROOM_SHARDS=ROOM_SHARDS)
+class ShardingTests(TransactionTestCase):
+    """Две базы SQLite: default (шард a) и временная shard_b (шард b)."""
+
+    @classmethod
+    def setUpClass(cls):
+        # База шарда подключается здесь, а не в settings: раннер тестов про неё не знает
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['shard_b'] = {
+            **connections.settings['default'], 'NAME': str(Path(cls.directory.name) / 'shard_b.sqlite3'),
+        }
+        with override_settings(ROOM_SHARDS=ROOM_SHARDS):
+            call_command('migrate', database='shard_b', verbosity=0)
+        cls.databases = {'default', 'shard_b'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['shard_b'].close()
+        del connections['shard_b']
+        del connections.settings['shard_b']
+        cls.directory.cleanup()
+
+    def setUp(self):
+        allocator.reset()
+        cache.clear()
+
+    def create_rooms(self):
+        """По комнате с командами два на два в каждом шарде."""
+        rooms = {}
+        while len(rooms) < 2:
+            room_id = post_json(self.client, '/api/create-room/', {'user_id': 1, 'username': 'creator'})['room_id']
+            rooms.setdefault(shard_for(room_id), room_id)
+        for room_id in rooms.values():
+            for user_id, team in ((10, 'A'), (11, 'A'), (12, 'B'), (13, 'B')):
+                post_json(self.client, '/api/join-team/', {
+                    'room_id': room_id, 'user_id': user_id, 'username': f'user{user_id}', 'team': team,
+                })
+        return rooms
+
+    def test_rooms_and_players_live_in_their_shard(self):
+        rooms = self.create_rooms()
+        self.assertTrue(GameRoom.objects.using('shard_b').filter(room_id=rooms['b']).exists())
+        self.assertFalse(GameRoom.objects.using('default').filter(room_id=rooms['b']).exists())
+        self.assertEqual(Player.objects.using('shard_b').filter(room__room_id=rooms['b']).count(), 4)
+        self.assertEqual(Player.objects.using('default').filter(room__room_id=rooms['a']).count(), 4)
+        # Таблицы журнала в базе шарда не создаются
+        self.assertNotIn(GameEvent._meta.db_table, connections['shard_b'].introspection.table_names())
+
+        info = self.client.get(f"/api/room/{rooms['b']}/").json()
+        self.assertEqual(sorted(player['user_id'] for player in info['players']), [10, 11, 12, 13])
+        self.assertTrue(post_json(self.client, '/api/start-game/', {'room_id': rooms['b'], 'user_id': 1})['success'])
+        self.assertTrue(GameRoom.objects.using('shard_b').get(room_id=rooms['b']).is_game_started)
+
+        GameRoom.objects.using('shard_b').filter(room_id=rooms['b']).update(is_active=False)
+        self.assertEqual(reap_rooms(), {'rooms': 1, 'players': 4})
+        self.assertFalse(GameRoom.objects.using('shard_b').filter(room_id=rooms['b']).exists())
+
+    def test_clients_sent_to_node_of_room(self):
+        rooms = self.create_rooms()
+        with override_settings(ROOM_SHARDS={**ROOM_SHARDS, 'LOCAL': ['a']}):
+            joined = post_json(self.client, '/api/join-room/', {'room_id': rooms['b']})
+            self.assertEqual(joined['node'], 'https://b.example.com')
+            self.assertEqual(post_json(self.client, '/api/join-room/', {'room_id': rooms['a']})['node'], '')
+
+            page = self.client.get(f"/room/{rooms['b']}/")
+            self.assertRedirects(page, f"https://b.example.com/room/{rooms['b']}/", fetch_redirect_response=False)
+            response = self.client.post('/api/next-turn/', json.dumps({'room_id': rooms['b']}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 421)
+            self.assertEqual(response.json()['node'], 'https://b.example.com')
+            self.assertEqual(self.client.get(f"/room/{rooms['a']}/").status_code, 200)
+
+    def test_rebalance_moves_rooms_to_their_shard(self):
+        with override_settings(ROOM_SHARDS={}):
+            rooms = [make_room(creator_id=index) for index in range(12)]
+        created = {room.room_id: room.created_at for room in rooms}
+        misplaced = [room.room_id for room in rooms if database_for(room.room_id) == 'shard_b']
+        self.assertTrue(misplaced)
+
+        self.assertEqual(rebalance_rooms(dry_run=True), {('default', 'shard_b'): len(misplaced)})
+        self.assertEqual(GameRoom.objects.using('shard_b').count(), 0)
+        self.assertEqual(rebalance_rooms(), {('default', 'shard_b'): len(misplaced)})
+        self.assertEqual(rebalance_rooms(), {})
+
+        moved = GameRoom.objects.using('shard_b').with_roster()
+        self.assertEqual(sorted(room.room_id for room in moved), sorted(misplaced))
+        for room in moved:
+            self.assertEqual(room.created_at, created[room.room_id])
+            self.assertEqual(len(room.players.all()), 4)
+        self.assertEqual(GameRoom.objects.using('default').count(), len(rooms) - len(misplaced))
+        self.assertEqual(Player.objects.using('default').count(), 4 * (len(rooms) - len(misplaced)))
@@ -0,0 +1,79 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import history
+from .engine import engine
+from .models import GameRoom
+from .realtime import publish_turn
+from .scheduling import PeriodicJob
+from .sharding import databases
+
+logger = logging.getLogger(__name__)
+
+
+def turn_timer_config():
+    return {
+        'INTERVAL': 1,
+        'BATCH_SIZE': 200,
+        **getattr(settings, 'TURN_TIMER', {}),
+    }
+
+
+def expire_turns(now=None, batch_size=None):
+    """Завершить ходы с истёкшим сроком во всех комнатах. Возвращает их состояния.
+
+    Ход передаётся дальше так же, как по api_next_turn, но одним сервером:
+    клиенты больше не шлют next-turn по своим таймерам. Комнаты каждой базы
+    шарда берутся пачкой под блокировкой строк и записываются в одной транзакции.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or turn_timer_config()['BATCH_SIZE']
+    if engine.write_behind:
+        # Срок хода мог ещё не дойти до базы
+        engine.flush()
+
+    expired, records = [], []
+    for using in databases():
+        with transaction.atomic(using=using):
+            rooms = GameRoom.objects.using(using).with_roster().filter(
+                is_active=True, turn_deadline__lte=now,
+            ).order_by('turn_deadline')[:batch_size]
+            if not engine.write_behind:
+                rooms = rooms.select_for_update()
+
+            batch = []
+            for room in rooms:
+                state = engine.adopt(room)
+                with state.lock:
+                    # Ход могли уже сменить вручную - тогда срок сброшен
+                    if not state.turn_expired(now):
+                        continue
+                    records += history.turn_records(state)
+                    if len(state.team(state.current_team)) < 2:
+                        state.end_turn()
+                    else:
+                        state.rotate_turn()
+                    batch.append(state)
+
+            engine.flush_states(batch)
+        expired += batch
+
+    if history.log(records):
+        history.flush()
+
+    # Оповещаем после фиксации транзакции, чтобы клиенты прочитали уже новый ход
+    for state in expired:
+        publish_turn(state)
+    return expired
+
+
+def expire_and_log():
+    expired = expire_turns()
+    if expired:
+        logger.info("Завершено ходов по таймеру: %s", len(expired))
+
+
+scheduler = PeriodicJob('turn-timer', expire_and_log, lambda: turn_timer_config()['INTERVAL'])
@@ -16,6 +16,14 @@ urlpatterns = [
     path('api/game-state/<str:room_id>/', views.api_get_game_state, name='game_state'),
     path('api/get-word/', views.api_get_word, name='get_word'),
     path('api/word-guessed/', views.api_word_guessed, name='word_guessed'),
+    path('api/word-queue/', views.api_word_queue, name='word_queue'),
+    path('api/actions/', views.api_actions, name='actions'),
     path('api/next-turn/', views.api_next_turn, name='next_turn'),
     path('api/switch-team/', views.api_switch_team, name='switch_team'),
+    
+    path('api/leaderboard/', views.api_leaderboard, name='leaderboard'),
+    path('api/player-stats/<int:user_id>/', views.api_player_stats, name='player_stats'),
+    
+    path('metrics/', views.metrics_endpoint, name='metrics'),
+    path('telegram/webhook/', views.telegram_webhook, name='telegram_webhook'),
 ]
\ No newline at end of file
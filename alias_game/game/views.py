@@ -1,25 +1,48 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-import json
-from .models import GameRoom, Player
-from .words import get_random_word
+from asgiref.sync import sync_to_async
+import hmac
+from .models import GameRoom, Player, PlayerStats
+from .engine import RoomConflict, engine
+from .words import bank
+from . import history, metrics, realtime, telegram
+from .encoding import api_response, read_request
+from .realtime import deadline_ms, player_info, publish_turn
+from .caching import ainvalidate_room, cached_page, cached_room_page, cached_room_response, invalidate_room
+from .sharding import database_for, node_url, room_shard
 
+def room_changed(room_id, event_type, **payload):
+    invalidate_room(room_id)
+    realtime.publish(room_id, event_type, **payload)
+
+async def aroom_changed(room_id, event_type, **payload):
+    await ainvalidate_room(room_id)
+    await sync_to_async(realtime.publish)(room_id, event_type, **payload)
+
+@cached_page('index')
 def index(request):
     return render(request, 'game/index.html')
 
+@room_shard
+@cached_room_page('room')
 def game_room(request, room_id):
-    room = get_object_or_404(GameRoom, room_id=room_id)
-    players = room.players.all()
+    try:
+        state = engine.get(room_id)
+    except GameRoom.DoesNotExist:
+        raise Http404('Комната не найдена')
     
     context = {
-        'room': room,
-        'players': players,
-        'team_a_players': players.filter(team='A'),
-        'team_b_players': players.filter(team='B'),
+        'room': state,
+        'players': state.roster,
+        'team_a_players': state.team('A'),
+        'team_b_players': state.team('B'),
     }
     return render(request, 'game/room.html', context)
 
+@room_shard
+@cached_room_page('game')
 def game_play(request, room_id):
     room = get_object_or_404(GameRoom, room_id=room_id)
     return render(request, 'game/game.html', {'room': room})
@@ -28,31 +51,42 @@ def game_play(request, room_id):
 def api_create_room(request):
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            room = GameRoom.objects.create(
+            data = read_request(request)
+            word_pack = data.get('word_pack', 'default')
+            difficulty = data.get('difficulty', 'medium')
+            if not bank.has(word_pack, difficulty):
+                return api_response(request, {'success': False, 'error': 'Набор слов не найден или в нём нет слов этой сложности'})
+            
+            # Не objects.create: по новому объекту роутер найдёт шард комнаты по её коду
+            room = GameRoom(
                 creator_id=data['user_id'],
                 creator_name=data['username'],
-                difficulty=data.get('difficulty', 'medium')
+                difficulty=difficulty,
+                word_pack=word_pack
             )
-            return JsonResponse({'success': True, 'room_id': room.room_id})
+            room.save()
+            return api_response(request, {'success': True, 'room_id': room.room_id, 'node': node_url(room.room_id)})
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+            return api_response(request, {'success': False, 'error': str(e)})
 
 @csrf_exempt
 def api_join_room(request):
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            room = get_object_or_404(GameRoom, room_id=data['room_id'], is_active=True)
-            return JsonResponse({'success': True, 'room_id': room.room_id})
+            data = read_request(request)
+            rooms = GameRoom.objects.using(database_for(data['room_id']))
+            room = get_object_or_404(rooms, room_id=data['room_id'], is_active=True)
+            # Дальше клиент работает с узлом, который обслуживает комнату
+            return api_response(request, {'success': True, 'room_id': room.room_id, 'node': node_url(room.room_id)})
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+            return api_response(request, {'success': False, 'error': str(e)})
 
 @csrf_exempt
+@room_shard
 def api_join_team(request):
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
+            data = read_request(request)
             room = get_object_or_404(GameRoom, room_id=data['room_id'], is_active=True)
             
             Player.objects.filter(room=room, user_id=data['user_id']).delete()
@@ -63,216 +97,422 @@ def api_join_team(request):
                 username=data['username'],
                 team=data['team']
             )
+            GameRoom.objects.filter(pk=room.pk).touch()
+            engine.forget(room.room_id)
+            
+            room_changed(room.room_id, 'roster', user_id=data['user_id'],
+                         username=data['username'], team=data['team'])
             
-            return JsonResponse({'success': True, 'team': data['team']})
+            return api_response(request, {'success': True, 'team': data['team']})
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+            return api_response(request, {'success': False, 'error': str(e)})
 
 @csrf_exempt
-def api_get_room_info(request, room_id):
+@room_shard
+@cached_room_response('room')
+async def api_get_room_info(request, room_id):
     try:
-        room = GameRoom.objects.get(room_id=room_id)
-        players = list(room.players.values('user_id', 'username', 'team', 'score'))
+        state = await engine.aget(room_id)
+        players = [
+            {'user_id': p.user_id, 'username': p.username, 'team': p.team, 'score': p.score}
+            for p in state.roster
+        ]
         
-        return JsonResponse({
+        return api_response(request, {
             'success': True,
-            'room_id': room.room_id,
-            'creator_name': room.creator_name,
-            'difficulty': room.difficulty,
-            'is_game_started': room.is_game_started,
+            'room_id': state.room_id,
+            'creator_name': state.creator_name,
+            'difficulty': state.difficulty,
+            'is_game_started': state.is_game_started,
             'players': players,
             'team_a': [p for p in players if p['team'] == 'A'],
             'team_b': [p for p in players if p['team'] == 'B'],
             'team_a_count': len([p for p in players if p['team'] == 'A']),
             'team_b_count': len([p for p in players if p['team'] == 'B']),
-            'score_a': room.score_a,
-            'score_b': room.score_b,
+            'score_a': state.score_a,
+            'score_b': state.score_b,
         })
     except GameRoom.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'Комната не найдена'})
+        return api_response(request, {'success': False, 'error': 'Комната не найдена'})
 
 @csrf_exempt
+@room_shard
 def api_start_game(request):
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            room = get_object_or_404(GameRoom, room_id=data['room_id'])
+            data = read_request(request)
+            with engine.mutate(data['room_id'], flush=True) as state:
+                if state.creator_id != data['user_id']:
+                    return api_response(request, {'success': False, 'error': 'Только создатель может начать игру'})
+                
+                if len(state.team('A')) < 2 or len(state.team('B')) < 2:
+                    return api_response(request, {
+                        'success': False,
+                        'error': 'Нужно минимум по 2 игрока в каждой команде'
+                    })
+                
+                state.start()
             
-            if room.creator_id != data['user_id']:
-                return JsonResponse({'success': False, 'error': 'Только создатель может начать игру'})
+            room_changed(state.room_id, 'started')
             
-            team_a_count = room.players.filter(team='A').count()
-            team_b_count = room.players.filter(team='B').count()
-            
-            if team_a_count < 2 or team_b_count < 2:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Нужно минимум по 2 игрока в каждой команде'
-                })
-            
-            room.is_game_started = True
-            room.save()
-            
-            return JsonResponse({'success': True, 'message': 'Игра началась!'})
+            return api_response(request, {'success': True, 'message': 'Игра началась!'})
+        except GameRoom.DoesNotExist:
+            return api_response(request, {'success': False, 'error': 'Комната не найдена'})
+        except RoomConflict as e:
+            return api_response(request, {'success': False, 'error': str(e)}, status=409)
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+            return api_response(request, {'success': False, 'error': str(e)})
 
 @csrf_exempt
-def api_get_game_state(request, room_id):
+@room_shard
+@cached_room_response('state')
+async def api_get_game_state(request, room_id):
     try:
-        room = GameRoom.objects.get(room_id=room_id)
-        
-        if not room.is_game_started:
-            return JsonResponse({'success': True, 'is_game_started': False})
+        state = await engine.aget(room_id)
         
-        explainer, guesser = room.get_current_players()
-        winner = None
+        if not state.is_game_started:
+            return api_response(request, {'success': True, 'is_game_started': False})
         
-        if room.score_a >= room.target_score:
-            winner = 'A'
-        elif room.score_b >= room.target_score:
-            winner = 'B'
+        explainer, guesser = state.get_current_players()
         
-        return JsonResponse({
+        return api_response(request, {
             'success': True,
             'is_game_started': True,
-            'current_team': room.current_team,
-            'score_a': room.score_a,
-            'score_b': room.score_b,
-            'target_score': room.target_score,
-            'explainer': {
-                'id': explainer.user_id if explainer else None,
-                'username': explainer.username if explainer else None
-            },
-            'guesser': {
-                'id': guesser.user_id if guesser else None,
-                'username': guesser.username if guesser else None
-            },
-            'winner': winner,
-            'time_per_turn': room.time_per_turn,
+            'current_team': state.current_team,
+            'score_a': state.score_a,
+            'score_b': state.score_b,
+            'target_score': state.target_score,
+            'explainer': player_info(explainer),
+            'guesser': player_info(guesser),
+            'winner': state.winner(),
+            'time_per_turn': state.time_per_turn,
+            'turn_deadline': deadline_ms(state),
         })
     except GameRoom.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'Комната не найдена'})
+        return api_response(request, {'success': False, 'error': 'Комната не найдена'})
+
+def draw_word_for(user_id):
+    def change(state):
+        error = state.turn_error(user_id)
+        if error:
+            return None, False, error
+        started = state.start_turn()
+        return state.draw_word(), started, None
+    return change
+
+def add_point_for(user_id):
+    def change(state):
+        error = state.turn_error(user_id)
+        if not error:
+            state.add_point()
+        return error
+    return change
+
+async def alog_history(state, actions, finished):
+    # Журнал копится в памяти и пишется пачками; здесь - только если пачка набрана
+    records = history.word_records(state, actions)
+    if finished:
+        records += history.game_records(state)
+    if history.log(records):
+        await sync_to_async(history.flush)()
 
 @csrf_exempt
-def api_get_word(request):
+@room_shard
+async def api_get_word(request):
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            room = GameRoom.objects.get(room_id=data['room_id'])
-            
-            explainer, _ = room.get_current_players()
-            if not explainer or explainer.user_id != data['user_id']:
-                return JsonResponse({'success': False, 'error': 'Не ваш ход'})
+            data = read_request(request)
+            state, (word, started, error), _ = await engine.amutate(data['room_id'], draw_word_for(data['user_id']))
+            if error:
+                return api_response(request, {'success': False, 'error': error})
             
-            used_words = json.loads(room.words_used)
-            word = get_random_word(room.difficulty, used_words)
+            if started:
+                await aroom_changed(state.room_id, 'timer', turn_deadline=deadline_ms(state))
             
-            if not word:
-                used_words = []
-                word = get_random_word(room.difficulty, used_words)
-            
-            used_words.append(word)
-            room.words_used = json.dumps(used_words)
-            room.save()
-            
-            return JsonResponse({'success': True, 'word': word})
+            return api_response(request, {'success': True, 'word': word, 'turn_deadline': deadline_ms(state)})
+        except RoomConflict as e:
+            return api_response(request, {'success': False, 'error': str(e)}, status=409)
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+            return api_response(request, {'success': False, 'error': str(e)})
 
 @csrf_exempt
-def api_word_guessed(request):
+@room_shard
+async def api_word_guessed(request):
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            room = GameRoom.objects.get(room_id=data['room_id'])
+            data = read_request(request)
+            state, error, finished = await engine.amutate(data['room_id'], add_point_for(data['user_id']))
+            if error:
+                return api_response(request, {'success': False, 'error': error})
             
-            explainer, _ = room.get_current_players()
-            if not explainer or explainer.user_id != data['user_id']:
-                return JsonResponse({'success': False, 'error': 'Не ваш ход'})
-            
-            if room.current_team == 'A':
-                room.score_a += 1
-            else:
-                room.score_b += 1
-            room.save()
+            await alog_history(state, ['guessed'], finished)
+            score_a, score_b = state.score_a, state.score_b
+            await aroom_changed(state.room_id, 'score', score_a=score_a, score_b=score_b)
             
-            return JsonResponse({
+            return api_response(request, {
                 'success': True,
-                'score_a': room.score_a,
-                'score_b': room.score_b
+                'score_a': score_a,
+                'score_b': score_b
             })
+        except RoomConflict as e:
+            return api_response(request, {'success': False, 'error': str(e)}, status=409)
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+            return api_response(request, {'success': False, 'error': str(e)})
+
+# Действия, которые можно прислать одной пачкой в api/actions/
+BATCH_ACTIONS = ('guessed', 'skip', 'next_word')
+MAX_BATCH_ACTIONS = 10
+
+def word_queue_size():
+    return getattr(settings, 'WORD_QUEUE_SIZE', 5)
+
+def queue_payload(state):
+    return [{'position': position, 'word': word} for position, word in state.word_queue()]
+
+def reserve_queue_for(user_id):
+    def change(state):
+        error = state.turn_error(user_id)
+        if error:
+            return {'error': error}
+        started = state.start_turn()
+        state.reserve_words(word_queue_size())
+        return {'error': None, 'started': started}
+    return change
+
+def apply_actions(user_id, actions, position=None):
+    def change(state):
+        # Всё проверяется до первого изменения: пачка применяется целиком или никак
+        error = state.turn_error(user_id)
+        if error:
+            return {'error': error}
+        
+        confirms = sum(action in ('guessed', 'skip') for action in actions)
+        if position is not None and not state.can_confirm(position, confirms):
+            return {'error': 'Слово уже подтверждено или не из очереди'}
+        
+        outcome = {'error': None, 'word': None, 'scored': False, 'started': False}
+        for action in actions:
+            if action == 'guessed':
+                state.add_point()
+                outcome['scored'] = True
+            if action in ('guessed', 'skip') and position is not None:
+                state.confirm_word()
+            elif action == 'next_word':
+                outcome['started'] |= state.start_turn()
+                outcome['word'] = state.draw_word()
+        
+        if position is not None:
+            state.reserve_words(word_queue_size())
+        return outcome
+    return change
 
 @csrf_exempt
-def api_next_turn(request):
+@room_shard
+async def api_word_queue(request):
+    """Очередь ближайших слов для объясняющего, зарезервированная из колоды.
+
+    Слова показываются без ожидания сети, а сервер узнаёт о каждом из
+    api/actions/ с position: только подтверждённые слова считаются выданными.
+    """
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            room = GameRoom.objects.get(room_id=data['room_id'])
+            data = read_request(request)
+            state, outcome, _ = await engine.amutate(data['room_id'], reserve_queue_for(data['user_id']))
+            if outcome['error']:
+                return api_response(request, {'success': False, 'error': outcome['error']})
             
-            explainer, _ = room.get_current_players()
-            if room.creator_id != data['user_id'] and (not explainer or explainer.user_id != data['user_id']):
-                return JsonResponse({'success': False, 'error': 'Недостаточно прав'})
+            if outcome['started']:
+                await aroom_changed(state.room_id, 'timer', turn_deadline=deadline_ms(state))
             
-            team_players = list(room.players.filter(team=room.current_team).order_by('id'))
+            return api_response(request, {
+                'success': True,
+                'queue': queue_payload(state),
+                'turn_deadline': deadline_ms(state),
+            })
+        except RoomConflict as e:
+            return api_response(request, {'success': False, 'error': str(e)}, status=409)
+        except Exception as e:
+            return api_response(request, {'success': False, 'error': str(e)})
+
+@csrf_exempt
+@room_shard
+async def api_actions(request):
+    """Несколько действий объясняющего за один запрос, например guessed + next_word.
+
+    Комната загружается один раз, изменения пишутся одной записью, в ответе -
+    новый счёт, срок хода и следующее слово. С position действия guessed и skip
+    подтверждают слова очереди начиная с этой позиции, а в ответе приходит
+    дополненная очередь.
+    """
+    if request.method == 'POST':
+        try:
+            data = read_request(request)
+            actions = data['actions']
+            position = data.get('position')
+            if not isinstance(actions, list) or not 0 < len(actions) <= MAX_BATCH_ACTIONS:
+                return api_response(request, {'success': False, 'error': f'Нужно от 1 до {MAX_BATCH_ACTIONS} действий'})
+            unknown = [action for action in actions if action not in BATCH_ACTIONS]
+            if unknown:
+                return api_response(request, {'success': False, 'error': f'Неизвестное действие: {unknown[0]}'})
+            if position is not None and 'next_word' in actions:
+                return api_response(request, {'success': False, 'error': 'С очередью слов next_word не нужен'})
             
-            if len(team_players) < 2:
-                return JsonResponse({'success': False, 'error': 'Недостаточно игроков'})
+            state, outcome, finished = await engine.amutate(
+                data['room_id'], apply_actions(data['user_id'], actions, position))
+            if outcome['error']:
+                return api_response(request, {'success': False, 'error': outcome['error']})
             
-            room.current_explainer_index = room.current_guesser_index
-            room.current_guesser_index = (room.current_guesser_index + 1) % len(team_players)
+            await alog_history(state, actions, finished)
+            if outcome['scored']:
+                await aroom_changed(state.room_id, 'score', score_a=state.score_a, score_b=state.score_b)
+            if outcome['started']:
+                await aroom_changed(state.room_id, 'timer', turn_deadline=deadline_ms(state))
             
-            if room.current_explainer_index == room.current_guesser_index:
-                room.current_guesser_index = (room.current_guesser_index + 1) % len(team_players)
+            response = {
+                'success': True,
+                'word': outcome['word'],
+                'score_a': state.score_a,
+                'score_b': state.score_b,
+                'winner': state.winner(),
+                'turn_deadline': deadline_ms(state),
+            }
+            if position is not None:
+                response['queue'] = queue_payload(state)
+            return api_response(request, response)
+        except RoomConflict as e:
+            return api_response(request, {'success': False, 'error': str(e)}, status=409)
+        except Exception as e:
+            return api_response(request, {'success': False, 'error': str(e)})
+
+@csrf_exempt
+@room_shard
+def api_next_turn(request):
+    if request.method == 'POST':
+        try:
+            data = read_request(request)
+            # Конец хода - хороший момент сбросить накопленное в базу
+            with engine.mutate(data['room_id'], flush=True) as state:
+                if state.creator_id != data['user_id'] and not state.is_explainer(data['user_id']):
+                    return api_response(request, {'success': False, 'error': 'Недостаточно прав'})
+                
+                if len(state.team(state.current_team)) < 2:
+                    return api_response(request, {'success': False, 'error': 'Недостаточно игроков'})
+                
+                records = history.turn_records(state)
+                state.rotate_turn()
             
-            room.save()
+            if history.log(records):
+                history.flush()
+            publish_turn(state)
             
-            return JsonResponse({
+            return api_response(request, {
                 'success': True,
-                'current_team': room.current_team,
-                'explainer_index': room.current_explainer_index,
-                'guesser_index': room.current_guesser_index
+                'current_team': state.current_team,
+                'explainer_index': state.current_explainer_index,
+                'guesser_index': state.current_guesser_index
             })
+        except RoomConflict as e:
+            return api_response(request, {'success': False, 'error': str(e)}, status=409)
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+            return api_response(request, {'success': False, 'error': str(e)})
 
 @csrf_exempt
+@room_shard
 def api_switch_team(request):
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            room = GameRoom.objects.get(room_id=data['room_id'])
-            
-            if room.creator_id != data['user_id']:
-                return JsonResponse({'success': False, 'error': 'Только создатель может сменить команду'})
+            data = read_request(request)
+            with engine.mutate(data['room_id'], flush=True) as state:
+                if state.creator_id != data['user_id']:
+                    return api_response(request, {'success': False, 'error': 'Только создатель может сменить команду'})
+                
+                state.switch_team()
             
-            room.current_team = 'B' if room.current_team == 'A' else 'A'
-            room.current_explainer_index = 0
-            room.current_guesser_index = 1
-            room.words_used = '[]'
-            room.save()
+            publish_turn(state)
             
-            return JsonResponse({
+            return api_response(request, {
                 'success': True,
-                'current_team': room.current_team,
+                'current_team': state.current_team,
             })
+        except RoomConflict as e:
+            return api_response(request, {'success': False, 'error': str(e)}, status=409)
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+            return api_response(request, {'success': False, 'error': str(e)})
 
 @csrf_exempt
+@room_shard
 def api_leave_room(request):
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
+            data = read_request(request)
             Player.objects.filter(room__room_id=data['room_id'], user_id=data['user_id']).delete()
+            engine.forget(data['room_id'])
             
-            room = GameRoom.objects.get(room_id=data['room_id'])
-            if room.players.count() == 0:
+            room = GameRoom.objects.only('id', 'room_id').with_player_counts().get(room_id=data['room_id'])
+            if room.player_count == 0:
                 room.delete()
-                return JsonResponse({'success': True, 'room_deleted': True})
+                invalidate_room(room.room_id)
+                return api_response(request, {'success': True, 'room_deleted': True})
+            
+            room_changed(room.room_id, 'left', user_id=data['user_id'])
             
-            return JsonResponse({'success': True, 'room_deleted': False})
+            return api_response(request, {'success': True, 'room_deleted': False})
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
\ No newline at end of file
+            return api_response(request, {'success': False, 'error': str(e)})
+
+MAX_LEADERBOARD = 100
+
+def api_leaderboard(request):
+    try:
+        by = request.GET.get('by', 'wins')
+        if by not in history.LEADERBOARDS:
+            return api_response(request, {'success': False, 'error': 'Неизвестный рейтинг'})
+        limit = min(int(request.GET.get('limit', 20)), MAX_LEADERBOARD)
+        
+        return api_response(request, {
+            'success': True,
+            'by': by,
+            'players': [history.stats_info(row) for row in history.leaderboard(by, limit)],
+        })
+    except Exception as e:
+        return api_response(request, {'success': False, 'error': str(e)})
+
+def api_player_stats(request, user_id):
+    row = PlayerStats.objects.filter(user_id=user_id).first()
+    if row is None:
+        return api_response(request, {'success': False, 'error': 'Игрок ещё не играл'})
+    return api_response(request, {'success': True, 'stats': history.stats_info(row)})
+
+def metrics_endpoint(request):
+    token = metrics.metrics_config()['TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@csrf_exempt
+def telegram_webhook(request):
+    """Приём обновлений Telegram вместо long polling в отдельном процессе.
+
+    Обновление только ставится в очередь бота - ответ уходит сразу, а при
+    переполненной очереди Telegram получит 503 и повторит доставку позже.
+    """
+    if request.method != 'POST':
+        return api_response(request, {'success': False, 'error': 'Только POST'}, status=405)
+    
+    secret = telegram.bot_config()['WEBHOOK_SECRET']
+    received = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not secret or not hmac.compare_digest(received, secret):
+        return api_response(request, {'success': False, 'error': 'Неверный секрет'}, status=403)
+    
+    try:
+        update = telegram.parse_update(read_request(request))
+    except ValueError:
+        update = None
+    if update is None:
+        return api_response(request, {'success': False, 'error': 'Некорректное обновление'}, status=400)
+    
+    if not telegram.webhook_runtime().offer(update):
+        return api_response(request, {'success': False, 'error': 'Очередь переполнена'}, status=503)
+    
+    return api_response(request, {'success': True})
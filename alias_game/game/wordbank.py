@@ -0,0 +1,190 @@
+import mmap
+import struct
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+# Формат набора слов (.pack), все числа little-endian:
+#   заголовок:   MAGIC, версия u32, число разделов u32, смещение блока строк u64
+#   разделы:     длина имени u16, имя в UTF-8 ("medium" или "medium/animals"),
+#                число слов u32, смещение индекса u64
+#   индексы:     на каждое слово пара (смещение в блоке строк u32, длина u32)
+#   блок строк:  слова в UTF-8 подряд, каждое хранится один раз
+MAGIC = b'ALWP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sIIQ')
+SECTION = struct.Struct('<IQ')
+NAME_LENGTH = struct.Struct('<H')
+ENTRY = struct.Struct('<II')
+
+
+class WordPackError(Exception):
+    pass
+
+
+def section_name(difficulty, tag=''):
+    return f'{difficulty}/{tag}' if tag else difficulty
+
+
+def build_pack(path, entries):
+    """Записать набор слов. entries - пары (слово, сложность) или тройки с тегами."""
+    offsets = {}
+    blob = bytearray()
+    sections = defaultdict(list)
+
+    for word, difficulty, *rest in entries:
+        tags = rest[0] if rest else ()
+        if word not in offsets:
+            encoded = word.encode('utf-8')
+            offsets[word] = (len(blob), len(encoded))
+            blob += encoded
+        sections[section_name(difficulty)].append(offsets[word])
+        for tag in tags:
+            sections[section_name(difficulty, tag)].append(offsets[word])
+
+    names = sorted(sections)
+    table_size = sum(NAME_LENGTH.size + len(name.encode('utf-8')) + SECTION.size for name in names)
+    index_offset = HEADER.size + table_size
+    blob_offset = index_offset + sum(len(sections[name]) * ENTRY.size for name in names)
+
+    with open(path, 'wb') as output:
+        output.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(names), blob_offset))
+        for name in names:
+            encoded = name.encode('utf-8')
+            output.write(NAME_LENGTH.pack(len(encoded)) + encoded)
+            output.write(SECTION.pack(len(sections[name]), index_offset))
+            index_offset += len(sections[name]) * ENTRY.size
+        for name in names:
+            output.write(b''.join(ENTRY.pack(*item) for item in sections[name]))
+        output.write(blob)
+
+    return {name: len(sections[name]) for name in names}
+
+
+class PackSection:
+    """Список слов раздела поверх mmap: len() и доступ по индексу за O(1)."""
+
+    def __init__(self, buffer, blob_offset, index_offset, count):
+        self.buffer = buffer
+        self.blob_offset = blob_offset
+        self.index_offset = index_offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+
+        start, length = ENTRY.unpack_from(self.buffer, self.index_offset + index * ENTRY.size)
+        start += self.blob_offset
+        return self.buffer[start:start + length].decode('utf-8')
+
+
+class MappedPack:
+    """Набор слов из файла. Файл отображается в память при первом обращении:
+    страницы общие для всех воркеров через кэш ОС, а в процессе живёт только
+    таблица разделов."""
+
+    def __init__(self, path):
+        self.path = path
+        self._sections = None
+        self._buffer = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        with self._lock:
+            if self._sections is not None:
+                return
+
+            with open(self.path, 'rb') as source:
+                buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+
+            magic, version, count, blob_offset = HEADER.unpack_from(buffer, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                buffer.close()
+                raise WordPackError(f"{self.path}: неизвестный формат набора слов")
+
+            sections = {}
+            position = HEADER.size
+            for _ in range(count):
+                (name_length,) = NAME_LENGTH.unpack_from(buffer, position)
+                position += NAME_LENGTH.size
+                name = buffer[position:position + name_length].decode('utf-8')
+                position += name_length
+                words, index_offset = SECTION.unpack_from(buffer, position)
+                position += SECTION.size
+                sections[name] = PackSection(buffer, blob_offset, index_offset, words)
+
+            self._buffer = buffer
+            self._sections = sections
+
+    def sections(self):
+        self._open()
+        return self._sections
+
+    def section(self, difficulty, tag=''):
+        return self.sections().get(section_name(difficulty, tag))
+
+
+class ListPack:
+    """Набор слов из списков Python - встроенные слова игры."""
+
+    def __init__(self, lists):
+        self._sections = dict(lists)
+
+    def sections(self):
+        return self._sections
+
+    def section(self, difficulty, tag=''):
+        return self._sections.get(section_name(difficulty, tag))
+
+
+class WordBank:
+    """Реестр наборов слов: встроенный 'default' и файлы из settings.WORD_PACKS."""
+
+    def __init__(self, builtin):
+        self.builtin = builtin
+        self._packs = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        return ['default', *getattr(settings, 'WORD_PACKS', {})]
+
+    def pack(self, name):
+        if name == 'default':
+            return self.builtin
+
+        with self._lock:
+            pack = self._packs.get(name)
+            if pack is None:
+                paths = getattr(settings, 'WORD_PACKS', {})
+                if name not in paths:
+                    raise WordPackError(f"Набор слов '{name}' не найден")
+                pack = self._packs[name] = MappedPack(paths[name])
+        return pack
+
+    def _section(self, reference, difficulty, fallback):
+        name, _, tag = reference.partition('/')
+        pack = self.pack(name)
+        return pack.section(difficulty, tag) or pack.section(fallback, tag)
+
+    def has(self, reference, difficulty, fallback='medium'):
+        """Найдутся ли слова для комнаты с этим набором и сложностью - как в words()."""
+        if reference.partition('/')[0] not in self.names():
+            return False
+        return bool(self._section(reference, difficulty, fallback))
+
+    def words(self, reference, difficulty, fallback='medium'):
+        words = self._section(reference, difficulty, fallback)
+        if not words:
+            raise WordPackError(f"В наборе '{reference}' нет слов для сложности {difficulty}")
+        return words
+
+    def reset(self):
+        with self._lock:
+            self._packs.clear()
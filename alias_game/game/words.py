@@ -1,4 +1,7 @@
-import random
+from functools import lru_cache
+
+from .permutation import KeyedPermutation
+from .wordbank import ListPack, WordBank
 
 EASY_WORDS = [
     "яблоко", "собака", "стол", "бегать", "врач", "парк",
@@ -24,22 +27,39 @@ HARD_WORDS = [
     "гидроэлектростанция", "метеорология", "сейсмология", "вирусология", "микробиология",
 ]
 
-def get_random_word(difficulty, used_words=None):
-    if used_words is None:
-        used_words = []
-    
-    if difficulty == 'easy':
-        words = EASY_WORDS
-    elif difficulty == 'medium':
-        words = MEDIUM_WORDS
-    elif difficulty == 'hard':
-        words = HARD_WORDS
-    else:
-        words = MEDIUM_WORDS
-    
-    available_words = [word for word in words if word not in used_words]
-    
-    if not available_words:
-        available_words = words
-    
-    return random.choice(available_words) if available_words else None
\ No newline at end of file
+WORD_LISTS = {
+    'easy': EASY_WORDS,
+    'medium': MEDIUM_WORDS,
+    'hard': HARD_WORDS,
+}
+
+bank = WordBank(ListPack(WORD_LISTS))
+
+def get_words(difficulty, pack='default'):
+    return bank.words(pack, difficulty)
+
+@lru_cache(maxsize=1024)
+def deck_permutation(size, key):
+    return KeyedPermutation(size, key)
+
+class WordDeck:
+    """Колода слов комнаты: перестановка списка по seed и курсор.
+
+    Курсор только растёт. Когда колода кончается, следующий круг идёт
+    по новой перестановке, так что в базе хранятся лишь seed и курсор.
+    """
+
+    def __init__(self, words, seed, cursor=0):
+        self.words = words
+        self.seed = seed
+        self.cursor = cursor
+
+    def word_at(self, cursor):
+        shuffle_round, offset = divmod(cursor, len(self.words))
+        permutation = deck_permutation(len(self.words), f'{self.seed}:{shuffle_round}')
+        return self.words[permutation(offset)]
+
+    def draw(self):
+        word = self.word_at(self.cursor)
+        self.cursor += 1
+        return word
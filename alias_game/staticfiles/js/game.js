@@ -0,0 +1,379 @@
+let tg = window.Telegram.WebApp;
+tg.expand();
+
+const user = tg.initDataUnsafe?.user;
+let currentUser = null;
+
+if (user) {
+    currentUser = {
+        id: user.id,
+        username: user.username || `User${user.id}`
+    };
+} else {
+    currentUser = {
+        id: Math.floor(Math.random() * 1000000),
+        username: 'TestUser'
+    };
+}
+
+const roomId = document.getElementById('roomMeta').dataset.room;
+let gameState = null;
+let turnDeadline = null;
+let timeoutShown = false;
+let timeLeft = 60;
+let currentWord = null;
+let wordQueue = [];
+let lastPosition = -1;
+let confirmations = Promise.resolve();
+let isExplainer = false;
+let resultSent = false;
+const roomCreatorId = Number(document.getElementById('roomMeta').dataset.creator);
+let isCreator = roomCreatorId === currentUser.id;
+
+function showError(message) {
+    const el = document.getElementById('errorMessage');
+    el.textContent = message;
+    el.style.display = 'block';
+    setTimeout(() => el.style.display = 'none', 5000);
+}
+
+function showSuccess(message) {
+    const el = document.getElementById('successMessage');
+    el.textContent = message;
+    el.style.display = 'block';
+    setTimeout(() => el.style.display = 'none', 3000);
+}
+
+function setDeadline(deadline) {
+    // Срок хода задаёт сервер, он же передаёт ход дальше; здесь только отсчёт
+    turnDeadline = deadline;
+    timeoutShown = false;
+    renderTimer();
+}
+
+function renderTimer() {
+    if (!turnDeadline) {
+        timeLeft = (gameState && gameState.time_per_turn) || 60;
+    } else {
+        timeLeft = Math.max(0, Math.ceil((turnDeadline - Date.now()) / 1000));
+        if (timeLeft === 0 && !timeoutShown) {
+            timeoutShown = true;
+            showError('Время вышло!');
+        }
+    }
+    updateTimerDisplay();
+}
+
+function updateTimerDisplay() {
+    const timerEl = document.getElementById('timer');
+    timerEl.textContent = timeLeft;
+
+    if (timeLeft <= 10) {
+        timerEl.style.color = '#ff6b6b';
+    } else if (timeLeft <= 30) {
+        timerEl.style.color = '#ffc107';
+    } else {
+        timerEl.style.color = '#51cf66';
+    }
+}
+
+async function updateGameState() {
+    try {
+        const response = await fetch(`/api/game-state/${roomId}/`);
+        const data = await response.json();
+
+        if (data.success) {
+            gameState = data;
+
+            if (!data.is_game_started) {
+                document.getElementById('wordContainer').innerHTML =
+                    '<div class="waiting">Игра еще не началась</div>';
+                return;
+            }
+
+            if (data.winner) {
+                showWinner(data.winner);
+                return;
+            }
+
+            document.getElementById('scoreA').textContent = data.score_a;
+            document.getElementById('scoreB').textContent = data.score_b;
+
+            const currentTeam = data.current_team === 'A' ? 'Команда A' : 'Команда B';
+            document.getElementById('currentTeam').textContent = currentTeam;
+
+            document.getElementById('explainerName').textContent = data.explainer.username;
+            document.getElementById('guesserName').textContent = data.guesser.username;
+
+            isExplainer = currentUser && (data.explainer.id === currentUser.id);
+
+            const showControls = isExplainer;
+            document.getElementById('gameControls').style.display = showControls ? 'flex' : 'none';
+            document.getElementById('newWordBtn').style.display = showControls ? 'block' : 'none';
+            document.getElementById('nextTurnBtn').style.display = showControls ? 'block' : 'none';
+            document.getElementById('switchTeamBtn').style.display = isCreator ? 'block' : 'none';
+
+            if (!isExplainer) {
+                document.getElementById('wordContainer').innerHTML =
+                    `<div class="waiting">Ждите, сейчас объясняет: ${data.explainer.username}</div>`;
+            }
+
+            setDeadline(data.turn_deadline);
+        }
+    } catch (error) {
+        console.error('Ошибка:', error);
+    }
+}
+
+function showCurrentWord() {
+    currentWord = wordQueue.length ? wordQueue[0].word : null;
+    document.getElementById('wordText').textContent = currentWord || 'Загрузка...';
+}
+
+function mergeQueue(queue) {
+    // Подтверждения идут в фоне: добавляем только слова, которых ещё не было
+    for (const item of queue) {
+        if (item.position > lastPosition) {
+            wordQueue.push(item);
+            lastPosition = item.position;
+        }
+    }
+    if (!currentWord) showCurrentWord();
+}
+
+function resetQueue() {
+    wordQueue = [];
+    lastPosition = -1;
+    currentWord = null;
+}
+
+async function getNewWord() {
+    if (!isExplainer) {
+        showError('Сейчас не ваш ход');
+        return;
+    }
+
+    try {
+        // Сервер резервирует несколько слов вперёд: следующее слово показывается сразу
+        const response = await fetch('/api/word-queue/', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                room_id: roomId,
+                user_id: currentUser.id
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            resetQueue();
+            mergeQueue(data.queue);
+            setDeadline(data.turn_deadline);
+        } else {
+            showError(data.error);
+        }
+    } catch (error) {
+        showError('Ошибка сети: ' + error.message);
+    }
+}
+
+async function sendActions(actions, position) {
+    const response = await fetch('/api/actions/', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({
+            room_id: roomId,
+            user_id: currentUser.id,
+            actions: actions,
+            position: position
+        })
+    });
+
+    const data = await response.json();
+
+    if (!data.success) {
+        // Очередь разошлась с сервером - перечитать её
+        showError(data.error);
+        if (isExplainer) getNewWord();
+        return;
+    }
+
+    document.getElementById('scoreA').textContent = data.score_a;
+    document.getElementById('scoreB').textContent = data.score_b;
+    setDeadline(data.turn_deadline);
+
+    if (data.winner) {
+        updateGameState();
+    } else {
+        mergeQueue(data.queue);
+    }
+}
+
+function confirmWord(action) {
+    const item = wordQueue.shift();
+    showCurrentWord();
+    // Подтверждения уходят строго по порядку, не задерживая показ следующего слова
+    confirmations = confirmations
+        .then(() => sendActions([action], item.position))
+        .catch((error) => showError('Ошибка: ' + error.message));
+}
+
+function wordGuessed() {
+    if (!isExplainer) {
+        showError('Сейчас не ваш ход');
+        return;
+    }
+
+    if (!currentWord) {
+        showError('Сначала получите слово');
+        return;
+    }
+
+    showSuccess('Отлично! +1 очко');
+    confirmWord('guessed');
+}
+
+function skipWord() {
+    if (!isExplainer) {
+        showError('Сейчас не ваш ход');
+        return;
+    }
+
+    if (!currentWord) {
+        showError('Сначала получите слово');
+        return;
+    }
+
+    showSuccess('Слово пропущено');
+    confirmWord('skip');
+}
+
+async function nextTurn() {
+    if (!isExplainer) {
+        showError('Сейчас не ваш ход');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/next-turn/', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                room_id: roomId,
+                user_id: currentUser.id
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showSuccess('Следующий ход!');
+            resetQueue();
+            document.getElementById('wordText').textContent = 'Нажмите "Новое слово"';
+            updateGameState();
+        } else {
+            showError(data.error);
+        }
+    } catch (error) {
+        showError('Ошибка: ' + error.message);
+    }
+}
+
+async function switchTeam() {
+    if (!isCreator) {
+        showError('Только создатель может сменить команду');
+        return;
+    }
+
+    if (confirm('Сменить команду?')) {
+        try {
+            const response = await fetch('/api/switch-team/', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    room_id: roomId,
+                    user_id: currentUser.id
+                })
+            });
+
+            const data = await response.json();
+
+            if (data.success) {
+                showSuccess('Теперь играет другая команда!');
+                resetQueue();
+                document.getElementById('wordText').textContent = 'Нажмите "Новое слово"';
+                updateGameState();
+            }
+        } catch (error) {
+            showError('Ошибка: ' + error.message);
+        }
+    }
+}
+
+function showWinner(winnerTeam) {
+    document.getElementById('winnerTeam').textContent = winnerTeam;
+    document.getElementById('finalScore').textContent =
+        `${gameState.score_a} : ${gameState.score_b}`;
+    document.getElementById('winnerMessage').style.display = 'block';
+    sendResult();
+}
+
+function sendResult() {
+    // sendData есть только у WebApp, открытого кнопкой клавиатуры бота,
+    // и закрывает его - поэтому один раз, после показа победителя
+    if (resultSent || !tg.sendData || !tg.initDataUnsafe?.user) {
+        return;
+    }
+    resultSent = true;
+    setTimeout(() => {
+        try {
+            tg.sendData(JSON.stringify({type: 'result', room_id: roomId}));
+        } catch (error) {
+            console.warn('Результат не отправлен:', error);
+        }
+    }, 3000);
+}
+
+let socket = null;
+
+function applyEvent(event) {
+    if (event.type === 'score') {
+        document.getElementById('scoreA').textContent = event.score_a;
+        document.getElementById('scoreB').textContent = event.score_b;
+        if (gameState) {
+            gameState.score_a = event.score_a;
+            gameState.score_b = event.score_b;
+        }
+        if (gameState && (event.score_a >= gameState.target_score || event.score_b >= gameState.target_score)) {
+            updateGameState();
+        }
+    } else if (event.type === 'timer') {
+        setDeadline(event.turn_deadline);
+    } else if (event.type === 'turn') {
+        // Ход сменился (в том числе по таймеру сервера) - очередь слов больше не действует
+        resetQueue();
+        updateGameState();
+    } else {
+        updateGameState();
+    }
+}
+
+function connectSocket() {
+    const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    socket = new WebSocket(`${scheme}://${window.location.host}/ws/room/${roomId}/`);
+    socket.onmessage = (message) => applyEvent(JSON.parse(message.data));
+    socket.onopen = () => updateGameState();
+    socket.onclose = () => setTimeout(connectSocket, 5000);
+}
+
+function pollGameState() {
+    // Опрос остаётся запасным вариантом, пока WebSocket недоступен
+    if (socket && socket.readyState === WebSocket.OPEN) return;
+    updateGameState();
+}
+
+updateGameState();
+connectSocket();
+setInterval(pollGameState, 3000);
+setInterval(renderTimer, 1000);
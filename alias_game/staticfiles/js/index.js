@@ -0,0 +1,113 @@
+let tg = window.Telegram.WebApp;
+tg.expand();
+
+const user = tg.initDataUnsafe?.user;
+let currentUser = null;
+
+if (user) {
+    currentUser = {
+        id: user.id,
+        username: user.username || `User${user.id}`,
+        firstName: user.first_name || '',
+        lastName: user.last_name || ''
+    };
+} else {
+    currentUser = {
+        id: Date.now(),
+        username: 'TestUser'
+    };
+}
+
+function showCreateRoomModal() {
+    document.getElementById('createRoomModal').style.display = 'block';
+}
+
+function showJoinRoomModal() {
+    document.getElementById('joinRoomModal').style.display = 'block';
+    document.getElementById('roomId').focus();
+}
+
+function closeModal(modalId) {
+    document.getElementById(modalId).style.display = 'none';
+}
+
+function showError(message) {
+    const el = document.getElementById('errorMessage');
+    el.textContent = message;
+    el.style.display = 'block';
+    setTimeout(() => el.style.display = 'none', 5000);
+}
+
+function showSuccess(message) {
+    const el = document.getElementById('successMessage');
+    el.textContent = message;
+    el.style.display = 'block';
+    setTimeout(() => el.style.display = 'none', 3000);
+}
+
+async function createRoom() {
+    const difficulty = document.getElementById('difficulty').value;
+
+    try {
+        const response = await fetch('/api/create-room/', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                user_id: currentUser.id,
+                username: currentUser.username,
+                difficulty: difficulty
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            closeModal('createRoomModal');
+            showSuccess('Комната создана!');
+            setTimeout(() => {
+                // Комнату обслуживает узел её шарда, пустой node - этот же сервер
+                window.location.href = `${data.node || ''}/room/${data.room_id}/`;
+            }, 1000);
+        } else {
+            showError('Ошибка: ' + data.error);
+        }
+    } catch (error) {
+        showError('Ошибка сети: ' + error.message);
+    }
+}
+
+async function joinRoom() {
+    const roomId = document.getElementById('roomId').value.toUpperCase().trim();
+
+    if (!roomId || roomId.length !== 6) {
+        showError('Введите корректный ID комнаты (6 символов)');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/join-room/', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({room_id: roomId})
+        });
+        const data = await response.json();
+
+        if (data.success) {
+            closeModal('joinRoomModal');
+            showSuccess('Комната найдена!');
+            setTimeout(() => {
+                window.location.href = `${data.node || ''}/room/${roomId}/`;
+            }, 1000);
+        } else {
+            showError('Комната не найдена');
+        }
+    } catch (error) {
+        showError('Ошибка сети: ' + error.message);
+    }
+}
+
+window.onclick = function(event) {
+    if (event.target.className === 'modal') {
+        event.target.style.display = 'none';
+    }
+};
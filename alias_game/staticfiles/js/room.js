@@ -0,0 +1,252 @@
+let tg = window.Telegram.WebApp;
+tg.expand();
+
+const user = tg.initDataUnsafe?.user;
+let currentUser = null;
+
+if (user) {
+    currentUser = {
+        id: user.id,
+        username: user.username || `User${user.id}`
+    };
+} else {
+    currentUser = {
+        id: Date.now(),
+        username: 'TestUser'
+    };
+}
+
+const roomId = document.getElementById('roomMeta').dataset.room;
+const roomCreatorId = Number(document.getElementById('roomMeta').dataset.creator);
+const isCreator = roomCreatorId === currentUser.id;
+let currentTeam = null;
+
+function showError(message) {
+    const el = document.getElementById('errorMessage');
+    el.textContent = message;
+    el.style.display = 'block';
+    setTimeout(() => el.style.display = 'none', 5000);
+}
+
+function showSuccess(message) {
+    const el = document.getElementById('successMessage');
+    el.textContent = message;
+    el.style.display = 'block';
+    setTimeout(() => el.style.display = 'none', 3000);
+}
+
+async function updatePlayers() {
+    try {
+        const response = await fetch(`/api/room/${roomId}/`);
+        const data = await response.json();
+
+        if (data.success) {
+            if (data.is_game_started) {
+                window.location.href = `/game/${roomId}/`;
+                return;
+            }
+
+            document.getElementById('teamACount').textContent = `Игроков: ${data.team_a_count}/4`;
+            document.getElementById('teamBCount').textContent = `Игроков: ${data.team_b_count}/4`;
+
+            const teamAList = document.getElementById('teamAPlayers');
+            teamAList.innerHTML = '';
+
+            data.team_a.forEach(player => {
+                const isCurrent = player.user_id === currentUser.id;
+                const playerEl = document.createElement('div');
+                playerEl.className = `player ${isCurrent ? 'current-player' : ''}`;
+                playerEl.innerHTML = `<span class="player-name">${player.username}</span>`;
+                teamAList.appendChild(playerEl);
+                if (isCurrent) currentTeam = 'A';
+            });
+
+            const teamBList = document.getElementById('teamBPlayers');
+            teamBList.innerHTML = '';
+
+            data.team_b.forEach(player => {
+                const isCurrent = player.user_id === currentUser.id;
+                const playerEl = document.createElement('div');
+                playerEl.className = `player ${isCurrent ? 'current-player' : ''}`;
+                playerEl.innerHTML = `<span class="player-name">${player.username}</span>`;
+                teamBList.appendChild(playerEl);
+                if (isCurrent) currentTeam = 'B';
+            });
+
+            updateJoinButtons(data);
+
+            const startButton = document.getElementById('startButton');
+            if (startButton) {
+                const canStart = data.team_a_count >= 2 && data.team_b_count >= 2;
+                startButton.disabled = !canStart;
+                if (!canStart) {
+                    startButton.textContent = '⏳ Нужно по 2 игрока в каждой команде';
+                }
+            }
+        }
+    } catch (error) {
+        console.error('Ошибка:', error);
+    }
+}
+
+function updateJoinButtons(data) {
+    const joinTeamABtn = document.getElementById('joinTeamABtn');
+    const joinTeamBBtn = document.getElementById('joinTeamBBtn');
+
+    const inTeamA = data.team_a.some(p => p.user_id === currentUser.id);
+    const inTeamB = data.team_b.some(p => p.user_id === currentUser.id);
+
+    if (inTeamA) {
+        joinTeamABtn.innerHTML = '✅ Вы в команде A';
+        joinTeamABtn.disabled = true;
+        joinTeamBBtn.innerHTML = '🔄 Перейти в B';
+    } else if (inTeamB) {
+        joinTeamABtn.innerHTML = '🔄 Перейти в A';
+        joinTeamBBtn.innerHTML = '✅ Вы в команде B';
+        joinTeamBBtn.disabled = true;
+    }
+
+    if (data.team_a_count >= 4 && !inTeamA) {
+        joinTeamABtn.disabled = true;
+        joinTeamABtn.innerHTML = '🚫 Команда A заполнена';
+    }
+
+    if (data.team_b_count >= 4 && !inTeamB) {
+        joinTeamBBtn.disabled = true;
+        joinTeamBBtn.innerHTML = '🚫 Команда B заполнена';
+    }
+}
+
+async function joinTeam(team) {
+    try {
+        const response = await fetch('/api/join-team/', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                room_id: roomId,
+                user_id: currentUser.id,
+                username: currentUser.username,
+                team: team
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showSuccess(`Вы в команде ${team}!`);
+            updatePlayers();
+        } else {
+            showError('Ошибка: ' + data.error);
+        }
+    } catch (error) {
+        showError('Ошибка сети: ' + error.message);
+    }
+}
+
+async function startGame() {
+    if (!isCreator) {
+        showError('Только создатель может начать игру');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/start-game/', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                room_id: roomId,
+                user_id: currentUser.id
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showSuccess('Игра началась!');
+            setTimeout(() => {
+                window.location.href = `/game/${roomId}/`;
+            }, 1000);
+        } else {
+            showError('Ошибка: ' + data.error);
+        }
+    } catch (error) {
+        showError('Ошибка сети: ' + error.message);
+    }
+}
+
+async function leaveRoom() {
+    if (confirm('Покинуть комнату?')) {
+        try {
+            const response = await fetch('/api/leave-room/', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    room_id: roomId,
+                    user_id: currentUser.id
+                })
+            });
+
+            const data = await response.json();
+
+            if (data.success) {
+                showSuccess('Вы покинули комнату');
+                setTimeout(() => {
+                    window.location.href = '/';
+                }, 1000);
+            }
+        } catch (error) {
+            showError('Ошибка: ' + error.message);
+        }
+    }
+}
+
+async function shareRoom() {
+    const roomLink = window.location.href;
+
+    if (navigator.share) {
+        try {
+            await navigator.share({
+                title: 'Alias Game',
+                text: `Присоединяйтесь к игре Alias! Комната: ${roomId}`,
+                url: roomLink
+            });
+        } catch (error) {
+            copyToClipboard(roomLink);
+        }
+    } else {
+        copyToClipboard(roomLink);
+    }
+}
+
+function copyToClipboard(text) {
+    navigator.clipboard.writeText(text).then(() => {
+        showSuccess('Ссылка скопирована!');
+    });
+}
+
+let socket = null;
+
+function connectSocket() {
+    const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    socket = new WebSocket(`${scheme}://${window.location.host}/ws/room/${roomId}/`);
+    socket.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.type === 'started') {
+            window.location.href = `/game/${roomId}/`;
+        } else if (event.type === 'roster' || event.type === 'left') {
+            updatePlayers();
+        }
+    };
+    socket.onopen = () => updatePlayers();
+    socket.onclose = () => setTimeout(connectSocket, 5000);
+}
+
+function pollPlayers() {
+    // Опрос остаётся запасным вариантом, пока WebSocket недоступен
+    if (socket && socket.readyState === WebSocket.OPEN) return;
+    updatePlayers();
+}
+
+updatePlayers();
+connectSocket();
+setInterval(pollPlayers, 3000);